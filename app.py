@@ -1,12 +1,22 @@
 import streamlit as st
 import os
 import pandas as pd
-from datetime import datetime
+import numpy as np
+from datetime import datetime, timedelta
 from utils.invoice_processor import InvoiceProcessor
 from utils.price_comparator import PriceComparator
 from utils.database import Database
+from utils.query_cache import query_cache
+from utils.template_store import TemplateStore
+from utils.pricing_store import PricingStore, row_key
+from utils.duplicate_detector import page_image_hash
+from utils.file_store import FileStore, copy_stream, file_hash
+from utils.variance_report_writer import write_variance_report
+from utils.chart_data import OTHER_LABEL, downsample, payload_size, scatter, top_n
+from utils.visualizations import Visualizer
+from utils.tracing import Trace, activate, current_trace
+from utils.metrics import INVOICES_FAILED, start_http_server
 import plotly.graph_objects as go
-import plotly.express as px
 from typing import Dict, Any, List
 import tempfile
 import shutil
@@ -21,10 +31,24 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def load_processors():
+    """Database registry and invoice processor, created once and shared by all reruns and sessions."""
+    registry = Database()
+    invoice_processor = InvoiceProcessor(template_store=TemplateStore(registry))
+    # OCR engines load in the background while the first page renders
+    invoice_processor.ocr.warm_up()
+    return registry, invoice_processor
+
 # Initialize processors and database
-invoice_processor = InvoiceProcessor()
+registry, invoice_processor = load_processors()
+db = registry
 price_comparator = PriceComparator()
-db = Database()
+pricing_store = PricingStore(db)
+
+# Local /metrics endpoint for Prometheus (started once; Streamlit reruns this script)
+if os.getenv('METRICS_PORT'):
+    start_http_server(int(os.getenv('METRICS_PORT')))
 
 def save_uploaded_file(uploaded_file, directory: str) -> str:
     """Save uploaded file to a permanent location."""
@@ -36,63 +60,164 @@ def save_uploaded_file(uploaded_file, directory: str) -> str:
     filename = f"{timestamp}_{uploaded_file.name}"
     file_path = os.path.join(directory, filename)
     
-    # Save the file
+    # Save the file in chunks, without copying the upload
     with open(file_path, "wb") as f:
-        f.write(uploaded_file.getvalue())
+        copy_stream(uploaded_file, f)
     
     return file_path
 
+def select_project():
+    """Select the active project and scope the database to it."""
+    global db, pricing_store
+    
+    projects = {project['id']: project['name'] for project in registry.get_projects()}
+    project_id = st.sidebar.selectbox(
+        "Project",
+        list(projects),
+        format_func=projects.get,
+        key='project_id'
+    )
+    
+    with st.sidebar.expander("New Project"):
+        name = st.text_input("Project Name")
+        budget = st.number_input("Budget", min_value=0.0, value=0.0)
+        if st.button("Create Project") and name:
+            registry.create_project(name, budget=budget or None)
+            st.rerun()
+    
+    # Pricing baselines belong to a project
+    if st.session_state.get('active_project') != project_id:
+        for key in ('initial_pricing', 'pricing_index', 'pricing_version', 'pricing_fingerprint'):
+            st.session_state.pop(key, None)
+        st.session_state.active_project = project_id
+    
+    db = registry.for_project(project_id)
+    pricing_store = PricingStore(db)
+
 def load_initial_pricing():
     """Load and cache initial pricing data."""
     if 'initial_pricing' not in st.session_state:
-        st.session_state.initial_pricing = None
+        pricing_data, pricing_index, version = pricing_store.current()
+        st.session_state.initial_pricing = pricing_data
+        st.session_state.pricing_index = pricing_index
+        st.session_state.pricing_version = version
+        st.session_state.pricing_fingerprint = version['fingerprint'] if version else None
         st.session_state.pricing_file_path = None
 
-def process_invoice(uploaded_file) -> Dict[str, Any]:
-    """Process uploaded invoice file."""
+def _extract_and_save(file_path: str, content_hash: str, stop_early: bool) -> Dict[str, Any]:
+    """OCR and extract a saved upload, then store it unless it duplicates an invoice."""
+    # Process invoice
+    invoice_data = {}
+    progress = st.progress(0.0, text="Processing invoice...")
+    with invoice_processor.profile(file_path):
+        for event in invoice_processor.iter_process_invoice(file_path, stop_when_complete=stop_early):
+            if event['type'] == 'page':
+                found = ', '.join(sorted(event['fields'])) or 'none yet'
+                progress.progress(
+                    event['page_number'] / event['page_count'],
+                    text=f"Page {event['page_number']} of {event['page_count']} - fields found: {found}"
+                )
+            else:
+                invoice_data = event['invoice']
+                if event['stopped_early']:
+                    st.info(
+                        f"Header fields and totals found after {event['pages_processed']} "
+                        f"of {event['page_count']} pages"
+                    )
+    progress.empty()
+    
+    # Save to database unless it duplicates an invoice under another file
+    if invoice_data:
+        image_hash = page_image_hash(file_path)
+        duplicate = db.find_duplicate_invoice(invoice_data, image_hash)
+        if duplicate:
+            current_trace().attributes['status'] = 'duplicate'
+            reason = 'invoice number' if duplicate['match'] == 'invoice_number' else 'scanned page and total'
+            st.warning(
+                f"Duplicate of invoice {duplicate['invoice_number']} "
+                f"({duplicate['vendor_name'] or 'unknown vendor'}), matched by {reason}"
+            )
+            return {}
+        
+        invoice_id = db.save_invoice(invoice_data, file_path, content_hash, image_hash)
+        if not invoice_id:
+            st.error("Failed to save invoice to database")
+        st.session_state.last_invoice_id = invoice_id
+    
+    return invoice_data
+
+def process_invoice(uploaded_file, stop_early: bool = False) -> Dict[str, Any]:
+    """Process uploaded invoice file, showing page-by-page progress."""
     try:
-        # Save the file permanently
-        file_path = save_uploaded_file(
-            uploaded_file,
-            os.path.join('data', 'invoices')
+        content_hash = file_hash(uploaded_file)
+        
+        # Streamlit reruns the script on every interaction; reuse this session's result
+        processed = st.session_state.setdefault('processed_invoices', {})
+        if (db.project_id, content_hash) in processed:
+            invoice_data, st.session_state.last_invoice_id = processed[(db.project_id, content_hash)]
+            return invoice_data
+        
+        # Skip OCR for files that were already imported
+        existing = db.find_invoice_by_file_hash(content_hash)
+        if existing:
+            st.warning(
+                f"This file was already imported as invoice {existing['invoice_number']} "
+                f"({existing['vendor_name'] or 'unknown vendor'}, {existing['invoice_date']})"
+            )
+            return {}
+        
+        # Save the file permanently under its content hash
+        file_path, _, _ = FileStore(os.path.join(db.data_dir, 'invoices')).put(
+            uploaded_file, uploaded_file.name, content_hash
         )
         
-        # Process invoice
-        invoice_data = invoice_processor.process_invoice(file_path)
+        st.session_state.last_invoice_path = file_path
         
-        # Save to database
+        # Time the pipeline stages; compare and save in the analysis tab join the trace
+        invoice_trace = Trace('invoice', ref=content_hash, source='upload')
+        with invoice_trace.activate():
+            invoice_data = _extract_and_save(file_path, content_hash, stop_early)
         if invoice_data:
-            invoice_id = db.save_invoice(invoice_data, file_path)
-            if not invoice_id:
-                st.error("Failed to save invoice to database")
+            processed[(db.project_id, content_hash)] = (invoice_data, st.session_state.last_invoice_id)
+            st.session_state.pending_trace = invoice_trace
+        else:
+            invoice_trace.attributes.setdefault('status', 'empty')
+            db.save_trace(invoice_trace)
         
         return invoice_data
     except Exception as e:
+        INVOICES_FAILED.inc(source='upload')
         st.error(f"Error processing invoice: {str(e)}")
         return {}
 
+def show_chart(fig: go.Figure):
+    """Plot a figure with the size of its browser payload."""
+    st.plotly_chart(fig, use_container_width=True)
+    size = payload_size(fig)
+    st.caption(f"{size['points']:,} points, {size['bytes'] / 1024:,.1f} KB chart payload")
+
+def variance_color(variance: float) -> str:
+    """Color of a variance percentage."""
+    if abs(variance) <= 5:
+        return 'green'
+    elif abs(variance) <= 10:
+        return 'orange'
+    return 'red'
+
 def create_variance_chart(comparison_results: Dict[str, Any]):
-    """Create interactive variance chart."""
+    """Create interactive variance chart of the items with the largest variances."""
     if not comparison_results.get('items_analysis'):
         return None
     
-    # Prepare data for visualization
-    items = []
-    variances = []
-    colors = []
-    
-    for item in comparison_results['items_analysis']:
-        items.append(item['description'])
-        variance = item.get('variance_percentage', 0)
-        variances.append(variance)
-        
-        # Color coding based on variance
-        if abs(variance) <= 5:
-            colors.append('green')
-        elif abs(variance) <= 10:
-            colors.append('orange')
-        else:
-            colors.append('red')
+    # Largest variances first; the remaining items become one bar of their mean
+    items, variances, folded = top_n(
+        [item['description'] for item in comparison_results['items_analysis']],
+        [item.get('variance_percentage') or 0 for item in comparison_results['items_analysis']],
+        aggregate='mean'
+    )
+    colors = [variance_color(v) for v in variances]
+    if folded:
+        colors[-1] = 'gray'
     
     fig = go.Figure(data=[
         go.Bar(
@@ -105,7 +230,7 @@ def create_variance_chart(comparison_results: Dict[str, Any]):
     ])
     
     fig.update_layout(
-        title="Price Variances by Item",
+        title="Price Variances by Item" + (f" (top {len(items) - 1} of {len(items) - 1 + folded})" if folded else ""),
         xaxis_title="Items",
         yaxis_title="Variance (%)",
         showlegend=False,
@@ -114,38 +239,41 @@ def create_variance_chart(comparison_results: Dict[str, Any]):
     
     return fig
 
-def create_trend_chart(trend_analysis: Dict[str, Any]):
-    """Create trend analysis chart."""
-    if not trend_analysis.get('trend_by_item'):
+def create_trend_chart(trends: pd.DataFrame, limit: int = 100):
+    """Create trend analysis chart from Database.get_item_variance_trends()."""
+    if trends.empty:
         return None
     
-    # Prepare data for visualization
-    items = []
-    avg_variances = []
-    trends = []
+    # Items with the largest average variance; the rest are summarized as one point
+    shown = trends.loc[trends['average_variance'].abs().nlargest(limit).index]
+    rest = trends.drop(shown.index)
     
-    for item, data in trend_analysis['trend_by_item'].items():
-        items.append(item)
-        avg_variances.append(data['average_variance'])
-        trends.append(data['variance_trend'])
-    
-    # Create scatter plot
     fig = go.Figure()
     
     # Add points for each trend category
     for trend in ['increasing', 'decreasing', 'stable']:
-        mask = [t == trend for t in trends]
-        if any(mask):
-            fig.add_trace(go.Scatter(
-                x=[items[i] for i in range(len(items)) if mask[i]],
-                y=[avg_variances[i] for i in range(len(items)) if mask[i]],
+        subset = shown[shown['variance_trend'] == trend]
+        if not subset.empty:
+            fig.add_trace(scatter(
+                subset['item_description'].tolist(),
+                subset['average_variance'].tolist(),
                 mode='markers',
                 name=trend.capitalize(),
+                customdata=subset['points'].tolist(),
+                hovertemplate="%{x}<br>%{y:.2f}% over %{customdata} invoices",
                 marker=dict(
                     size=12,
                     symbol='circle' if trend == 'stable' else 'triangle-up' if trend == 'increasing' else 'triangle-down'
                 )
             ))
+    if not rest.empty:
+        fig.add_trace(go.Scatter(
+            x=[f"{OTHER_LABEL} ({len(rest)})"],
+            y=[np.average(rest['average_variance'], weights=rest['points'])],
+            mode='markers',
+            name=OTHER_LABEL,
+            marker=dict(size=12, color='gray', symbol='square')
+        ))
     
     fig.update_layout(
         title="Price Variance Trends",
@@ -156,16 +284,34 @@ def create_trend_chart(trend_analysis: Dict[str, Any]):
     
     return fig
 
+def create_variance_time_chart(series: pd.DataFrame):
+    """Create a chart of variance over time from Database.get_variance_time_series()."""
+    if series.empty:
+        return None
+    
+    dates, variances = downsample(series['bucket_start'].tolist(), series['average_variance'].fillna(0).tolist())
+    fig = go.Figure(data=[
+        scatter(dates, variances, mode='lines+markers' if len(dates) <= 200 else 'lines', name="Average Variance")
+    ])
+    fig.update_layout(
+        title="Average Variance over Time",
+        xaxis_title="Date",
+        yaxis_title="Average Variance (%)",
+        height=400
+    )
+    return fig
+
 def main():
     """Main application function."""
     st.title("🏗️ Construction Invoice Analyzer")
     
-    # Initialize session state
-    load_initial_pricing()
-    
     # Sidebar
     st.sidebar.title("Settings")
     
+    # Initialize session state
+    select_project()
+    load_initial_pricing()
+    
     # Initial pricing file upload
     pricing_file = st.sidebar.file_uploader(
         "Upload Initial Pricing File (Excel)",
@@ -174,20 +320,40 @@ def main():
     )
     
     if pricing_file:
-        # Save the file permanently
-        file_path = save_uploaded_file(
-            pricing_file,
-            os.path.join('data', 'pricing')
-        )
-        st.session_state.pricing_file_path = file_path
-        
-        # Load and save to database
-        pricing_data = price_comparator.load_initial_pricing(file_path)
-        if db.save_initial_pricing(pricing_data):
-            st.session_state.initial_pricing = pricing_data
-            st.sidebar.success("Initial pricing data saved successfully")
-        else:
-            st.sidebar.error("Failed to save initial pricing data")
+        # Streamlit reruns this script on every interaction; only ingest a changed workbook
+        fingerprint = file_hash(pricing_file)
+        if fingerprint != st.session_state.pricing_fingerprint:
+            # Save the file permanently
+            file_path = save_uploaded_file(
+                pricing_file,
+                os.path.join(db.data_dir, 'pricing')
+            )
+            st.session_state.pricing_file_path = file_path
+            
+            # Load and save to database
+            try:
+                result = pricing_store.ingest(file_path, fingerprint)
+                pricing_data, pricing_index, version = pricing_store.current()
+                st.session_state.initial_pricing = pricing_data
+                st.session_state.pricing_index = pricing_index
+                st.session_state.pricing_version = version
+                st.session_state.pricing_fingerprint = fingerprint
+                st.sidebar.success(f"Initial pricing data saved successfully ({result['row_count']} items)")
+                if result.get('diff'):
+                    diff = result['diff']
+                    st.sidebar.info(
+                        f"Pricing revision: {diff['changed']} changed, {diff['added']} added, "
+                        f"{diff['removed']} removed; {result['reevaluated']} invoice items re-evaluated"
+                    )
+            except Exception as e:
+                st.sidebar.error(f"Failed to save initial pricing data: {e}")
+    
+    # Streaming processing option
+    stop_early = st.sidebar.checkbox(
+        "Stop reading pages once totals are found",
+        value=True,
+        help="Skip the remaining pages of long documents once header fields and totals are extracted"
+    )
     
     # Variance tolerance setting
     tolerance = st.sidebar.slider(
@@ -198,7 +364,13 @@ def main():
     ) / 100
     
     # Main content area
-    tab1, tab2, tab3 = st.tabs(["Invoice Analysis", "History", "Settings"])
+    unread_alerts = len(db.get_alerts(unread_only=True))
+    tab1, tab2, tab3, tab4 = st.tabs([
+        "Invoice Analysis",
+        "History",
+        "Settings",
+        f"Alerts ({unread_alerts})" if unread_alerts else "Alerts"
+    ])
     
     with tab1:
         st.header("Invoice Analysis")
@@ -211,21 +383,31 @@ def main():
         
         if uploaded_file and st.session_state.initial_pricing is not None:
             # Process invoice
-            with st.spinner("Processing invoice..."):
-                invoice_data = process_invoice(uploaded_file)
+            invoice_data = process_invoice(uploaded_file, stop_early)
             
             if invoice_data:
-                # Compare prices
-                comparison_results = price_comparator.compare_prices(
-                    invoice_data,
-                    st.session_state.initial_pricing,
-                    tolerance
-                )
-                
-                # Save variance analysis
-                invoice_id = db.save_invoice(invoice_data, uploaded_file.name)
-                if invoice_id:
-                    db.save_variance_analysis(invoice_id, comparison_results)
+                # The first comparison of a new invoice completes its trace
+                invoice_trace = st.session_state.pop('pending_trace', None)
+                with activate(invoice_trace):
+                    # Compare prices
+                    comparison_results = price_comparator.compare_prices(
+                        invoice_data,
+                        st.session_state.initial_pricing,
+                        tolerance,
+                        st.session_state.pricing_index
+                    )
+                    
+                    # Save variance analysis once per saved invoice
+                    invoice_id = st.session_state.get('last_invoice_id')
+                    if invoice_id and st.session_state.get('variance_saved_for') != invoice_id:
+                        db.save_variance_analysis(
+                            invoice_id,
+                            comparison_results,
+                            st.session_state.pricing_version['id'] if st.session_state.pricing_version else None
+                        )
+                        st.session_state.variance_saved_for = invoice_id
+                if invoice_trace is not None:
+                    db.save_trace(invoice_trace)
                 
                 # Display results
                 col1, col2 = st.columns(2)
@@ -242,11 +424,18 @@ def main():
                     st.write(f"Total Variance: {comparison_results['total_variance']:.2f}")
                     st.write(f"Variance Percentage: {comparison_results['summary']['total_variance_percentage']:.2f}%")
                 
+                # Learn the vendor layout once the extraction is confirmed
+                if st.button("Confirm Extraction & Learn Vendor Layout"):
+                    if invoice_processor.learn_template(st.session_state.last_invoice_path, invoice_data):
+                        st.success("Vendor layout saved; future invoices with this layout skip full-page OCR")
+                    else:
+                        st.warning("Could not learn a layout from this invoice")
+                
                 # Display variance chart
                 st.subheader("Variance Visualization")
                 fig = create_variance_chart(comparison_results)
                 if fig:
-                    st.plotly_chart(fig, use_container_width=True)
+                    show_chart(fig)
                 
                 # Export options
                 if st.button("Export to Excel"):
@@ -310,6 +499,29 @@ def main():
                 help="Number of invoices with variance > 10%"
             )
         
+        # Dashboard charts, drawn from the incrementally refreshed snapshot tables
+        with st.expander("Dashboard"):
+            categories = db.get_category_snapshot()
+            if categories:
+                show_chart(Visualizer.create_expense_breakdown_pie([
+                    {'category': row['category'], 'amount': row['actual_amount']} for row in categories
+                ]))
+                show_chart(Visualizer.create_budget_vs_actual_bar(
+                    [row['category'] for row in categories],
+                    [row['expected_amount'] for row in categories],
+                    [row['actual_amount'] for row in categories]
+                ))
+            vendors = db.get_vendor_snapshot()
+            if vendors:
+                show_chart(Visualizer.create_vendor_analysis_scatter(vendors))
+            today = datetime.now().date()
+            week_start = st.date_input("Week starting", value=today - timedelta(days=today.weekday()))
+            weekly = db.get_weekly_dashboard((week_start - timedelta(days=week_start.weekday())).isoformat())
+            if weekly['daily_expenses']['dates']:
+                show_chart(Visualizer.create_weekly_summary_subplot(weekly))
+            elif not categories and not vendors:
+                st.info("No invoices yet")
+        
         # Enhanced search interface
         st.subheader("Search Invoices")
         
@@ -400,13 +612,31 @@ def main():
         # Display trend analysis
         st.subheader("Trend Analysis")
         if st.button("Analyze Trends"):
-            trend_data = db.get_trend_data()
-            if not trend_data.empty:
-                fig = create_trend_chart(trend_data)
+            trends = db.get_item_variance_trends()
+            if not trends.empty:
+                fig = create_trend_chart(trends)
                 if fig:
-                    st.plotly_chart(fig, use_container_width=True)
+                    show_chart(fig)
+                fig = create_variance_time_chart(db.get_variance_time_series())
+                if fig:
+                    show_chart(fig)
             else:
                 st.info("Not enough data for trend analysis")
+        
+        # Variance report over all invoices, streamed from the database
+        st.subheader("Variance Report")
+        if st.button("Export Variance Report (All Invoices)"):
+            with st.spinner("Writing variance report..."):
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
+                    summary = write_variance_report(db.iter_variance_rows(), tmp_file.name, tolerance)
+            st.write(f"{summary['total_items']:,} items from {summary['invoices']:,} invoices")
+            with open(tmp_file.name, 'rb') as f:
+                st.download_button(
+                    "Download Variance Report",
+                    f,
+                    file_name=f"variance_report_all_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
     
     with tab3:
         st.header("Settings")
@@ -446,7 +676,8 @@ def main():
                     with st.spinner("Validating and restoring backup..."):
                         # Save uploaded backup temporarily
                         with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as tmp_file:
-                            tmp_file.write(backup_file.getvalue())
+                            copy_stream(backup_file, tmp_file)
+                            tmp_file.flush()
                             
                             # Validate backup
                             try:
@@ -514,7 +745,8 @@ def main():
                     with st.spinner("Validating and importing data..."):
                         # Save uploaded file temporarily
                         with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as tmp_file:
-                            tmp_file.write(import_file.getvalue())
+                            copy_stream(import_file, tmp_file)
+                            tmp_file.flush()
                             
                             # Extract and validate
                             temp_dir = os.path.join('data', 'imports', 'temp')
@@ -559,9 +791,9 @@ def main():
             # Display storage statistics
             storage_stats = {
                 'Database Size': f"{os.path.getsize(db.db_path) / (1024*1024):.2f} MB",
-                'Invoice Files': len(glob.glob(os.path.join('data', 'invoices', '*'))),
-                'Pricing Files': len(glob.glob(os.path.join('data', 'pricing', '*'))),
-                'Backup Files': len(glob.glob(os.path.join('data', 'backups', '*.zip')))
+                'Invoice Files': len(glob.glob(os.path.join(db.data_dir, 'invoices', '*'))),
+                'Pricing Files': len(glob.glob(os.path.join(db.data_dir, 'pricing', '*'))),
+                'Backup Files': len(glob.glob(os.path.join(db.backup_dir, '*.zip')))
             }
             
             st.write("Storage Statistics:")
@@ -580,5 +812,68 @@ def main():
         if st.button("Save OCR Settings"):
             st.success("OCR settings saved successfully")
 
+        # Per-backend OCR latency
+        st.write("OCR Backend Statistics:")
+        st.json(invoice_processor.ocr.get_backend_stats())
+        
+        st.write("Query Cache:")
+        st.json({**query_cache.get_stats(), 'data_version': db.get_data_version()})
+        
+        # Stage timings of recent invoices (utils/tracing.py)
+        st.subheader("Performance")
+        metrics_days = st.selectbox("Period", [1, 7, 30], index=1, format_func=lambda d: f"Last {d} days")
+        stage_metrics = db.get_stage_metrics(metrics_days)
+        if not stage_metrics.empty:
+            st.dataframe(
+                stage_metrics.style.format({
+                    'p50_ms': '{:,.1f}', 'p95_ms': '{:,.1f}', 'p99_ms': '{:,.1f}', 'max_ms': '{:,.1f}'
+                }),
+                use_container_width=True
+            )
+            st.write("Counters:")
+            st.json(db.get_trace_counters(metrics_days))
+        else:
+            st.info("No invoices processed in this period")
+    
+    with tab4:
+        st.header("Alerts")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            alert_type = st.selectbox(
+                "Alert Type",
+                [None, 'item_variance', 'price_trend', 'vendor_price_creep', 'budget'],
+                format_func=lambda x: 'All' if x is None else x.replace('_', ' ').title()
+            )
+        with col2:
+            unread_only = st.checkbox("Unread only", value=True)
+        
+        alerts = db.get_alerts(unread_only=unread_only, alert_type=alert_type)
+        if alerts:
+            st.dataframe(
+                pd.DataFrame(alerts)[['created_at', 'alert_type', 'severity', 'message', 'is_read']],
+                use_container_width=True
+            )
+            if st.button("Mark All as Read"):
+                db.mark_alerts_read([alert['id'] for alert in alerts])
+                st.rerun()
+        else:
+            st.info("No alerts")
+        
+        # Item thresholds override the default variance threshold
+        st.subheader("Item Thresholds")
+        if st.session_state.initial_pricing is not None and not st.session_state.initial_pricing.empty:
+            pricing = st.session_state.initial_pricing
+            with st.form("alert_threshold"):
+                item = st.selectbox("Item", pricing['description'].tolist())
+                threshold = st.number_input("Variance threshold (%)", min_value=0.1, value=10.0)
+                if st.form_submit_button("Save Threshold"):
+                    row = pricing[pricing['description'] == item].iloc[0]
+                    db.set_alert_threshold(row_key(row.get('item_code'), row['description']), threshold)
+                    st.success("Threshold saved")
+            thresholds = db.get_alert_thresholds()
+            if thresholds:
+                st.json(thresholds)
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Compare two benchmark result files stage by stage.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.1
+
+Exits with status 1 when a stage's median got slower than the threshold
+allows or an accuracy score dropped, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def compare_results(baseline: Dict[str, Any], candidate: Dict[str, Any],
+                    threshold: float = 0.1) -> Dict[str, Any]:
+    """
+    Compare the stage medians and accuracy of two benchmark runs.
+
+    Args:
+        baseline (Dict[str, Any]): Earlier results
+        candidate (Dict[str, Any]): Later results
+        threshold (float): Relative slowdown of a median counted as a regression
+
+    Returns:
+        Dict[str, Any]: 'stages' rows, 'accuracy' rows and 'regressions' (names)
+    """
+    stages, regressions = [], []
+    for stage, before in baseline.get('stages', {}).items():
+        after = candidate.get('stages', {}).get(stage, {})
+        if not before.get('count') or not after.get('count'):
+            continue
+        change = after['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+        stages.append({
+            'stage': stage,
+            'baseline_p50_ms': before['p50_ms'],
+            'candidate_p50_ms': after['p50_ms'],
+            'change': change,
+        })
+        if change > threshold:
+            regressions.append(stage)
+
+    accuracy = []
+    for key, before in baseline.get('accuracy', {}).items():
+        after = candidate.get('accuracy', {}).get(key)
+        if after is None:
+            continue
+        accuracy.append({'metric': key, 'baseline': before, 'candidate': after})
+        if after < before:
+            regressions.append(f"accuracy.{key}")
+
+    return {'stages': stages, 'accuracy': accuracy, 'regressions': regressions}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('baseline', help="Earlier result file")
+    parser.add_argument('candidate', help="Later result file")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed relative slowdown of a median")
+    args = parser.parse_args(argv)
+
+    results = []
+    for path in (args.baseline, args.candidate):
+        with open(path, 'r', encoding='utf-8') as f:
+            results.append(json.load(f))
+    baseline, candidate = results
+
+    if baseline.get('config') != candidate.get('config'):
+        print("Warning: the runs used different configurations", file=sys.stderr)
+
+    comparison = compare_results(baseline, candidate, args.threshold)
+    print(f"{(baseline.get('commit') or '?')[:7]} -> {(candidate.get('commit') or '?')[:7]}")
+    for row in comparison['stages']:
+        flag = '  REGRESSION' if row['stage'] in comparison['regressions'] else ''
+        print(f"{row['stage']:<14} {row['baseline_p50_ms']:>9.2f} ms -> {row['candidate_p50_ms']:>9.2f} ms "
+              f"({row['change']:+.1%}){flag}")
+    for row in comparison['accuracy']:
+        flag = '  REGRESSION' if f"accuracy.{row['metric']}" in comparison['regressions'] else ''
+        print(f"{row['metric']:<24} {row['baseline']:.3f} -> {row['candidate']:.3f}{flag}")
+    return 1 if comparison['regressions'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
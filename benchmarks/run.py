@@ -0,0 +1,277 @@
+"""
+End-to-end ingestion benchmark.
+
+Generates a synthetic dataset, times every stage of the ingestion path on
+it and writes the timings, extraction accuracy and environment to a JSON
+file for comparison between commits (see benchmarks/compare.py):
+
+    python -m benchmarks.run --invoices 50 --pricing-rows 20000
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+Stages:
+    generate        Writing the dataset (not part of ingestion, for reference)
+    pricing_load    read_pricing_workbook on the pricing sheet
+    pricing_index   Building the PricingIndex
+    ocr             OCRProcessor.ocr_file_pages per invoice
+    invoice         InvoiceProcessor.process_invoice per invoice
+    compare         PriceComparator.compare_prices per invoice
+    database        Database.save_invoice and save_variance_analysis per invoice
+
+compare and database run on the ground truth line items, so their timings
+do not depend on extraction accuracy. Stages that cannot run are recorded
+with their error instead of timings. Without an OCR backend installed, the
+scanned invoices are left out of ocr and invoice (see 'skipped_inputs') and
+the born-digital PDFs still run through their text layer.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .synthetic import generate_dataset
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+class StageTimer:
+    """Collect per-call timings and errors of named stages."""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, Any]] = {}
+
+    def run(self, stage: str, func: Callable, *args, **kwargs) -> Any:
+        """Time one call of a stage; errors are counted and None is returned."""
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            error = self.errors.setdefault(stage, {'count': 0, 'first': f"{type(e).__name__}: {e}"})
+            error['count'] += 1
+            return None
+        self.record(stage, time.perf_counter() - start)
+        return result
+
+    def record(self, stage: str, seconds: float):
+        """Add a timing measured elsewhere, e.g. in a subprocess."""
+        self.timings.setdefault(stage, []).append(seconds)
+
+    def skip(self, stage: str, reason: str):
+        self.errors[stage] = {'count': 0, 'first': reason, 'skipped': True}
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        stages = {}
+        for stage in list(self.timings) + [s for s in self.errors if s not in self.timings]:
+            timings = np.array(self.timings.get(stage, []))
+            stats: Dict[str, Any] = {'count': int(len(timings))}
+            if len(timings):
+                stats.update({
+                    'total_s': float(timings.sum()),
+                    'mean_ms': float(timings.mean() * 1000),
+                    'p50_ms': float(np.percentile(timings, 50) * 1000),
+                    'p95_ms': float(np.percentile(timings, 95) * 1000),
+                    'max_ms': float(timings.max() * 1000),
+                })
+            if stage in self.errors:
+                stats['errors'] = self.errors[stage]
+            stages[stage] = stats
+        return stages
+
+
+def _git_revision() -> Dict[str, Any]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def _same_amount(a: Any, b: Any) -> bool:
+    try:
+        return abs(float(a) - float(b)) < 0.01
+    except (TypeError, ValueError):
+        return False
+
+
+def score_extraction(truth: Dict[str, Any], extracted: Dict[str, Any]) -> Dict[str, float]:
+    """Share of header fields and line item amounts extracted correctly."""
+    extracted_date = extracted.get('date')
+    if isinstance(extracted_date, (date, datetime)):
+        extracted_date = extracted_date.strftime('%Y-%m-%d')
+    amounts = [item.get('amount') for item in extracted.get('line_items') or []]
+    found = sum(
+        1 for item in truth['line_items']
+        if any(_same_amount(item['amount'], amount) for amount in amounts)
+    )
+    return {
+        'invoice_number': float(str(extracted.get('invoice_number', '')) == truth['invoice_number']),
+        'date': float(str(extracted_date)[:10] == truth['date']),
+        'total_amount': float(_same_amount(extracted.get('total_amount'), truth['total_amount'])),
+        'vendor': float(truth['vendor'] in str(extracted.get('vendor', ''))),
+        'line_items': found / len(truth['line_items']) if truth['line_items'] else 1.0,
+    }
+
+
+def run_benchmark(work_dir: str, invoices: int = 20, items: int = 15, pricing_rows: int = 1000,
+                  scanned_ratio: float = 0.3, noise: float = 1.0, seed: int = 0,
+                  tolerance: float = 0.05) -> Dict[str, Any]:
+    """
+    Run every stage on a freshly generated dataset.
+
+    The application database is created under work_dir, so the real data
+    directory is never touched.
+
+    Returns:
+        Dict[str, Any]: Benchmark results (config, environment, stages, accuracy)
+    """
+    os.environ['INVOICE_ANALYZER_DATA_DIR'] = os.path.join(work_dir, 'data')
+
+    from utils.database import Database
+    from utils.price_comparator import PriceComparator
+    from utils.pricing_store import PricingIndex, read_pricing_workbook
+
+    timer = StageTimer()
+    dataset = timer.run(
+        'generate', generate_dataset, os.path.join(work_dir, 'inputs'),
+        invoices=invoices, items=items, pricing_rows=pricing_rows,
+        scanned_ratio=scanned_ratio, noise=noise, seed=seed
+    )
+    if dataset is None:
+        raise RuntimeError(f"Could not generate the dataset: {timer.errors['generate']['first']}")
+    truth = dataset['invoices']
+
+    pricing = timer.run('pricing_load', read_pricing_workbook, dataset['pricing_path'])
+    if pricing is None:
+        pricing = dataset['pricing']
+    index = timer.run('pricing_index', PricingIndex, pricing['description'].tolist())
+
+    # Scans need an OCR backend; born-digital PDFs are read from their text layer
+    from utils.invoice_processor import InvoiceProcessor
+    processor = InvoiceProcessor()
+    ocr_error = None
+    try:
+        # Engines load lazily; find out here rather than on every scanned page
+        processor.ocr.backend
+    except Exception as e:
+        ocr_error = f"{type(e).__name__}: {e}"
+
+    accuracy: Dict[str, List[float]] = {}
+    skipped_scans = 0
+    for invoice in truth:
+        if invoice['kind'] == 'scan' and ocr_error:
+            skipped_scans += 1
+            continue
+        timer.run('ocr', processor.ocr.ocr_file_pages, invoice['file_path'])
+        extracted = timer.run('invoice', processor.process_invoice, invoice['file_path'])
+        if extracted is not None:
+            for field, score in score_extraction(invoice, extracted).items():
+                accuracy.setdefault(f"{invoice['kind']}.{field}", []).append(score)
+    for stage in ('ocr', 'invoice'):
+        if stage not in timer.timings and ocr_error and skipped_scans:
+            timer.skip(stage, ocr_error)
+
+    comparator = PriceComparator()
+    db = Database()
+    for invoice in truth:
+        comparison = timer.run('compare', comparator.compare_prices, invoice, pricing, tolerance, index)
+        if not comparison:
+            continue
+
+        def save(invoice=invoice, comparison=comparison):
+            invoice_id = db.save_invoice(invoice, invoice['file_path'])
+            if not invoice_id:
+                raise RuntimeError(f"save_invoice failed for {invoice['invoice_number']}")
+            db.save_variance_analysis(invoice_id, comparison)
+
+        timer.run('database', save)
+
+    return {
+        'benchmark': 'ingestion',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        **_git_revision(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'invoices': invoices,
+            'items': items,
+            'pricing_rows': pricing_rows,
+            'scanned_ratio': scanned_ratio,
+            'noise': noise,
+            'seed': seed,
+            'tolerance': tolerance,
+            # Arabic text is left out of the dataset when the Arabic font is missing
+            'arabic': dataset['arabic'],
+        },
+        'stages': timer.summary(),
+        'skipped_inputs': {'scan': skipped_scans, 'reason': ocr_error} if skipped_scans else {},
+        'accuracy': {key: float(np.mean(scores)) for key, scores in sorted(accuracy.items())},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark invoice ingestion on synthetic invoices")
+    parser.add_argument('--invoices', type=int, default=20, help="Invoices generated")
+    parser.add_argument('--items', type=int, default=15, help="Line items per invoice")
+    parser.add_argument('--pricing-rows', type=int, default=1000, help="Pricing sheet rows")
+    parser.add_argument('--scanned-ratio', type=float, default=0.3, help="Share of invoices written as scans")
+    parser.add_argument('--noise', type=float, default=1.0, help="Noise strength of scans")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated files and database")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='invoice_benchmark_')
+    try:
+        results = run_benchmark(
+            work_dir, args.invoices, args.items, args.pricing_rows,
+            args.scanned_ratio, args.noise, args.seed
+        )
+    finally:
+        if args.keep:
+            print(f"Benchmark files kept in {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{(results['commit'] or 'nogit')[:7]}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    for stage, stats in results['stages'].items():
+        if stats['count']:
+            print(f"{stage:<14} {stats['count']:>5} calls  p50 {stats['p50_ms']:>9.2f} ms  "
+                  f"p95 {stats['p95_ms']:>9.2f} ms")
+        else:
+            print(f"{stage:<14} skipped: {stats['errors']['first']}")
+    if results['skipped_inputs']:
+        print(f"{results['skipped_inputs']['scan']} scanned invoices skipped: {results['skipped_inputs']['reason']}")
+    if not results['config']['arabic']:
+        print("Arabic font not found in data/fonts; the dataset is English only")
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
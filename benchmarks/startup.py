@@ -0,0 +1,183 @@
+"""
+Cold start benchmark.
+
+Times, in fresh interpreters, what the Streamlit app pays before its first
+page renders, and checks that heavy libraries stay out of it:
+
+    python -m benchmarks.startup --repeat 5
+    python -m benchmarks.compare benchmarks/results/old_startup.json benchmarks/results/new_startup.json
+
+Stages:
+    interpreter     Starting Python (for reference)
+    imports         Importing the modules app.py imports, read from its source
+    processors      Creating the database, invoice processor, price comparator and pricing store
+    total           The whole subprocess, interpreter included
+
+OCR engines, torch, OpenCV, pdfplumber and the report libraries load on
+first use or in the OCR warm-up thread. The run exits with status 1 when
+any of them (see HEAVY_MODULES) is imported during startup, or when the
+median total exceeds --budget seconds.
+"""
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .run import RESULTS_DIR, StageTimer, _git_revision
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported before the first page renders
+HEAVY_MODULES = (
+    'torch', 'easyocr', 'tesserocr', 'cv2', 'pdfplumber', 'pdfminer',
+    'reportlab', 'sklearn', 'openai', 'pytesseract', 'plotly.express', 'kaleido',
+)
+
+_CHILD = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+modules, heavy = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+for module in modules:
+    importlib.import_module(module)
+imported = time.perf_counter()
+from utils.database import Database
+from utils.invoice_processor import InvoiceProcessor
+from utils.price_comparator import PriceComparator
+from utils.pricing_store import PricingStore
+from utils.template_store import TemplateStore
+db = Database()
+InvoiceProcessor(template_store=TemplateStore(db))
+PriceComparator()
+PricingStore(db)
+done = time.perf_counter()
+print(json.dumps({
+    'imports': imported - start,
+    'processors': done - imported,
+    'heavy': sorted(module for module in heavy if module in sys.modules),
+}))
+'''
+
+
+def app_imports(app_path: str = os.path.join(ROOT_DIR, 'app.py')) -> Dict[str, List[str]]:
+    """
+    Top-level modules imported by app.py.
+
+    Returns:
+        Dict[str, List[str]]: 'modules' to import and 'missing' ones not installed here
+    """
+    with open(app_path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    modules = list(dict.fromkeys(modules))
+    missing = [module for module in modules if importlib.util.find_spec(module.split('.')[0]) is None]
+    return {'modules': [module for module in modules if module not in missing], 'missing': missing}
+
+
+def _run_child(modules: List[str], env: Dict[str, str]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-c', _CHILD, json.dumps(modules), json.dumps(HEAVY_MODULES)],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True
+    )
+    total = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else 'startup failed')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['total'] = total
+    return result
+
+
+def run_startup_benchmark(repeat: int = 5) -> Dict[str, Any]:
+    """
+    Start the app's imports and processors repeat times in fresh interpreters.
+
+    The database lives in a temporary data directory; a first unrecorded
+    run creates its schema, so the timings are those of a restart.
+
+    Returns:
+        Dict[str, Any]: Benchmark results (environment, stages, heavy modules loaded)
+    """
+    imports = app_imports()
+    work_dir = tempfile.mkdtemp(prefix='invoice_startup_')
+    env = dict(os.environ, INVOICE_ANALYZER_DATA_DIR=os.path.join(work_dir, 'data'), PYTHONPATH=ROOT_DIR)
+    env.pop('INVOICE_PROFILE_THRESHOLD', None)
+    timer = StageTimer()
+    heavy = set()
+    try:
+        _run_child(imports['modules'], env)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'pass'], check=True)
+            timer.record('interpreter', time.perf_counter() - start)
+
+            result = _run_child(imports['modules'], env)
+            for stage in ('imports', 'processors', 'total'):
+                timer.record(stage, result[stage])
+            heavy.update(result['heavy'])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'benchmark': 'startup',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        **_git_revision(),
+        'environment': {
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+            'not_installed': imports['missing'],
+        },
+        'config': {'repeat': repeat},
+        'stages': timer.summary(),
+        'heavy_modules': sorted(heavy),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the app")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters started")
+    parser.add_argument('--budget', type=float, default=None, help="Largest allowed median total in seconds")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<time>_<commit>_startup.json)")
+    args = parser.parse_args(argv)
+
+    results = run_startup_benchmark(args.repeat)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{(results['commit'] or 'nogit')[:7]}_startup.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    for stage, stats in results['stages'].items():
+        print(f"{stage:<12} p50 {stats['p50_ms']:>9.1f} ms  max {stats['max_ms']:>9.1f} ms")
+    if results['environment']['not_installed']:
+        print(f"Not installed, left out: {', '.join(results['environment']['not_installed'])}")
+    print(f"Results written to {output}")
+
+    failed = False
+    if results['heavy_modules']:
+        print(f"Imported during startup: {', '.join(results['heavy_modules'])}", file=sys.stderr)
+        failed = True
+    total = results['stages']['total']['p50_ms'] / 1000
+    if args.budget is not None and total > args.budget:
+        print(f"Median startup {total:.2f}s exceeds the {args.budget:.2f}s budget", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
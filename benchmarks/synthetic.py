@@ -0,0 +1,442 @@
+"""
+Synthetic bilingual invoices and pricing sheets with known ground truth.
+
+Invoices are written either as born-digital PDFs (with a text layer) or as
+noisy scanned images: slightly rotated, blurred, speckled and JPEG
+compressed. Arabic labels, vendors and item names are used when the Arabic
+font in data/fonts can be loaded; otherwise every invoice is written in
+English, since Arabic text drawn without the font cannot be read back.
+
+word_boxes() lays out a scanned page as the word boxes OCR would report,
+without rendering it, for the labelled table samples in data/samples.
+"""
+import io
+import json
+import math
+import os
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from utils.ocr_backends import contains_arabic
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARABIC_FONT_PATH = os.path.join(ROOT_DIR, 'data', 'fonts', 'NotoNaskhArabic-Regular.ttf')
+
+MATERIALS = [
+    ('Ready-mix concrete', 'خرسانة جاهزة', 'm3'),
+    ('Reinforcement steel', 'حديد تسليح', 'ton'),
+    ('Cement bags', 'أكياس أسمنت', 'bag'),
+    ('Concrete blocks', 'بلوك خرساني', 'pc'),
+    ('Washed sand', 'رمل مغسول', 'm3'),
+    ('Crushed aggregate', 'حصى مكسر', 'm3'),
+    ('Ceramic tiles', 'بلاط سيراميك', 'm2'),
+    ('Waterproofing membrane', 'عازل مائي', 'roll'),
+    ('PVC pipes', 'مواسير بي في سي', 'm'),
+    ('Electrical cable', 'كابل كهربائي', 'm'),
+    ('Plywood sheets', 'ألواح خشب', 'sheet'),
+    ('Paint', 'دهان', 'l'),
+]
+
+VENDORS = [
+    'Al Noor Trading', 'Gulf Building Supplies', 'شركة البناء الحديث',
+    'Delta Steel Co', 'مؤسسة الأمل للمقاولات', 'Cairo Cement Est',
+]
+
+LABELS = {
+    'en': {
+        'title': 'TAX INVOICE',
+        'vendor': 'Vendor',
+        'invoice_number': 'Invoice No',
+        'date': 'Date',
+        'columns': ('Description', 'Qty', 'Unit', 'Unit Price', 'Amount'),
+        'total': 'Total Amount',
+    },
+    'ar': {
+        'title': 'فاتورة ضريبية',
+        'vendor': 'المورد',
+        'invoice_number': 'رقم الفاتورة',
+        'date': 'التاريخ',
+        'columns': ('البند', 'الكمية', 'الوحدة', 'سعر الوحدة', 'المبلغ'),
+        'total': 'المبلغ الإجمالي',
+    },
+}
+
+# Table columns and the left edge of each, as a fraction of the page width
+COLUMNS = ('description', 'quantity', 'unit', 'unit_price', 'amount')
+COLUMN_X = (0.06, 0.52, 0.62, 0.72, 0.85)
+ROWS_PER_PAGE = 30
+
+# A4 at 150 dpi for scanned pages
+SCAN_SIZE = (1240, 1754)
+
+
+def _arabic_font_available() -> bool:
+    try:
+        ImageFont.truetype(ARABIC_FONT_PATH, 12)
+        return True
+    except OSError:
+        return False
+
+
+def generate_pricing(rows: int, seed: int = 0, arabic: bool = True) -> pd.DataFrame:
+    """
+    Generate a pricing sheet with unique bilingual descriptions.
+
+    Args:
+        rows (int): Pricing rows
+        seed (int): Random seed
+        arabic (bool): Use Arabic names for about half the rows (English only otherwise)
+
+    Returns:
+        pd.DataFrame: Columns item_code, description, unit, unit_price
+    """
+    rng = random.Random(seed)
+    records = []
+    for number in range(rows):
+        english, arabic_name, unit = MATERIALS[number % len(MATERIALS)]
+        name = arabic_name if rng.random() < 0.5 and arabic else english
+        records.append({
+            'item_code': f"BOQ-{number:06d}",
+            'description': f"{name} #{number:06d}",
+            'unit': unit,
+            'unit_price': round(rng.uniform(5, 5000), 2),
+        })
+    return pd.DataFrame.from_records(records)
+
+
+def write_pricing(pricing: pd.DataFrame, output_path: str):
+    """Write a pricing sheet as an xlsx workbook readable by read_pricing_workbook."""
+    workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True})
+    sheet = workbook.add_worksheet('Pricing')
+    sheet.write_row(0, 0, list(pricing.columns))
+    for row, values in enumerate(pricing.itertuples(index=False), start=1):
+        sheet.write_row(row, 0, values)
+    workbook.close()
+
+
+def generate_invoice(pricing: pd.DataFrame, number: int, items: int, seed: int = 0,
+                     language: str = 'en', unmatched_ratio: float = 0.1, arabic: bool = True) -> Dict[str, Any]:
+    """
+    Generate the ground truth of one invoice priced against a pricing sheet.
+
+    Args:
+        pricing (pd.DataFrame): Pricing sheet the items are drawn from
+        number (int): Invoice sequence number
+        items (int): Line items
+        seed (int): Random seed
+        language (str): 'en' or 'ar' labels
+        unmatched_ratio (float): Share of items missing from the pricing sheet
+        arabic (bool): Allow Arabic vendor names (English vendors only otherwise)
+
+    Returns:
+        Dict[str, Any]: invoice_number, vendor, date, total_amount, language, line_items
+    """
+    rng = random.Random(f"{seed}:{number}")
+    line_items = []
+    for index in range(items):
+        if rng.random() < unmatched_ratio:
+            english, arabic_name, unit = rng.choice(MATERIALS)
+            description = f"{arabic_name if language == 'ar' else english} extra {number:04d}-{index:03d}"
+            unit_price = round(rng.uniform(5, 5000), 2)
+        else:
+            row = pricing.iloc[rng.randrange(len(pricing))]
+            description, unit = row['description'], row['unit']
+            # Invoiced prices drift around the baseline
+            unit_price = round(row['unit_price'] * (1 + rng.uniform(-0.1, 0.2)), 2)
+        quantity = float(rng.randint(1, 200))
+        line_items.append({
+            'description': description,
+            'quantity': quantity,
+            'unit': unit,
+            'unit_price': unit_price,
+            'amount': round(quantity * unit_price, 2),
+        })
+
+    return {
+        'invoice_number': f"INV-{seed:02d}{number:05d}",
+        'vendor': rng.choice(VENDORS if arabic else [vendor for vendor in VENDORS if vendor.isascii()]),
+        'date': (date(2025, 1, 1) + timedelta(days=rng.randrange(365))).isoformat(),
+        'total_amount': round(sum(item['amount'] for item in line_items), 2),
+        'language': language,
+        'line_items': line_items,
+    }
+
+
+def _wrap(text: str, width: Optional[int]) -> List[str]:
+    """Split text into lines of at most width characters (one line without a width)."""
+    if not width:
+        return [text]
+    lines = []
+    for word in text.split():
+        if lines and len(lines[-1]) + 1 + len(word) <= width:
+            lines[-1] += ' ' + word
+        else:
+            lines.append(word)
+    return lines or ['']
+
+
+def _layout(invoice: Dict[str, Any], columns: Sequence[str] = COLUMNS,
+            wrap: Optional[int] = None) -> List[List[Tuple[float, str]]]:
+    """
+    Lines of text per page as (x fraction, text) pairs.
+
+    Args:
+        invoice (Dict[str, Any]): Ground truth from generate_invoice
+        columns (Sequence[str]): Table columns printed, out of COLUMNS
+        wrap (int, optional): Characters after which descriptions continue on the next line
+    """
+    labels = LABELS[invoice['language']]
+    day = date.fromisoformat(invoice['date'])
+    header = [
+        [(0.06, labels['title'])],
+        [(0.06, f"{labels['vendor']}: {invoice['vendor']}")],
+        [(0.06, f"{labels['invoice_number']}: {invoice['invoice_number']}")],
+        [(0.06, f"{labels['date']}: {day.strftime('%d/%m/%Y')}")],
+        [],
+    ]
+    shown = [index for index, column in enumerate(COLUMNS) if column in columns]
+    table_header = [(COLUMN_X[index], labels['columns'][index]) for index in shown]
+
+    pages = []
+    items = invoice['line_items']
+    for start in range(0, max(len(items), 1), ROWS_PER_PAGE):
+        lines = list(header) if not pages else []
+        lines.append(table_header)
+        for item in items[start:start + ROWS_PER_PAGE]:
+            description = _wrap(item['description'], wrap)
+            cells = (
+                description[0],
+                f"{item['quantity']:g}",
+                item['unit'],
+                f"{item['unit_price']:,.2f}",
+                f"{item['amount']:,.2f}",
+            )
+            lines.append([(COLUMN_X[index], cells[index]) for index in shown])
+            lines.extend([(COLUMN_X[0], text)] for text in description[1:])
+        pages.append(lines)
+    pages[-1].extend([[], [(0.52, f"{labels['total']}: {invoice['total_amount']:,.2f}")]])
+    return pages
+
+
+def write_pdf(invoice: Dict[str, Any], output_path: str):
+    """Write an invoice as a born-digital PDF with a text layer."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'Helvetica'
+    if invoice['language'] == 'ar':
+        if 'BenchmarkArabic' not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont('BenchmarkArabic', ARABIC_FONT_PATH))
+        font = 'BenchmarkArabic'
+
+    width, height = A4
+    pdf = canvas.Canvas(output_path, pagesize=A4)
+    for lines in _layout(invoice):
+        pdf.setFont(font, 9)
+        y = height - 60
+        for line in lines:
+            for x, text in line:
+                pdf.drawString(x * width, y, text)
+            y -= 18
+        pdf.showPage()
+    pdf.save()
+
+
+def write_scan(invoice: Dict[str, Any], output_path: str, noise: float = 1.0, seed: int = 0):
+    """
+    Write an invoice as a noisy scanned image (first page only).
+
+    Args:
+        invoice (Dict[str, Any]): Ground truth from generate_invoice
+        output_path (str): Path of the JPEG image
+        noise (float): Noise strength; 0 gives a clean render
+        seed (int): Random seed of the noise
+    """
+    rng = np.random.default_rng(seed)
+    try:
+        font = ImageFont.truetype(ARABIC_FONT_PATH, 22)
+    except OSError:
+        font = ImageFont.load_default()
+
+    image = Image.new('L', SCAN_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    y = 80
+    for line in _layout(invoice)[0]:
+        for x, text in line:
+            draw.text((x * SCAN_SIZE[0], y), text, fill=0, font=font)
+        y += 40
+
+    if noise:
+        image = image.rotate(float(rng.uniform(-1.5, 1.5)) * noise, fillcolor=255, resample=Image.BICUBIC)
+        image = image.filter(ImageFilter.GaussianBlur(0.6 * noise))
+        pixels = np.asarray(image, dtype=np.float32)
+        pixels += rng.normal(0, 12 * noise, pixels.shape)
+        # Paper speckle
+        speckle = rng.random(pixels.shape) < 0.002 * noise
+        pixels[speckle] = 0
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=max(30, int(85 - 25 * noise)))
+    with open(output_path, 'wb') as f:
+        f.write(buffer.getvalue())
+
+
+def word_boxes(invoice: Dict[str, Any], noise: float = 1.0, seed: int = 0,
+               columns: Sequence[str] = COLUMNS, wrap: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Word boxes an OCR backend would report for the first page of a scanned invoice.
+
+    Boxes are laid out on the SCAN_SIZE page from estimated text widths, so
+    no font is needed and Arabic invoices can be written anywhere. Arabic
+    invoices are mirrored: columns run right to left and the words of an
+    Arabic cell are placed right to left. Noise skews the page and jitters
+    every line and word box, as OCR of a slightly rotated scan does.
+
+    Args:
+        invoice (Dict[str, Any]): Ground truth from generate_invoice
+        noise (float): Jitter strength; 0 gives exact boxes
+        seed (int): Random seed of the jitter
+        columns (Sequence[str]): Table columns printed, out of COLUMNS
+        wrap (int, optional): Characters after which descriptions continue on the next line
+
+    Returns:
+        List[Dict[str, Any]]: Word boxes with text, x0, y0, x1, y1 keys
+    """
+    rng = random.Random(seed)
+    width = SCAN_SIZE[0]
+    char_width, height = 11, 22
+    mirrored = invoice['language'] == 'ar'
+    skew = math.tan(math.radians(rng.uniform(-0.3, 0.3) * noise))
+
+    words = []
+    y = 80
+    for line in _layout(invoice, columns, wrap)[0]:
+        line_offset = rng.gauss(0, 1.5 * noise)
+        for x, text in line:
+            tokens = text.split()
+            lengths = [len(token) * char_width for token in tokens]
+            span = sum(lengths) + char_width * (len(tokens) - 1)
+            left = (1 - x) * width - span if mirrored else x * width
+            if contains_arabic(text):
+                tokens, lengths = tokens[::-1], lengths[::-1]
+            for token, length in zip(tokens, lengths):
+                top = y + line_offset + left * skew + rng.gauss(0, noise)
+                x0 = left + rng.gauss(0, 1.5 * noise)
+                words.append({
+                    'text': token,
+                    'x0': round(x0),
+                    'y0': round(top),
+                    'x1': round(x0 + length),
+                    'y1': round(top + height + rng.gauss(0, noise)),
+                })
+                left += length + char_width
+        y += 40
+    return words
+
+
+def generate_line_item_samples(items: int = 6, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Labelled scanned pages for evaluating the table extractor.
+
+    Covers OCR jitter, wrapped descriptions, Arabic headers and tables with
+    missing columns, in the format of data/samples/line_items.json (see
+    utils.table_extractor.evaluate).
+
+    Args:
+        items (int): Line items per sample
+        seed (int): Random seed
+
+    Returns:
+        List[Dict[str, Any]]: Samples with name, words and line_items
+    """
+    pricing = generate_pricing(200, seed)
+    variants = [
+        ('en_scan_jitter', 'en', 1.0, COLUMNS, None),
+        ('en_scan_heavy_jitter', 'en', 3.0, COLUMNS, None),
+        ('en_wrapped_descriptions', 'en', 1.0, COLUMNS, 14),
+        ('en_missing_quantity_and_unit', 'en', 1.0, ('description', 'unit_price', 'amount'), None),
+        ('en_missing_unit_price', 'en', 1.0, ('description', 'quantity', 'unit', 'amount'), None),
+        ('ar_headers_rtl_jitter', 'ar', 1.0, COLUMNS, None),
+        ('ar_wrapped_missing_unit', 'ar', 1.0, ('description', 'quantity', 'unit_price', 'amount'), 12),
+    ]
+
+    samples = []
+    for number, (name, language, noise, columns, wrap) in enumerate(variants):
+        invoice = generate_invoice(pricing, number, items, seed, language, unmatched_ratio=0)
+        samples.append({
+            'name': name,
+            'words': word_boxes(invoice, noise, seed + number, columns, wrap),
+            'line_items': [
+                {key: item[key] for key in ('description', 'quantity', 'unit_price', 'amount')}
+                for item in invoice['line_items']
+            ],
+        })
+    return samples
+
+
+def generate_dataset(output_dir: str, invoices: int = 20, items: int = 15, pricing_rows: int = 1000,
+                     scanned_ratio: float = 0.3, arabic_ratio: float = 0.5, noise: float = 1.0,
+                     seed: int = 0) -> Dict[str, Any]:
+    """
+    Generate a pricing sheet and invoices with ground truth in a directory.
+
+    Args:
+        output_dir (str): Directory for the files
+        invoices (int): Invoices generated
+        items (int): Line items per invoice
+        pricing_rows (int): Pricing sheet rows
+        scanned_ratio (float): Share of invoices written as scanned images
+        arabic_ratio (float): Share of invoices with Arabic labels (needs the Arabic font)
+        noise (float): Noise strength of scanned images
+        seed (int): Random seed
+
+    Returns:
+        Dict[str, Any]: pricing_path, pricing (DataFrame), invoices (ground truth with 'file_path')
+        and arabic (whether Arabic text was used)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    arabic = _arabic_font_available()
+
+    pricing = generate_pricing(pricing_rows, seed, arabic)
+    pricing_path = os.path.join(output_dir, 'pricing.xlsx')
+    write_pricing(pricing, pricing_path)
+
+    truth = []
+    for number in range(invoices):
+        language = 'ar' if arabic and rng.random() < arabic_ratio else 'en'
+        invoice = generate_invoice(pricing, number, items, seed, language, arabic=arabic)
+        if rng.random() < scanned_ratio:
+            invoice['file_path'] = os.path.join(output_dir, f"invoice_{number:05d}.jpg")
+            invoice['kind'] = 'scan'
+            # Scans hold the first page only
+            invoice['line_items'] = invoice['line_items'][:ROWS_PER_PAGE]
+            invoice['total_amount'] = round(sum(item['amount'] for item in invoice['line_items']), 2)
+            write_scan(invoice, invoice['file_path'], noise, seed + number)
+        else:
+            invoice['file_path'] = os.path.join(output_dir, f"invoice_{number:05d}.pdf")
+            invoice['kind'] = 'pdf'
+            write_pdf(invoice, invoice['file_path'])
+        truth.append(invoice)
+
+    with open(os.path.join(output_dir, 'ground_truth.json'), 'w', encoding='utf-8') as f:
+        json.dump(truth, f, ensure_ascii=False, indent=2)
+    return {'pricing_path': pricing_path, 'pricing': pricing, 'invoices': truth, 'arabic': arabic}
+
+
+def load_ground_truth(output_dir: str) -> Optional[List[Dict[str, Any]]]:
+    """Ground truth written by generate_dataset, if present."""
+    path = os.path.join(output_dir, 'ground_truth.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
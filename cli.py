@@ -0,0 +1,164 @@
+import argparse
+import json
+import sys
+
+from utils.invoice_processor import InvoiceProcessor
+
+
+def process_command(args) -> int:
+    """Process invoice files, reporting progress page by page."""
+    profiler = None
+    if args.profile_threshold is not None:
+        from utils.profiler import SlowInvoiceProfiler
+
+        profiler = SlowInvoiceProfiler(args.profile_threshold, mode=args.profile_mode)
+    processor = InvoiceProcessor(profiler=profiler)
+    exit_code = 0
+
+    for file_path in args.files:
+        invoice_data = {}
+        try:
+            with processor.profile(file_path):
+                for event in processor.iter_process_invoice(file_path, stop_when_complete=args.stop_early):
+                    if event['type'] == 'page':
+                        found = ', '.join(sorted(event['fields'])) or '-'
+                        print(
+                            f"{file_path}: page {event['page_number']}/{event['page_count']} "
+                            f"[{event['backend']}] fields: {found}; items: {event['line_items']}",
+                            file=sys.stderr
+                        )
+                    else:
+                        invoice_data = event['invoice']
+                        if event['stopped_early']:
+                            print(
+                                f"{file_path}: stopped after {event['pages_processed']} of "
+                                f"{event['page_count']} pages",
+                                file=sys.stderr
+                            )
+        except Exception as e:
+            print(f"{file_path}: error: {e}", file=sys.stderr)
+            exit_code = 1
+            continue
+
+        print(json.dumps({'file': file_path, 'invoice': invoice_data}, ensure_ascii=False, default=str))
+
+    return exit_code
+
+
+def profiles_command(args) -> int:
+    """List stored profiles of slow invoices, or process one's input again under cProfile."""
+    import cProfile
+    import os
+    import pstats
+    import time
+
+    from utils.profiler import list_profiles
+
+    profiles = list_profiles()
+    if not args.replay:
+        for meta in profiles[:args.limit]:
+            memory = meta.get('peak_memory_bytes')
+            print(
+                f"{meta['file_hash'][:12]}  {meta['elapsed_s']:>8.2f}s  {meta['mode']:<8} "
+                f"{(f'{memory / 2**20:.0f} MiB peak' if memory else '-'):<14} {meta['file_name']}"
+            )
+        return 0
+
+    matches = [meta for meta in profiles if meta['file_hash'].startswith(args.replay)]
+    if not matches:
+        print(f"No stored profile for {args.replay}", file=sys.stderr)
+        return 1
+    meta = matches[0]
+    input_path = os.path.join(meta['directory'], meta['input'])
+
+    processor = InvoiceProcessor()
+    processor.profiler = None
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    profile.runcall(processor.process_invoice, input_path)
+    elapsed = time.perf_counter() - start
+    print(f"{meta['file_name']}: {elapsed:.2f}s now, {meta['elapsed_s']:.2f}s when profiled", file=sys.stderr)
+    pstats.Stats(profile, stream=sys.stdout).sort_stats('cumulative').print_stats(args.limit)
+    return 0
+
+
+def serve_command(args) -> int:
+    """Run the async ingestion service."""
+    from utils.ingestion_service import run_service
+
+    run_service(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        max_concurrent_requests=args.max_requests,
+        tolerance=args.tolerance
+    )
+    return 0
+
+
+def scheduler_command(args) -> int:
+    """Run the weekly report scheduler, or render one week's reports."""
+    from datetime import date
+
+    from utils.report_scheduler import ReportScheduler
+
+    scheduler = ReportScheduler(workers=args.workers, refresh_minutes=args.refresh_minutes)
+    if args.once:
+        week = date.fromisoformat(args.week) if args.week else None
+        for report in scheduler.generate_weekly_reports(week, force=args.force):
+            print(json.dumps(report, ensure_ascii=False))
+        return 0
+    scheduler.run()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Construction Invoice Analyzer command line tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    process_parser = subparsers.add_parser('process', help="Extract invoice data from PDF or image files")
+    process_parser.add_argument('files', nargs='+', help="Invoice files to process")
+    process_parser.add_argument(
+        '--stop-early',
+        action='store_true',
+        help="Stop reading pages once header fields and totals are found"
+    )
+    process_parser.add_argument(
+        '--profile-threshold',
+        type=float,
+        default=None,
+        help="Keep a profile and memory snapshot of files slower than this many seconds"
+    )
+    process_parser.add_argument('--profile-mode', choices=['sample', 'cprofile'], default='sample',
+                                help="Profiler used with --profile-threshold")
+    process_parser.set_defaults(func=process_command)
+
+    profiles_parser = subparsers.add_parser('profiles', help="List or replay stored profiles of slow invoices")
+    profiles_parser.add_argument('--replay', metavar='HASH', help="Process the stored input of a profile (hash prefix) under cProfile")
+    profiles_parser.add_argument('--limit', type=int, default=25, help="Profiles listed, or functions shown with --replay")
+    profiles_parser.set_defaults(func=profiles_command)
+
+    serve_parser = subparsers.add_parser('serve', help="Run the HTTP ingestion service")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="Interface to bind")
+    serve_parser.add_argument('--port', type=int, default=8080, help="Port to listen on")
+    serve_parser.add_argument('--workers', type=int, default=None, help="OCR worker processes (default: CPU count)")
+    serve_parser.add_argument('--queue-size', type=int, default=100, help="Queued jobs before uploads are rejected")
+    serve_parser.add_argument('--max-requests', type=int, default=32, help="Concurrent HTTP requests")
+    serve_parser.add_argument('--tolerance', type=float, default=0.05, help="Price variance tolerance")
+    serve_parser.set_defaults(func=serve_command)
+
+    scheduler_parser = subparsers.add_parser('scheduler', help="Refresh weekly aggregates and render weekly reports")
+    scheduler_parser.add_argument('--workers', type=int, default=None, help="Report rendering processes (default: CPU count)")
+    scheduler_parser.add_argument('--refresh-minutes', type=int, default=15, help="Minutes between aggregate refreshes")
+    scheduler_parser.add_argument('--once', action='store_true', help="Render one week's reports and exit")
+    scheduler_parser.add_argument('--week', help="Any date in the week to render with --once (default: last week)")
+    scheduler_parser.add_argument('--force', action='store_true', help="Render again reports that already exist")
+    scheduler_parser.set_defaults(func=scheduler_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
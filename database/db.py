@@ -4,7 +4,8 @@ from pathlib import Path
 
 class Database:
     def __init__(self):
-        self.db_path = Path(__file__).parent / 'construction_analyzer.db'
+        # Same database and schema as utils.database.Database
+        self.db_path = Path(__file__).parent.parent / 'data' / 'invoice_analyzer.db'
         self.conn = None
         self.cursor = None
 
@@ -1,61 +1,143 @@
+-- Schema of the application database (utils/database.py).
+-- New databases are created from this script directly. Existing databases
+-- are upgraded by the migrations in utils/database.py first; the script then
+-- runs again, so every statement must be idempotent. Changes to existing
+-- tables need a migration as well as an update here.
+
+-- Version tracking table
+CREATE TABLE IF NOT EXISTS db_version (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    version INTEGER NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    description TEXT
+);
+
 -- Projects table
 CREATE TABLE IF NOT EXISTS projects (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
+    name TEXT NOT NULL UNIQUE,
     description TEXT,
     start_date DATE,
     end_date DATE,
-    budget DECIMAL(15,2),
+    budget REAL,
+    db_path TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Initial pricing table
+-- Data recorded before projects existed belongs to the default project
+INSERT OR IGNORE INTO projects (id, name, description) VALUES (1, 'Default', 'Default project');
+
+-- Data validation table
+CREATE TABLE IF NOT EXISTS data_validation (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    record_id INTEGER NOT NULL,
+    validation_type TEXT NOT NULL,
+    validation_message TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Data statistics table
+CREATE TABLE IF NOT EXISTS data_statistics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INTEGER NOT NULL DEFAULT 1,
+    stat_date DATE NOT NULL,
+    total_invoices INTEGER,
+    total_amount REAL,
+    avg_variance REAL,
+    unique_vendors INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects (id)
+);
+
+-- Initial pricing table (current baseline of each project)
 CREATE TABLE IF NOT EXISTS initial_pricing (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    project_id INTEGER,
-    item_code TEXT,
-    description TEXT,
-    unit TEXT,
-    unit_price DECIMAL(15,2),
-    estimated_quantity DECIMAL(15,2),
-    total_amount DECIMAL(15,2),
-    category TEXT,
-    FOREIGN KEY (project_id) REFERENCES projects(id)
+    project_id INTEGER NOT NULL DEFAULT 1,
+    item_description TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    base_price REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects (id)
+);
+
+-- Pricing versions table
+CREATE TABLE IF NOT EXISTS pricing_versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INTEGER NOT NULL DEFAULT 1,
+    fingerprint TEXT NOT NULL,
+    file_name TEXT,
+    row_count INTEGER,
+    snapshot_path TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    activated_at TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects (id)
 );
 
 -- Invoices table
 CREATE TABLE IF NOT EXISTS invoices (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    project_id INTEGER,
-    invoice_number TEXT,
+    project_id INTEGER NOT NULL DEFAULT 1,
+    invoice_number TEXT NOT NULL,
     vendor_name TEXT,
     invoice_date DATE,
-    total_amount DECIMAL(15,2),
-    status TEXT,
+    total_amount REAL,
     file_path TEXT,
-    file_type TEXT,
-    processed_at TIMESTAMP,
+    checksum TEXT,
+    file_hash TEXT,
+    image_hash TEXT,
+    duplicate_key TEXT,
+    processing_status TEXT DEFAULT 'processed',
+    error_message TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (project_id) REFERENCES projects(id)
+    FOREIGN KEY (project_id) REFERENCES projects (id)
 );
 
--- Invoice items table
+-- Invoice items table (partitioned through its invoice)
 CREATE TABLE IF NOT EXISTS invoice_items (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     invoice_id INTEGER,
-    item_code TEXT,
-    description TEXT,
+    item_description TEXT NOT NULL,
+    quantity REAL,
     unit TEXT,
-    quantity DECIMAL(15,2),
-    unit_price DECIMAL(15,2),
-    total_amount DECIMAL(15,2),
-    category TEXT,
-    initial_pricing_id INTEGER,
-    price_difference DECIMAL(15,2),
-    quantity_difference DECIMAL(15,2),
+    unit_price REAL,
+    total_price REAL,
+    status TEXT DEFAULT 'active',
+    FOREIGN KEY (invoice_id) REFERENCES invoices (id)
+);
+
+-- Variance analysis table
+CREATE TABLE IF NOT EXISTS variance_analysis (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INTEGER NOT NULL DEFAULT 1,
+    invoice_id INTEGER,
+    item_description TEXT NOT NULL,
+    base_price REAL,
+    actual_price REAL,
+    variance_amount REAL,
+    variance_percentage REAL,
+    quantity REAL,
+    amount REAL,
+    pricing_version_id INTEGER,
+    pricing_row_key TEXT,
+    is_current INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects (id),
+    FOREIGN KEY (invoice_id) REFERENCES invoices (id),
+    FOREIGN KEY (pricing_version_id) REFERENCES pricing_versions (id)
+);
+
+-- Vendor templates table (shared by all projects)
+CREATE TABLE IF NOT EXISTS vendor_templates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint TEXT NOT NULL,
+    layout_hash TEXT NOT NULL,
+    vendor_name TEXT,
+    template TEXT NOT NULL,
+    confirmed_count INTEGER DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (invoice_id) REFERENCES invoices(id),
-    FOREIGN KEY (initial_pricing_id) REFERENCES initial_pricing(id)
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (fingerprint, layout_hash)
 );
 
 -- Categories table
@@ -65,33 +147,170 @@ CREATE TABLE IF NOT EXISTS categories (
     description TEXT,
     parent_id INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (parent_id) REFERENCES categories(id)
+    FOREIGN KEY (parent_id) REFERENCES categories (id)
 );
 
 -- Alerts table
 CREATE TABLE IF NOT EXISTS alerts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    project_id INTEGER,
+    project_id INTEGER NOT NULL DEFAULT 1,
     invoice_id INTEGER,
     alert_type TEXT,
     message TEXT,
     severity TEXT,
     is_read BOOLEAN DEFAULT FALSE,
+    dedup_key TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (project_id) REFERENCES projects(id),
-    FOREIGN KEY (invoice_id) REFERENCES invoices(id)
+    FOREIGN KEY (project_id) REFERENCES projects (id),
+    FOREIGN KEY (invoice_id) REFERENCES invoices (id)
+);
+
+-- Per-item variance thresholds of the alert engine (item_key as in pricing_row_key)
+CREATE TABLE IF NOT EXISTS alert_thresholds (
+    project_id INTEGER NOT NULL DEFAULT 1,
+    item_key TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    PRIMARY KEY (project_id, item_key),
+    FOREIGN KEY (project_id) REFERENCES projects (id)
+);
+
+-- Last variance row evaluated by the alert engine
+CREATE TABLE IF NOT EXISTS alert_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_variance_id INTEGER NOT NULL
 );
 
+INSERT OR IGNORE INTO alert_state (id, last_variance_id) VALUES (1, 0);
+
 -- Weekly reports table
 CREATE TABLE IF NOT EXISTS weekly_reports (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    project_id INTEGER,
+    project_id INTEGER NOT NULL DEFAULT 1,
     week_start_date DATE,
     week_end_date DATE,
     total_invoices INTEGER,
-    total_amount DECIMAL(15,2),
-    variance_amount DECIMAL(15,2),
+    total_amount REAL,
+    variance_amount REAL,
     report_path TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (project_id) REFERENCES projects(id)
-); 
\ No newline at end of file
+    FOREIGN KEY (project_id) REFERENCES projects (id)
+);
+
+-- Weekly aggregates, refreshed incrementally for weekly reports
+CREATE TABLE IF NOT EXISTS weekly_aggregates (
+    project_id INTEGER NOT NULL DEFAULT 1,
+    week_start DATE NOT NULL,
+    total_invoices INTEGER,
+    total_amount REAL,
+    unique_vendors INTEGER,
+    variance_amount REAL,
+    high_variance_items INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (project_id, week_start),
+    FOREIGN KEY (project_id) REFERENCES projects (id)
+);
+
+-- Last rows included in the weekly aggregates
+CREATE TABLE IF NOT EXISTS report_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_invoice_id INTEGER NOT NULL,
+    last_variance_id INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO report_state (id, last_invoice_id, last_variance_id) VALUES (1, 0, 0);
+
+-- Dashboard snapshots, refreshed incrementally on writes. Days fall back to
+-- the received date; period is 'all' or the Monday of a week.
+CREATE TABLE IF NOT EXISTS dashboard_daily (
+    project_id INTEGER NOT NULL DEFAULT 1,
+    day DATE NOT NULL,
+    status TEXT NOT NULL,
+    invoices INTEGER NOT NULL DEFAULT 0,
+    total_amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, day, status),
+    FOREIGN KEY (project_id) REFERENCES projects (id)
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_vendors (
+    project_id INTEGER NOT NULL DEFAULT 1,
+    period TEXT NOT NULL,
+    vendor_name TEXT NOT NULL,
+    invoices INTEGER NOT NULL DEFAULT 0,
+    total_amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, period, vendor_name),
+    FOREIGN KEY (project_id) REFERENCES projects (id)
+);
+
+-- Categories are pricing rows (pricing_row_key; '' for unmatched items)
+CREATE TABLE IF NOT EXISTS dashboard_categories (
+    project_id INTEGER NOT NULL DEFAULT 1,
+    period TEXT NOT NULL,
+    category_key TEXT NOT NULL,
+    category TEXT,
+    items INTEGER NOT NULL DEFAULT 0,
+    expected_amount REAL NOT NULL DEFAULT 0,
+    actual_amount REAL NOT NULL DEFAULT 0,
+    variance_amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, period, category_key),
+    FOREIGN KEY (project_id) REFERENCES projects (id)
+);
+
+-- Last rows included in the dashboard snapshots
+CREATE TABLE IF NOT EXISTS dashboard_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_invoice_id INTEGER NOT NULL,
+    last_variance_id INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO dashboard_state (id, last_invoice_id, last_variance_id) VALUES (1, 0, 0);
+
+-- Pipeline traces (utils/tracing.py) and their per-stage timings
+CREATE TABLE IF NOT EXISTS traces (
+    trace_id TEXT PRIMARY KEY,
+    project_id INTEGER NOT NULL DEFAULT 1,
+    name TEXT NOT NULL,
+    ref TEXT,
+    duration_ms REAL,
+    attributes TEXT,
+    counters TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects (id)
+);
+
+CREATE TABLE IF NOT EXISTS stage_metrics (
+    trace_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    duration_ms REAL NOT NULL,
+    PRIMARY KEY (trace_id, stage),
+    FOREIGN KEY (trace_id) REFERENCES traces (trace_id)
+);
+
+-- Data change counter used to invalidate cached reads
+CREATE TABLE IF NOT EXISTS data_changes (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO data_changes (id, version) VALUES (1, 0);
+
+-- Indexes (project partitions first)
+CREATE INDEX IF NOT EXISTS idx_invoices_project_date ON invoices (project_id, invoice_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_project_vendor ON invoices (project_id, vendor_name);
+CREATE INDEX IF NOT EXISTS idx_invoices_project_created ON invoices (project_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_invoices_checksum ON invoices (checksum);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_invoices_duplicate_key ON invoices (project_id, duplicate_key);
+CREATE INDEX IF NOT EXISTS idx_invoices_file_hash ON invoices (project_id, file_hash);
+CREATE INDEX IF NOT EXISTS idx_invoices_project_total ON invoices (project_id, total_amount, image_hash);
+CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON invoice_items (invoice_id);
+CREATE INDEX IF NOT EXISTS idx_variance_invoice ON variance_analysis (invoice_id, is_current);
+CREATE INDEX IF NOT EXISTS idx_variance_project_current ON variance_analysis (project_id, is_current, pricing_row_key);
+CREATE INDEX IF NOT EXISTS idx_initial_pricing_project ON initial_pricing (project_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pricing_versions_project ON pricing_versions (project_id, fingerprint);
+CREATE INDEX IF NOT EXISTS idx_statistics_project_date ON data_statistics (project_id, stat_date);
+CREATE INDEX IF NOT EXISTS idx_traces_name_created ON traces (name, created_at);
+CREATE INDEX IF NOT EXISTS idx_traces_ref ON traces (ref);
+CREATE INDEX IF NOT EXISTS idx_alerts_project ON alerts (project_id, is_read, created_at);
+CREATE INDEX IF NOT EXISTS idx_alerts_project_type ON alerts (project_id, alert_type, created_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_dedup ON alerts (project_id, dedup_key);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_weekly_reports_week ON weekly_reports (project_id, week_start_date);
@@ -0,0 +1,310 @@
+import logging
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Variance percentage that raises an item alert unless the item has its own
+# threshold in alert_thresholds; twice the threshold is 'high'
+DEFAULT_ITEM_THRESHOLD = 10.0
+
+# Latest invoices of an item used to fit its price trend
+TREND_WINDOW = 6
+TREND_MIN_POINTS = 3
+# Rise per 30 days, as a percentage of the baseline price
+TREND_SLOPE_THRESHOLD = 2.0
+
+# Invoices per window compared for vendor price creep
+CREEP_WINDOW = 3
+# Rise of the vendor's average variance percentage between windows
+CREEP_THRESHOLD = 3.0
+
+# Fractions of the project budget that raise an alert once each
+BUDGET_LEVELS = (0.8, 1.0)
+# Spent fraction ahead of the elapsed fraction of the project schedule
+BURN_MARGIN = 0.1
+
+BATCH_SIZE = 500
+
+_INSERT_ALERT = '''
+    INSERT OR IGNORE INTO alerts (project_id, invoice_id, alert_type, message, severity, dedup_key)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# One engine per database file in this process
+_engines: Dict[str, 'AlertEngine'] = {}
+_engines_lock = threading.Lock()
+
+
+def _week(value: Any) -> str:
+    """ISO year and week of a date, used to raise recurring alerts at most weekly."""
+    try:
+        day = datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        day = date.today()
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _days(value: Any) -> Optional[int]:
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').toordinal()
+    except ValueError:
+        return None
+
+
+class AlertEngine:
+    """
+    Evaluate alert rules over variance rows as they are written.
+
+    Writers call notify() after committing variance rows; a background
+    thread then reads the rows added since its last run, in batches, and
+    evaluates the rules for them and for the items, vendors and projects
+    they touch:
+
+        item_variance       Item variance beyond its threshold
+        price_trend         Rising price trend of an item across invoices
+        vendor_price_creep  Rising average variance of a vendor's invoices
+        budget              Invoiced total reaching a share of the project budget,
+                            or running ahead of the project schedule
+
+    Each alert has a deduplication key that is unique per project, so
+    re-evaluating the same rows, or several processes evaluating at once,
+    never repeats an alert. The position reached is kept in alert_state and
+    advances in the same transaction as the alerts it produced.
+    """
+
+    def __init__(self, db_path: str, registry_path: str, batch_size: int = BATCH_SIZE):
+        """
+        Args:
+            db_path (str): Database holding the variance rows and alerts
+            registry_path (str): Database holding the projects and their budgets
+            batch_size (int): Variance rows evaluated per transaction
+        """
+        self.db_path = db_path
+        self.registry_path = registry_path
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def notify(self):
+        """Schedule an evaluation of new variance rows in the background."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='alert-engine', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Alert evaluation failed for {self.db_path}: {str(e)}")
+
+    def run_pending(self) -> int:
+        """
+        Evaluate all variance rows written since the last run.
+
+        Returns:
+            int: Alerts created
+        """
+        created = 0
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            while True:
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    last_id = cursor.execute(
+                        'SELECT last_variance_id FROM alert_state WHERE id = 1'
+                    ).fetchone()[0]
+                    rows = cursor.execute('''
+                        SELECT va.id, va.project_id, va.invoice_id, va.item_description,
+                               va.pricing_row_key, va.variance_percentage,
+                               i.vendor_name, i.invoice_date
+                        FROM variance_analysis va
+                        LEFT JOIN invoices i ON i.id = va.invoice_id
+                        WHERE va.id > ? AND va.is_current = 1
+                        ORDER BY va.id
+                        LIMIT ?
+                    ''', (last_id, self.batch_size)).fetchall()
+                    if not rows:
+                        cursor.execute('COMMIT')
+                        break
+
+                    alerts = self.evaluate(cursor, rows)
+                    before = conn.total_changes
+                    cursor.executemany(_INSERT_ALERT, alerts)
+                    created += conn.total_changes - before
+                    cursor.execute(
+                        'UPDATE alert_state SET last_variance_id = ? WHERE id = 1',
+                        (rows[-1][0],)
+                    )
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    raise
+        finally:
+            conn.close()
+        if created:
+            logger.info(f"Created {created} alerts in {self.db_path}")
+        return created
+
+    def evaluate(self, cursor, rows: List[tuple]) -> List[tuple]:
+        """Alerts for a batch of variance rows, as alerts table rows."""
+        alerts = self._item_alerts(cursor, rows)
+
+        items, vendors, projects = {}, {}, set()
+        for _, project_id, invoice_id, _, row_key, _, vendor_name, invoice_date in rows:
+            projects.add(project_id)
+            if row_key:
+                items[(project_id, row_key)] = invoice_id
+            if vendor_name:
+                vendors[(project_id, vendor_name)] = (invoice_id, invoice_date)
+
+        for (project_id, row_key), invoice_id in items.items():
+            alerts.extend(self._trend_alerts(cursor, project_id, row_key, invoice_id))
+        for (project_id, vendor_name), (invoice_id, invoice_date) in vendors.items():
+            alerts.extend(self._vendor_creep_alerts(cursor, project_id, vendor_name, invoice_id, invoice_date))
+        for project_id in projects:
+            alerts.extend(self._budget_alerts(cursor, project_id))
+        return alerts
+
+    def _item_alerts(self, cursor, rows: List[tuple]) -> List[tuple]:
+        thresholds = defaultdict(dict)
+        for project_id, item_key, threshold in cursor.execute(
+            'SELECT project_id, item_key, threshold FROM alert_thresholds'
+        ):
+            thresholds[project_id][item_key] = threshold
+
+        alerts = []
+        for _, project_id, invoice_id, description, row_key, percentage, _, _ in rows:
+            if percentage is None:
+                continue
+            threshold = thresholds[project_id].get(row_key, DEFAULT_ITEM_THRESHOLD)
+            if abs(percentage) < threshold:
+                continue
+            alerts.append((
+                project_id,
+                invoice_id,
+                'item_variance',
+                f"{description}: {percentage:+.1f}% against the baseline price (threshold {threshold:g}%)",
+                'high' if abs(percentage) >= 2 * threshold else 'medium',
+                f"item_variance:{invoice_id}:{row_key or description}",
+            ))
+        return alerts
+
+    def _trend_alerts(self, cursor, project_id: int, row_key: str, invoice_id: int) -> List[tuple]:
+        history = cursor.execute('''
+            SELECT i.invoice_date, va.actual_price, va.base_price, va.item_description
+            FROM variance_analysis va
+            JOIN invoices i ON i.id = va.invoice_id
+            WHERE va.project_id = ? AND va.is_current = 1 AND va.pricing_row_key = ?
+              AND i.invoice_date IS NOT NULL AND va.actual_price IS NOT NULL
+            ORDER BY i.invoice_date DESC, va.id DESC
+            LIMIT ?
+        ''', (project_id, row_key, TREND_WINDOW)).fetchall()
+
+        points = [(_days(d), price) for d, price, _, _ in history if _days(d) is not None]
+        base_price = history[0][2] if history else None
+        if len(points) < TREND_MIN_POINTS or not base_price or len({day for day, _ in points}) < 2:
+            return []
+
+        days, prices = zip(*points)
+        slope = np.polyfit(np.array(days, dtype=float), np.array(prices, dtype=float), 1)[0]
+        monthly = slope * 30 / base_price * 100
+        if monthly < TREND_SLOPE_THRESHOLD:
+            return []
+        return [(
+            project_id,
+            invoice_id,
+            'price_trend',
+            f"{history[0][3]}: price rising {monthly:.1f}% of baseline per month "
+            f"over the last {len(points)} invoices",
+            'high' if monthly >= 2 * TREND_SLOPE_THRESHOLD else 'medium',
+            f"price_trend:{row_key}:{_week(history[0][0])}",
+        )]
+
+    def _vendor_creep_alerts(self, cursor, project_id: int, vendor_name: str,
+                             invoice_id: int, invoice_date: Any) -> List[tuple]:
+        averages = [row[0] for row in cursor.execute('''
+            SELECT AVG(va.variance_percentage)
+            FROM invoices i
+            JOIN variance_analysis va ON va.invoice_id = i.id AND va.is_current = 1
+            WHERE i.project_id = ? AND i.vendor_name = ? AND va.variance_percentage IS NOT NULL
+            GROUP BY i.id
+            ORDER BY i.invoice_date DESC, i.id DESC
+            LIMIT ?
+        ''', (project_id, vendor_name, 2 * CREEP_WINDOW))]
+        if len(averages) < 2 * CREEP_WINDOW:
+            return []
+
+        recent = sum(averages[:CREEP_WINDOW]) / CREEP_WINDOW
+        previous = sum(averages[CREEP_WINDOW:]) / CREEP_WINDOW
+        if recent <= 0 or recent - previous < CREEP_THRESHOLD:
+            return []
+        return [(
+            project_id,
+            invoice_id,
+            'vendor_price_creep',
+            f"{vendor_name}: average variance rose from {previous:+.1f}% to {recent:+.1f}% "
+            f"over the last {2 * CREEP_WINDOW} invoices",
+            'high' if recent - previous >= 2 * CREEP_THRESHOLD else 'medium',
+            f"vendor_price_creep:{vendor_name}:{_week(invoice_date)}",
+        )]
+
+    def _project(self, project_id: int) -> Optional[Tuple[float, Any, Any]]:
+        with sqlite3.connect(self.registry_path) as conn:
+            return conn.execute(
+                'SELECT budget, start_date, end_date FROM projects WHERE id = ?', (project_id,)
+            ).fetchone()
+
+    def _budget_alerts(self, cursor, project_id: int) -> List[tuple]:
+        project = self._project(project_id)
+        if not project or not project[0]:
+            return []
+        budget, start_date, end_date = project
+        spent = cursor.execute(
+            'SELECT COALESCE(SUM(total_amount), 0) FROM invoices WHERE project_id = ?', (project_id,)
+        ).fetchone()[0]
+        spent_fraction = spent / budget
+
+        alerts = []
+        reached = [level for level in BUDGET_LEVELS if spent_fraction >= level]
+        if reached:
+            alerts.append((
+                project_id, None, 'budget',
+                f"Invoiced {spent:,.2f} is {spent_fraction:.0%} of the budget {budget:,.2f}",
+                'high' if reached[-1] >= 1 else 'medium',
+                f"budget:{reached[-1]:g}",
+            ))
+
+        start, end, today = _days(start_date), _days(end_date), date.today().toordinal()
+        if start is not None and end is not None and end > start and spent_fraction < 1:
+            elapsed = min(max((today - start) / (end - start), 0.0), 1.0)
+            if spent_fraction > elapsed + BURN_MARGIN:
+                alerts.append((
+                    project_id, None, 'budget',
+                    f"{spent_fraction:.0%} of the budget spent after {elapsed:.0%} of the schedule",
+                    'medium',
+                    f"budget_burn:{_week(date.today())}",
+                ))
+        return alerts
+
+
+def schedule_alerts(db_path: str, registry_path: str):
+    """Evaluate new variance rows of a database in its background engine."""
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            engine = _engines[db_path] = AlertEngine(db_path, registry_path)
+    engine.notify()
@@ -0,0 +1,196 @@
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+logger = logging.getLogger(__name__)
+
+# Categories shown before the rest are folded into one "other" entry
+TOP_N = 25
+OTHER_LABEL = 'Other'
+
+# Points kept when a long series is downsampled
+MAX_SERIES_POINTS = 1000
+
+# Points above which scatter traces are drawn with WebGL
+WEBGL_THRESHOLD = 1000
+
+# Time buckets from finest to coarsest: (name, approximate days, pandas period)
+BUCKETS = (('day', 1, 'D'), ('week', 7, 'W'), ('month', 31, 'M'), ('year', 366, 'Y'))
+
+
+def top_n(labels: Sequence[Any], values: Sequence[float], n: int = TOP_N,
+          key: Optional[Sequence[float]] = None, other_label: str = OTHER_LABEL,
+          aggregate: str = 'sum') -> Tuple[List[Any], List[float], int]:
+    """
+    Keep the n largest categories and fold the rest into one entry.
+
+    Args:
+        labels (Sequence[Any]): Category labels
+        values (Sequence[float]): Category values
+        n (int): Categories kept
+        key (Sequence[float], optional): Ranking values (default: absolute values)
+        other_label (str): Label of the folded entry
+        aggregate (str): 'sum' or 'mean' of the folded values
+
+    Returns:
+        Tuple[List[Any], List[float], int]: Labels, values and number of folded categories
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) <= n:
+        return list(labels), values.tolist(), 0
+
+    ranking = np.abs(values) if key is None else np.asarray(key, dtype=float)
+    ranking = np.nan_to_num(ranking, nan=-np.inf)
+    # argpartition finds the top n without sorting every category
+    top = np.argpartition(-ranking, n - 1)[:n]
+    top = top[np.argsort(-ranking[top], kind='stable')]
+    rest = np.ones(len(values), dtype=bool)
+    rest[top] = False
+
+    folded = values[rest]
+    other = np.nanmean(folded) if aggregate == 'mean' else np.nansum(folded)
+    return (
+        [labels[i] for i in top] + [f"{other_label} ({int(rest.sum())})"],
+        values[top].tolist() + [float(other)],
+        int(rest.sum()),
+    )
+
+
+def lttb(x: Sequence[float], y: Sequence[float],
+         threshold: int = MAX_SERIES_POINTS) -> np.ndarray:
+    """
+    Downsample a series with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; from each bucket in between the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket is kept, which preserves peaks and dips
+    that plain striding would drop.
+
+    Args:
+        x (Sequence[float]): X values, sorted ascending
+        y (Sequence[float]): Y values
+        threshold (int): Points kept
+
+    Returns:
+        np.ndarray: Indices of the kept points
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    edges = np.linspace(1, length - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start = end
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample(x: Sequence[Any], y: Sequence[float],
+               threshold: int = MAX_SERIES_POINTS) -> Tuple[List[Any], List[float]]:
+    """
+    Downsample a series with dates or numbers on the x axis.
+
+    Args:
+        x (Sequence[Any]): X values (dates or numbers), sorted ascending
+        y (Sequence[float]): Y values
+        threshold (int): Points kept
+
+    Returns:
+        Tuple[List[Any], List[float]]: Kept x and y values
+    """
+    if len(x) <= threshold:
+        return list(x), list(y)
+    if np.issubdtype(np.asarray(x).dtype, np.number):
+        numeric = np.asarray(x, dtype=float)
+    else:
+        numeric = pd.to_datetime(pd.Series(x)).astype('int64').to_numpy(dtype=float)
+    kept = lttb(numeric, y, threshold)
+    return [x[i] for i in kept], np.asarray(y, dtype=float)[kept].tolist()
+
+
+def choose_bucket(first: Any, last: Any, max_points: int = MAX_SERIES_POINTS) -> str:
+    """
+    Smallest time bucket that keeps a date range within max_points buckets.
+
+    Returns:
+        str: One of day, week, month or year
+    """
+    try:
+        days = (pd.Timestamp(last) - pd.Timestamp(first)).days + 1
+    except (TypeError, ValueError):
+        return 'day'
+    for name, span, _ in BUCKETS:
+        if days / span <= max_points:
+            return name
+    return BUCKETS[-1][0]
+
+
+def bucket_series(dates: Sequence[Any], values: Sequence[float], bucket: Optional[str] = None,
+                  aggregate: str = 'sum', max_points: int = MAX_SERIES_POINTS) -> pd.Series:
+    """
+    Aggregate a dated series into time buckets.
+
+    Args:
+        dates (Sequence[Any]): Dates of the values
+        values (Sequence[float]): Values
+        bucket (str, optional): day, week, month or year (default: chosen from the range)
+        aggregate (str): Aggregation applied within a bucket (sum, mean, ...)
+        max_points (int): Bucket count aimed for when the bucket is chosen
+
+    Returns:
+        pd.Series: Aggregated values indexed by the start of each bucket
+    """
+    series = pd.Series(
+        np.asarray(values, dtype=float),
+        index=pd.to_datetime(pd.Series(dates), errors='coerce')
+    )
+    series = series[series.index.notna()].sort_index()
+    if series.empty:
+        return series
+    bucket = bucket or choose_bucket(series.index[0], series.index[-1], max_points)
+    freq = {name: period for name, _, period in BUCKETS}[bucket]
+    grouped = series.groupby(series.index.to_period(freq)).agg(aggregate)
+    grouped.index = grouped.index.to_timestamp()
+    return grouped
+
+
+def scatter(x: Sequence[Any], y: Sequence[float], **kwargs) -> Union[go.Scatter, go.Scattergl]:
+    """Scatter trace, drawn with WebGL when it has more than WEBGL_THRESHOLD points."""
+    trace = go.Scattergl if len(x) > WEBGL_THRESHOLD else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+
+def payload_size(fig: go.Figure) -> Dict[str, int]:
+    """
+    Size of the JSON a figure sends to the browser.
+
+    Returns:
+        Dict[str, int]: bytes of the serialized figure and points across its traces
+    """
+    points = 0
+    for trace in fig.data:
+        for axis in ('x', 'y', 'values', 'z'):
+            data = getattr(trace, axis, None)
+            if data is not None:
+                points += len(data)
+                break
+    size = {'bytes': len(fig.to_json().encode('utf-8')), 'points': points}
+    logger.debug(f"Chart payload: {size['points']} points, {size['bytes']} bytes")
+    return size
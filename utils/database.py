@@ -1,122 +1,284 @@
 import sqlite3
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import os
 import shutil
 import zipfile
 import glob
 import hashlib
+import threading
+from .duplicate_detector import IMAGE_HASH_DISTANCE, hash_distance, normalize_invoice_key
+from .file_store import file_hash as hash_file
+from .alert_engine import schedule_alerts
+from .migrations import AddColumn, Backfill, CreateIndex, Migration, MigrationRunner, RunPython, RunSQL
+from .query_cache import cached_query, query_cache
+from .metrics import record_trace
+from .tracing import Trace, traced
+
+_VARIANCE_INSERT = '''
+    INSERT INTO variance_analysis (
+        project_id, invoice_id, item_description, base_price, actual_price,
+        variance_amount, variance_percentage, quantity, amount,
+        pricing_version_id, pricing_row_key, is_current
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+'''
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+
+SCHEMA_PATH = os.path.join(ROOT_DIR, 'database', 'schema.sql')
+
+DEFAULT_PROJECT_ID = 1
+
+# Monday of the week containing a timestamp column
+_WEEK_START = "DATE({column}, 'weekday 0', '-6 days')"
+
+# Days pipeline traces are kept for the stage metrics
+METRICS_RETENTION_DAYS = 30
+
+# Day of an invoice on the dashboards; received date when the invoice date is unusable
+_INVOICE_DAY = "COALESCE(DATE({alias}invoice_date), DATE({alias}created_at))"
+
+# Start of the chart time bucket containing a date column
+_BUCKET_START = {
+    'day': "DATE({column})",
+    'week': _WEEK_START,
+    'month': "DATE({column}, 'start of month')",
+    'year': "DATE({column}, 'start of year')",
+}
+
+
+
+def invoice_checksum(invoice_number: Any, vendor_name: Any, total_amount: Any) -> str:
+    """Checksum of the identifying fields of an invoice."""
+    return hashlib.md5(f"{invoice_number}_{vendor_name}_{total_amount}".encode()).hexdigest()
+
+
+# Schema changes to existing databases, in order. database/schema.sql holds
+# the resulting schema for new databases and is applied to existing ones
+# after any migration, so new tables in it only need a version bump.
+MIGRATIONS = [
+    Migration(2, "Pricing versions and variance baselines", [
+        AddColumn('variance_analysis', 'quantity', 'REAL'),
+        AddColumn('variance_analysis', 'amount', 'REAL'),
+        AddColumn('variance_analysis', 'pricing_version_id', 'INTEGER'),
+        AddColumn('variance_analysis', 'pricing_row_key', 'TEXT'),
+        AddColumn('variance_analysis', 'is_current', 'INTEGER DEFAULT 1'),
+    ]),
+    Migration(3, "Project partitioning", [
+        *[
+            AddColumn(table, 'project_id', 'INTEGER NOT NULL DEFAULT 1')
+            for table in ('invoices', 'initial_pricing', 'pricing_versions', 'data_statistics',
+                          'variance_analysis', 'alerts', 'weekly_reports')
+        ],
+        AddColumn('projects', 'db_path', 'TEXT'),
+        RunPython(lambda cursor: _scope_pricing_fingerprints(cursor)),
+    ]),
+    Migration(4, "Invoice processing metadata", [
+        AddColumn('invoices', 'checksum', 'TEXT'),
+        AddColumn('invoices', 'processing_status', "TEXT DEFAULT 'processed'"),
+        AddColumn('invoices', 'error_message', 'TEXT'),
+        AddColumn('invoice_items', 'status', "TEXT DEFAULT 'active'"),
+        CreateIndex('idx_invoices_checksum', 'invoices', ['checksum']),
+    ], backfills=[
+        Backfill(
+            'invoice_checksums', 'invoices', 'checksum IS NULL',
+            columns=['invoice_number', 'vendor_name', 'total_amount'],
+            compute=lambda row: {'checksum': invoice_checksum(*row)}
+        ),
+    ]),
+    Migration(5, "Duplicate detection keys", [
+        AddColumn('invoices', 'file_hash', 'TEXT'),
+        AddColumn('invoices', 'image_hash', 'TEXT'),
+        AddColumn('invoices', 'duplicate_key', 'TEXT'),
+        RunPython(lambda cursor: _fill_duplicate_keys(cursor)),
+        CreateIndex('idx_invoices_duplicate_key', 'invoices', ['project_id', 'duplicate_key'], unique=True),
+        CreateIndex('idx_invoices_file_hash', 'invoices', ['project_id', 'file_hash']),
+        CreateIndex('idx_invoices_project_total', 'invoices', ['project_id', 'total_amount', 'image_hash']),
+    ], backfills=[
+        Backfill(
+            'invoice_file_hashes', 'invoices', 'file_hash IS NULL',
+            columns=['file_path'],
+            # Files that are gone get an empty hash so the backfill terminates
+            compute=lambda row: {
+                'file_hash': hash_file(row[0]) if row[0] and os.path.isfile(row[0]) else ''
+            },
+            batch_size=100
+        ),
+    ]),
+    Migration(6, "Alert engine", [
+        AddColumn('alerts', 'dedup_key', 'TEXT'),
+        CreateIndex('idx_alerts_project_type', 'alerts', ['project_id', 'alert_type', 'created_at']),
+        CreateIndex('idx_alerts_dedup', 'alerts', ['project_id', 'dedup_key'], unique=True),
+    ]),
+    Migration(7, "Weekly report aggregates", [
+        CreateIndex('idx_invoices_project_created', 'invoices', ['project_id', 'created_at']),
+        CreateIndex('idx_weekly_reports_week', 'weekly_reports', ['project_id', 'week_start_date'], unique=True),
+        RunSQL('DROP INDEX IF EXISTS idx_weekly_reports_project'),
+    ]),
+    # dashboard_* and traces/stage_metrics tables come from schema.sql
+    Migration(8, "Dashboard snapshots and pipeline traces", []),
+]
+
+
+def _fill_duplicate_keys(cursor):
+    """Key existing invoices; later copies of an already keyed invoice stay unkeyed."""
+    seen = set()
+    rows = cursor.execute(
+        'SELECT id, project_id, vendor_name, invoice_number FROM invoices ORDER BY id'
+    ).fetchall()
+    for invoice_id, project_id, vendor_name, invoice_number in rows:
+        key = normalize_invoice_key(vendor_name, invoice_number)
+        if key is None or (project_id, key) in seen:
+            continue
+        seen.add((project_id, key))
+        cursor.execute('UPDATE invoices SET duplicate_key = ? WHERE id = ?', (key, invoice_id))
+
+
+def _scope_pricing_fingerprints(cursor):
+    """Make pricing fingerprints unique per project instead of globally."""
+    row = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'pricing_versions'"
+    ).fetchone()
+    if not row or 'fingerprint TEXT NOT NULL UNIQUE' not in row[0]:
+        return
+    cursor.execute('''
+        CREATE TABLE pricing_versions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL DEFAULT 1,
+            fingerprint TEXT NOT NULL,
+            file_name TEXT,
+            row_count INTEGER,
+            snapshot_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            activated_at TIMESTAMP,
+            FOREIGN KEY (project_id) REFERENCES projects (id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO pricing_versions_new
+        SELECT id, project_id, fingerprint, file_name, row_count, snapshot_path, created_at, activated_at
+        FROM pricing_versions
+    ''')
+    cursor.execute('DROP TABLE pricing_versions')
+    cursor.execute('ALTER TABLE pricing_versions_new RENAME TO pricing_versions')
 
 class Database:
-    def __init__(self):
-        self.db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'invoice_analyzer.db')
-        self.backup_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'backups')
-        self.data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+    def __init__(self, project_id: int = None, separate_file: bool = None):
+        """
+        Open the application database, optionally scoped to one project.
+
+        Args:
+            project_id (int, optional): Project whose data is read and written;
+                None reads across all projects and writes to the default project
+            separate_file (bool, optional): Keep each project in its own SQLite
+                file under data/projects/<id>/ (default: PROJECT_DATABASE_MODE=per_project)
+
+        The data directory is data/ unless INVOICE_ANALYZER_DATA_DIR names another.
+        """
+        if separate_file is None:
+            separate_file = os.getenv('PROJECT_DATABASE_MODE', 'shared') == 'per_project'
+        self.project_id = project_id
+        self.separate_file = separate_file
+        
+        # The project registry always lives in the main database
+        data_root = os.getenv('INVOICE_ANALYZER_DATA_DIR') or os.path.join(ROOT_DIR, 'data')
+        self.registry_path = os.path.join(data_root, 'invoice_analyzer.db')
+        if separate_file and project_id not in (None, DEFAULT_PROJECT_ID):
+            self.data_dir = os.path.join(data_root, 'projects', str(project_id))
+        else:
+            self.data_dir = data_root
+        self.db_path = os.path.join(self.data_dir, 'invoice_analyzer.db')
+        self.backup_dir = os.path.join(self.data_dir, 'backups')
+        # Project databases opened through for_project(), kept for reuse
+        self._projects: Dict[int, 'Database'] = {}
+        self._projects_lock = threading.Lock()
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         os.makedirs(self.backup_dir, exist_ok=True)
         self.init_database()
 
+    @property
+    def write_project_id(self) -> int:
+        """Project assigned to new rows."""
+        return self.project_id or DEFAULT_PROJECT_ID
+
+    def _project_filter(self, alias: str = '') -> Tuple[str, list]:
+        """SQL condition restricting a query to this database's project."""
+        if self.project_id is None:
+            return '', []
+        prefix = f"{alias}." if alias else ''
+        return f' AND {prefix}project_id = ?', [self.project_id]
+
+    def for_project(self, project_id: int) -> 'Database':
+        """
+        Database scoped to another project, using the same storage mode.
+
+        Opened once and reused, so callers such as Streamlit reruns do not
+        check the project's schema again every time.
+        """
+        with self._projects_lock:
+            if project_id not in self._projects:
+                self._projects[project_id] = Database(project_id, self.separate_file)
+            return self._projects[project_id]
+
     def init_database(self):
-        """Initialize database tables with versioning support."""
-        with sqlite3.connect(self.db_path) as conn:
+        """Create or upgrade the schema, then resume pending backfills in the background."""
+        runner = MigrationRunner(self.db_path, MIGRATIONS, SCHEMA_PATH)
+        runner.migrate()
+        runner.start_backfills()
+
+    def create_project(self, name: str, description: str = None, start_date: str = None,
+                       end_date: str = None, budget: float = None) -> int:
+        """Register a project and prepare its storage."""
+        with sqlite3.connect(self.registry_path) as conn:
             cursor = conn.cursor()
-            
-            # Create version tracking table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS db_version (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    version INTEGER NOT NULL,
-                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    description TEXT
-                )
-            ''')
-            
-            # Create data validation table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS data_validation (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    table_name TEXT NOT NULL,
-                    record_id INTEGER NOT NULL,
-                    validation_type TEXT NOT NULL,
-                    validation_message TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create data statistics table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS data_statistics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    stat_date DATE NOT NULL,
-                    total_invoices INTEGER,
-                    total_amount REAL,
-                    avg_variance REAL,
-                    unique_vendors INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create initial pricing table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS initial_pricing (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    item_description TEXT NOT NULL,
-                    unit TEXT NOT NULL,
-                    base_price REAL NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create invoices table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS invoices (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    invoice_number TEXT NOT NULL,
-                    vendor_name TEXT,
-                    invoice_date DATE,
-                    total_amount REAL,
-                    file_path TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create invoice items table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS invoice_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    invoice_id INTEGER,
-                    item_description TEXT NOT NULL,
-                    quantity REAL,
-                    unit TEXT,
-                    unit_price REAL,
-                    total_price REAL,
-                    FOREIGN KEY (invoice_id) REFERENCES invoices (id)
-                )
-            ''')
-            
-            # Create variance analysis table
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS variance_analysis (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    invoice_id INTEGER,
-                    item_description TEXT NOT NULL,
-                    base_price REAL,
-                    actual_price REAL,
-                    variance_amount REAL,
-                    variance_percentage REAL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (invoice_id) REFERENCES invoices (id)
-                )
-            ''')
-            
-            # Set initial version if not exists
-            cursor.execute('SELECT COUNT(*) FROM db_version')
-            if cursor.fetchone()[0] == 0:
-                cursor.execute('INSERT INTO db_version (version, description) VALUES (1, "Initial schema")')
-            
+                INSERT INTO projects (name, description, start_date, end_date, budget)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, description, start_date, end_date, budget))
+            project_id = cursor.lastrowid
             conn.commit()
+        
+        project_db = self.for_project(project_id)
+        if project_db.db_path != self.registry_path:
+            with sqlite3.connect(self.registry_path) as conn:
+                conn.execute('UPDATE projects SET db_path = ? WHERE id = ?', (project_db.db_path, project_id))
+                conn.commit()
+        return project_id
+
+    def get_projects(self) -> List[Dict[str, Any]]:
+        """Retrieve all registered projects."""
+        try:
+            with sqlite3.connect(self.registry_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute('''
+                    SELECT id, name, description, start_date, end_date, budget, db_path, created_at
+                    FROM projects
+                    ORDER BY id
+                ''').fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error retrieving projects: {e}")
+            return []
+
+    def get_data_version(self) -> int:
+        """Get the counter bumped by every write that changes invoice or variance data."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute('SELECT version FROM data_changes WHERE id = 1').fetchone()
+                return row[0] if row else 0
+        except Exception as e:
+            print(f"Error getting data version: {e}")
+            return 0
+
+    def _bump_data_version(self, cursor, at_least: int = 0):
+        cursor.execute(
+            'UPDATE data_changes SET version = MAX(version, ?) + 1 WHERE id = 1',
+            (at_least,)
+        )
 
     def validate_data(self, table: str, data: Dict[str, Any]) -> Tuple[bool, List[str]]:
         """Validate data before insertion."""
@@ -145,72 +307,219 @@ class Database:
     def save_initial_pricing(self, pricing_data: pd.DataFrame) -> bool:
         """Save initial pricing data to database."""
         try:
+            rows = pricing_data.rename(columns={
+                'description': 'item_description',
+                'unit_price': 'base_price'
+            })
+            if 'unit' not in rows.columns:
+                rows['unit'] = ''
+            rows = rows[['item_description', 'unit', 'base_price']].fillna({'unit': ''})
+            rows['project_id'] = self.write_project_id
+            
             with sqlite3.connect(self.db_path) as conn:
-                # Clear existing pricing data
-                conn.execute('DELETE FROM initial_pricing')
+                # Clear existing pricing data of the project
+                conn.execute('DELETE FROM initial_pricing WHERE project_id = ?', (self.write_project_id,))
                 
                 # Insert new pricing data
-                pricing_data.to_sql('initial_pricing', conn, if_exists='append', index=False)
+                rows.to_sql('initial_pricing', conn, if_exists='append', index=False)
                 return True
         except Exception as e:
             print(f"Error saving initial pricing: {e}")
             return False
 
     def get_initial_pricing(self) -> pd.DataFrame:
-        """Retrieve initial pricing data."""
+        """Retrieve initial pricing data in the layout used by PriceComparator."""
         try:
             with sqlite3.connect(self.db_path) as conn:
-                return pd.read_sql_query('SELECT * FROM initial_pricing', conn)
+                return pd.read_sql_query('''
+                    SELECT item_description AS description, unit, base_price AS unit_price
+                    FROM initial_pricing
+                    WHERE project_id = ?
+                    ORDER BY id
+                ''', conn, params=(self.write_project_id,))
         except Exception as e:
             print(f"Error retrieving initial pricing: {e}")
             return pd.DataFrame()
 
-    def save_invoice(self, invoice_data: Dict[str, Any], file_path: str) -> int:
-        """Save invoice with validation and error tracking."""
+    def save_pricing_version(self, fingerprint: str, file_name: str,
+                             row_count: int, snapshot_path: str) -> Dict[str, Any]:
+        """Record a pricing workbook version and make it the current one."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                INSERT INTO pricing_versions (
+                    project_id, fingerprint, file_name, row_count, snapshot_path, activated_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (project_id, fingerprint) DO UPDATE SET activated_at = excluded.activated_at
+            ''', (
+                self.write_project_id, fingerprint, file_name, row_count,
+                snapshot_path, datetime.now().isoformat()
+            ))
+            conn.commit()
+        return self.get_pricing_version(fingerprint)
+
+    def _get_pricing_version(self, condition: str = '', params: tuple = ()) -> Dict[str, Any]:
         try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute(f'''
+                    SELECT id, project_id, fingerprint, file_name, row_count, snapshot_path, created_at, activated_at
+                    FROM pricing_versions
+                    WHERE project_id = ? {condition}
+                    ORDER BY activated_at DESC, id DESC
+                    LIMIT 1
+                ''', (self.write_project_id, *params)).fetchone()
+                return dict(row) if row else {}
+        except Exception as e:
+            print(f"Error retrieving pricing version: {e}")
+            return {}
+
+    def get_pricing_version(self, fingerprint: str) -> Dict[str, Any]:
+        """Retrieve a pricing version by workbook fingerprint."""
+        return self._get_pricing_version('AND fingerprint = ?', (fingerprint,))
+
+    def get_current_pricing_version(self) -> Dict[str, Any]:
+        """Retrieve the pricing version currently used as baseline."""
+        return self._get_pricing_version()
+
+    @traced('db.find_invoice_by_file_hash')
+    def find_invoice_by_file_hash(self, file_hash: str) -> Dict[str, Any]:
+        """Find an invoice of this project imported from identical file content."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute('''
+                    SELECT id, invoice_number, vendor_name, invoice_date, total_amount
+                    FROM invoices
+                    WHERE project_id = ? AND file_hash = ?
+                    LIMIT 1
+                ''', (self.write_project_id, file_hash)).fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            print(f"Error looking up file hash: {e}")
+            return None
+
+    @traced('db.find_duplicate_invoice')
+    def find_duplicate_invoice(self, invoice_data: Dict[str, Any], image_hash: str = None) -> Dict[str, Any]:
+        """
+        Find an invoice of this project that an extracted invoice duplicates.
+
+        Invoices match on their normalized vendor and number, or on a
+        near-identical first page (perceptual hash) with the same total, which
+        catches re-scans whose number was read differently.
+
+        Returns:
+            Dict[str, Any]: The existing invoice with the 'match' reason, or None
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                key = normalize_invoice_key(
+                    invoice_data.get('vendor_name') or invoice_data.get('vendor'),
+                    invoice_data.get('invoice_number')
+                )
+                if key is not None:
+                    row = conn.execute('''
+                        SELECT id, invoice_number, vendor_name, invoice_date, total_amount
+                        FROM invoices
+                        WHERE project_id = ? AND duplicate_key = ?
+                    ''', (self.write_project_id, key)).fetchone()
+                    if row:
+                        return {**dict(row), 'match': 'invoice_number'}
+
+                total_amount = invoice_data.get('total_amount')
+                if image_hash and total_amount is not None:
+                    rows = conn.execute('''
+                        SELECT id, invoice_number, vendor_name, invoice_date, total_amount, image_hash
+                        FROM invoices
+                        WHERE project_id = ? AND total_amount = ? AND image_hash IS NOT NULL
+                    ''', (self.write_project_id, total_amount)).fetchall()
+                    for row in rows:
+                        if (len(row['image_hash']) == len(image_hash)
+                                and hash_distance(row['image_hash'], image_hash) <= IMAGE_HASH_DISTANCE):
+                            match = dict(row)
+                            del match['image_hash']
+                            return {**match, 'match': 'image'}
+                return None
+        except Exception as e:
+            print(f"Error looking up duplicate invoice: {e}")
+            return None
+
+    @traced('db.save_invoice')
+    def save_invoice(self, invoice_data: Dict[str, Any], file_path: str,
+                     file_hash: str = None, image_hash: str = None) -> int:
+        """
+        Save invoice with validation and error tracking.
+
+        Duplicates are rejected by the unique index on the normalized vendor
+        and invoice number. The file hash is computed from file_path unless
+        given; the page image hash is stored for find_duplicate_invoice.
+        """
+        try:
+            # Accept the field names produced by InvoiceProcessor as well as the table's
+            record = {
+                'invoice_number': invoice_data.get('invoice_number'),
+                'vendor_name': invoice_data.get('vendor_name') or invoice_data.get('vendor'),
+                'invoice_date': invoice_data.get('invoice_date') or invoice_data.get('date'),
+                'total_amount': invoice_data.get('total_amount'),
+            }
+            items = [
+                {
+                    'item_description': item.get('item_description') or item.get('description'),
+                    'quantity': item.get('quantity'),
+                    'unit': item.get('unit'),
+                    'unit_price': item.get('unit_price'),
+                    'total_price': item.get('total_price', item.get('amount')),
+                }
+                for item in invoice_data.get('items') or invoice_data.get('line_items') or []
+            ]
+            
             # Validate invoice data
-            is_valid, errors = self.validate_data('invoices', invoice_data)
+            is_valid, errors = self.validate_data('invoices', record)
             if not is_valid:
                 raise ValueError(f"Invalid invoice data: {', '.join(errors)}")
 
+            if file_hash is None and file_path and os.path.isfile(file_path):
+                file_hash = hash_file(file_path)
+
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
-                # Calculate checksum for duplicate detection
-                checksum = hashlib.md5(
-                    f"{invoice_data.get('invoice_number')}_{invoice_data.get('vendor_name')}_{invoice_data.get('total_amount')}".encode()
-                ).hexdigest()
-                
-                # Check for duplicates
-                cursor.execute(
-                    'SELECT id FROM invoices WHERE invoice_number = ? AND vendor_name = ?',
-                    (invoice_data.get('invoice_number'), invoice_data.get('vendor_name'))
+                # Calculate checksum of the identifying fields
+                checksum = invoice_checksum(
+                    record['invoice_number'], record['vendor_name'], record['total_amount']
                 )
-                if cursor.fetchone():
-                    raise ValueError("Duplicate invoice detected")
                 
                 # Insert invoice with additional metadata
-                cursor.execute('''
-                    INSERT INTO invoices (
-                        invoice_number, vendor_name, invoice_date, total_amount,
-                        file_path, checksum, processing_status, error_message
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    invoice_data.get('invoice_number'),
-                    invoice_data.get('vendor_name'),
-                    invoice_data.get('date'),
-                    invoice_data.get('total_amount'),
-                    file_path,
-                    checksum,
-                    'processed',
-                    None
-                ))
+                try:
+                    cursor.execute('''
+                        INSERT INTO invoices (
+                            project_id, invoice_number, vendor_name, invoice_date, total_amount,
+                            file_path, checksum, file_hash, image_hash, duplicate_key,
+                            processing_status, error_message
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        self.write_project_id,
+                        record['invoice_number'],
+                        record['vendor_name'],
+                        record['invoice_date'],
+                        record['total_amount'],
+                        file_path,
+                        checksum,
+                        file_hash,
+                        image_hash,
+                        normalize_invoice_key(record['vendor_name'], record['invoice_number']),
+                        'processed',
+                        None
+                    ))
+                except sqlite3.IntegrityError:
+                    raise ValueError("Duplicate invoice detected")
                 
                 invoice_id = cursor.lastrowid
                 
                 # Validate and insert invoice items
-                for item in invoice_data.get('items', []):
+                for item in items:
                     is_valid, errors = self.validate_data('invoice_items', item)
                     if not is_valid:
                         raise ValueError(f"Invalid item data: {', '.join(errors)}")
@@ -223,7 +532,7 @@ class Database:
                         VALUES (?, ?, ?, ?, ?, ?, ?)
                     ''', (
                         invoice_id,
-                        item.get('description'),
+                        item.get('item_description'),
                         item.get('quantity'),
                         item.get('unit'),
                         item.get('unit_price'),
@@ -231,11 +540,13 @@ class Database:
                         'active'
                     ))
                 
-                # Update statistics
-                self.update_statistics()
-                
+                self._bump_data_version(cursor)
                 conn.commit()
-                return invoice_id
+            
+            # Update statistics and snapshots (need the write lock released)
+            self.update_statistics()
+            self.refresh_dashboard_snapshots()
+            return invoice_id
         except Exception as e:
             print(f"Error saving invoice: {e}")
             # Log error for tracking
@@ -250,41 +561,252 @@ class Database:
                 conn.commit()
             return 0
 
-    def save_variance_analysis(self, invoice_id: int, analysis_data: Dict[str, Any]) -> bool:
-        """Save variance analysis results."""
+    @traced('db.save_variance_analysis')
+    def save_variance_analysis(self, invoice_id: int, analysis_data: Dict[str, Any],
+                               pricing_version_id: int = None) -> bool:
+        """Save variance analysis results against a pricing version."""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
-                
-                for item in analysis_data.get('items_analysis', []):
-                    cursor.execute('''
-                        INSERT INTO variance_analysis (
-                            invoice_id, item_description, base_price,
-                            actual_price, variance_amount, variance_percentage
-                        )
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (
-                        invoice_id,
-                        item.get('description'),
-                        item.get('base_price'),
-                        item.get('actual_price'),
-                        item.get('variance_amount'),
-                        item.get('variance_percentage')
-                    ))
-                
+                cursor.executemany(
+                    _VARIANCE_INSERT,
+                    [self._variance_row(self.write_project_id, invoice_id, item, pricing_version_id)
+                     for item in analysis_data.get('items_analysis', [])]
+                )
+                self._bump_data_version(cursor)
                 conn.commit()
-                return True
+            self.refresh_dashboard_snapshots()
+            schedule_alerts(self.db_path, self.registry_path)
+            return True
         except Exception as e:
             print(f"Error saving variance analysis: {e}")
             return False
 
+    @staticmethod
+    def _variance_row(project_id: int, invoice_id: int, item: Dict[str, Any],
+                      pricing_version_id: int = None) -> tuple:
+        matched = item.get('matched')
+        return (
+            project_id,
+            invoice_id,
+            item.get('description'),
+            item.get('expected_unit_price') if matched else None,
+            item.get('unit_price'),
+            item.get('variance') if matched else None,
+            item.get('variance_percentage') if matched else None,
+            item.get('quantity'),
+            item.get('amount'),
+            pricing_version_id,
+            item.get('pricing_key')
+        )
+
+    def get_current_variance_items(self) -> pd.DataFrame:
+        """Retrieve the current variance rows with the item data needed to compare them again."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                return pd.read_sql_query('''
+                    SELECT id, invoice_id, item_description, quantity,
+                           actual_price, amount, pricing_row_key
+                    FROM variance_analysis
+                    WHERE is_current = 1 AND project_id = ?
+                ''', conn, params=(self.write_project_id,))
+        except Exception as e:
+            print(f"Error retrieving variance items: {e}")
+            return pd.DataFrame()
+
+    def iter_variance_rows(self, batch_size: int = 5000) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the current variance rows with their invoices, oldest invoice first.
+
+        Rows are fetched batch_size at a time and shaped like the item
+        analyses of PriceComparator, so reports can be written without
+        loading the whole table.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            project_filter, params = self._project_filter('va')
+            cursor = conn.execute(f'''
+                SELECT i.invoice_number, i.vendor_name, va.item_description, va.quantity,
+                       va.actual_price, va.amount, va.pricing_row_key, va.base_price,
+                       va.variance_amount, va.variance_percentage
+                FROM variance_analysis va
+                JOIN invoices i ON i.id = va.invoice_id
+                WHERE va.is_current = 1{project_filter}
+                ORDER BY i.invoice_date, i.id, va.id
+            ''', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for (invoice_number, vendor_name, description, quantity, unit_price, amount,
+                     pricing_key, base_price, variance, percentage) in rows:
+                    matched = base_price is not None
+                    yield {
+                        'invoice_number': invoice_number,
+                        'vendor_name': vendor_name,
+                        'description': description,
+                        'quantity': quantity,
+                        'unit_price': unit_price,
+                        'amount': amount,
+                        'matched': matched,
+                        'pricing_key': pricing_key,
+                        'expected_unit_price': base_price,
+                        'expected_total': base_price * (quantity or 1) if matched else None,
+                        'actual_total': amount,
+                        'variance': variance,
+                        'variance_percentage': percentage,
+                    }
+        finally:
+            conn.close()
+
+    @traced('db.supersede_variance_items')
+    def supersede_variance_items(self, results: List[Tuple[int, int, Dict[str, Any]]],
+                                 pricing_version_id: int) -> bool:
+        """
+        Replace variance rows with results against a newer pricing version.
+
+        Args:
+            results: (variance row id, invoice id, item analysis) tuples
+            pricing_version_id (int): Pricing version the new results were computed against
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    'UPDATE variance_analysis SET is_current = 0 WHERE id = ?',
+                    [(row_id,) for row_id, _, _ in results]
+                )
+                cursor.executemany(
+                    _VARIANCE_INSERT,
+                    [self._variance_row(self.write_project_id, invoice_id, item, pricing_version_id)
+                     for _, invoice_id, item in results]
+                )
+                self._bump_data_version(cursor)
+                conn.commit()
+            self.refresh_dashboard_snapshots()
+            schedule_alerts(self.db_path, self.registry_path)
+            return True
+        except Exception as e:
+            print(f"Error superseding variance analysis: {e}")
+            return False
+
+    def get_alerts(self, unread_only: bool = False, alert_type: str = None,
+                   limit: int = 100) -> List[Dict[str, Any]]:
+        """Retrieve the latest alerts, newest first."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                project_filter, params = self._project_filter()
+                if unread_only:
+                    project_filter += ' AND is_read = 0'
+                if alert_type:
+                    project_filter += ' AND alert_type = ?'
+                    params.append(alert_type)
+                rows = conn.execute(f'''
+                    SELECT id, project_id, invoice_id, alert_type, message, severity, is_read, created_at
+                    FROM alerts
+                    WHERE 1=1{project_filter}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', params + [limit]).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error retrieving alerts: {e}")
+            return []
+
+    def mark_alerts_read(self, alert_ids: List[int]) -> bool:
+        """Mark alerts as read."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany('UPDATE alerts SET is_read = 1 WHERE id = ?', [(i,) for i in alert_ids])
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error marking alerts read: {e}")
+            return False
+
+    def set_alert_threshold(self, item_key: str, threshold: float) -> bool:
+        """Set the variance percentage that raises an alert for one pricing item."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('''
+                    INSERT INTO alert_thresholds (project_id, item_key, threshold)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(project_id, item_key) DO UPDATE SET threshold = excluded.threshold
+                ''', (self.write_project_id, item_key, threshold))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error saving alert threshold: {e}")
+            return False
+
+    def get_alert_thresholds(self) -> Dict[str, float]:
+        """Retrieve the per-item alert thresholds of this project."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(
+                    'SELECT item_key, threshold FROM alert_thresholds WHERE project_id = ?',
+                    (self.write_project_id,)
+                ).fetchall()
+                return dict(rows)
+        except Exception as e:
+            print(f"Error retrieving alert thresholds: {e}")
+            return {}
+
+    def save_vendor_template(self, template: Dict[str, Any]) -> bool:
+        """Save a learned vendor template, replacing an older one for the same layout."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('''
+                    INSERT INTO vendor_templates (fingerprint, layout_hash, vendor_name, template)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (fingerprint, layout_hash) DO UPDATE SET
+                        vendor_name = excluded.vendor_name,
+                        template = excluded.template,
+                        confirmed_count = confirmed_count + 1,
+                        updated_at = CURRENT_TIMESTAMP
+                ''', (
+                    template['fingerprint'],
+                    template['layout_hash'],
+                    template.get('vendor'),
+                    json.dumps(template, ensure_ascii=False)
+                ))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error saving vendor template: {e}")
+            return False
+
+    def get_vendor_templates(self) -> List[Dict[str, Any]]:
+        """Retrieve all learned vendor templates."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT vendor_name, template, confirmed_count
+                    FROM vendor_templates
+                ''')
+                return [
+                    {
+                        'vendor_name': row[0],
+                        'template': json.loads(row[1]),
+                        'confirmed_count': row[2]
+                    }
+                    for row in cursor.fetchall()
+                ]
+        except Exception as e:
+            print(f"Error retrieving vendor templates: {e}")
+            return []
+
+    @cached_query
     def get_invoice_history(self) -> List[Dict[str, Any]]:
         """Retrieve invoice history with variance analysis."""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute('''
+                project_filter, params = self._project_filter('i')
+                cursor.execute(f'''
                     SELECT 
                         i.invoice_number,
                         i.vendor_name,
@@ -292,10 +814,11 @@ class Database:
                         i.total_amount,
                         GROUP_CONCAT(va.item_description || ':' || va.variance_percentage, ';') as variances
                     FROM invoices i
-                    LEFT JOIN variance_analysis va ON i.id = va.invoice_id
+                    LEFT JOIN variance_analysis va ON i.id = va.invoice_id AND va.is_current = 1
+                    WHERE 1=1{project_filter}
                     GROUP BY i.id
                     ORDER BY i.invoice_date DESC
-                ''')
+                ''', params)
                 
                 results = []
                 for row in cursor.fetchall():
@@ -319,23 +842,127 @@ class Database:
             print(f"Error retrieving invoice history: {e}")
             return []
 
+    @cached_query
     def get_trend_data(self) -> pd.DataFrame:
         """Retrieve trend data for analysis."""
         try:
+            project_filter, params = self._project_filter('va')
             with sqlite3.connect(self.db_path) as conn:
-                return pd.read_sql_query('''
+                return pd.read_sql_query(f'''
                     SELECT 
                         i.invoice_date,
                         va.item_description,
                         va.variance_percentage
                     FROM variance_analysis va
                     JOIN invoices i ON va.invoice_id = i.id
+                    WHERE va.is_current = 1{project_filter}
                     ORDER BY i.invoice_date
-                ''', conn)
+                ''', conn, params=params)
         except Exception as e:
             print(f"Error retrieving trend data: {e}")
             return pd.DataFrame()
 
+    @cached_query
+    def get_item_variance_trends(self) -> pd.DataFrame:
+        """
+        Per-item variance trends, aggregated in SQL.
+
+        The least-squares slope of each item's variance over its successive
+        invoices is computed from running sums, so only one row per item
+        leaves the database.
+
+        Returns:
+            pd.DataFrame: item_description, points, average_variance, slope and
+                variance_trend ('increasing', 'decreasing' or 'stable')
+        """
+        try:
+            project_filter, params = self._project_filter('va')
+            with sqlite3.connect(self.db_path) as conn:
+                trends = pd.read_sql_query(f'''
+                    SELECT
+                        item_description,
+                        COUNT(*) AS points,
+                        AVG(variance) AS average_variance,
+                        SUM(x) AS sum_x,
+                        SUM(variance) AS sum_y,
+                        SUM(x * variance) AS sum_xy,
+                        SUM(x * x) AS sum_xx
+                    FROM (
+                        SELECT
+                            va.item_description,
+                            COALESCE(va.variance_percentage, 0) AS variance,
+                            ROW_NUMBER() OVER (
+                                PARTITION BY va.item_description
+                                ORDER BY i.invoice_date, va.id
+                            ) - 1 AS x
+                        FROM variance_analysis va
+                        JOIN invoices i ON va.invoice_id = i.id
+                        WHERE va.is_current = 1{project_filter}
+                    )
+                    GROUP BY item_description
+                ''', conn, params=params)
+        except Exception as e:
+            print(f"Error retrieving item variance trends: {e}")
+            return pd.DataFrame()
+
+        n = trends['points']
+        denominator = n * trends['sum_xx'] - trends['sum_x'] ** 2
+        trends['slope'] = (
+            (n * trends['sum_xy'] - trends['sum_x'] * trends['sum_y']) / denominator.where(denominator != 0)
+        ).fillna(0.0)
+        # Same thresholds as PriceComparator.analyze_trends
+        trends['variance_trend'] = np.select(
+            [trends['slope'] > 0.05, trends['slope'] < -0.05], ['increasing', 'decreasing'], 'stable'
+        )
+        return trends[['item_description', 'points', 'average_variance', 'slope', 'variance_trend']]
+
+    @cached_query
+    def get_variance_time_series(self, bucket: Optional[str] = None,
+                                 max_points: int = 1000) -> pd.DataFrame:
+        """
+        Variance and invoiced amounts per time bucket, aggregated in SQL.
+
+        Args:
+            bucket (str, optional): day, week, month or year (default: the finest
+                bucket giving at most max_points rows)
+            max_points (int): Row count aimed for when the bucket is chosen
+
+        Returns:
+            pd.DataFrame: bucket_start, items, average_variance, max_variance, total_amount
+        """
+        from .chart_data import choose_bucket
+
+        try:
+            project_filter, params = self._project_filter('i')
+            with sqlite3.connect(self.db_path) as conn:
+                if bucket is None:
+                    first, last = conn.execute(f'''
+                        SELECT MIN(i.invoice_date), MAX(i.invoice_date)
+                        FROM invoices i
+                        WHERE i.invoice_date IS NOT NULL{project_filter}
+                    ''', params).fetchone()
+                    if first is None:
+                        return pd.DataFrame()
+                    bucket = choose_bucket(first, last, max_points)
+                bucket_start = _BUCKET_START[bucket].format(column='i.invoice_date')
+                return pd.read_sql_query(f'''
+                    SELECT
+                        {bucket_start} AS bucket_start,
+                        COUNT(va.id) AS items,
+                        AVG(va.variance_percentage) AS average_variance,
+                        MAX(ABS(va.variance_percentage)) AS max_variance,
+                        SUM(va.amount) AS total_amount
+                    FROM invoices i
+                    JOIN variance_analysis va ON va.invoice_id = i.id AND va.is_current = 1
+                    WHERE i.invoice_date IS NOT NULL{project_filter}
+                    GROUP BY bucket_start
+                    ORDER BY bucket_start
+                ''', conn, params=params)
+        except Exception as e:
+            print(f"Error retrieving variance time series: {e}")
+            return pd.DataFrame()
+
+    @traced('db.update_statistics')
     def update_statistics(self):
         """Update data statistics."""
         try:
@@ -345,30 +972,34 @@ class Database:
                 # Calculate daily statistics
                 cursor.execute('''
                     INSERT INTO data_statistics (
-                        stat_date, total_invoices, total_amount,
+                        project_id, stat_date, total_invoices, total_amount,
                         avg_variance, unique_vendors
                     )
                     SELECT 
+                        ?,
                         DATE('now'),
                         COUNT(DISTINCT i.id),
                         SUM(i.total_amount),
                         AVG(va.variance_percentage),
                         COUNT(DISTINCT i.vendor_name)
                     FROM invoices i
-                    LEFT JOIN variance_analysis va ON i.id = va.invoice_id
-                ''')
+                    LEFT JOIN variance_analysis va ON i.id = va.invoice_id AND va.is_current = 1
+                    WHERE i.project_id = ?
+                ''', (self.write_project_id, self.write_project_id))
                 
                 conn.commit()
         except Exception as e:
             print(f"Error updating statistics: {e}")
 
+    @cached_query
     def get_statistics(self, days: int = 30) -> Dict[str, Any]:
         """Get data statistics for the specified period."""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute('''
+                project_filter, params = self._project_filter('i')
+                cursor.execute(f'''
                     SELECT 
                         COUNT(DISTINCT i.id) as total_invoices,
                         SUM(i.total_amount) as total_amount,
@@ -376,9 +1007,9 @@ class Database:
                         AVG(va.variance_percentage) as avg_variance,
                         COUNT(DISTINCT CASE WHEN va.variance_percentage > 10 THEN i.id END) as high_variance_invoices
                     FROM invoices i
-                    LEFT JOIN variance_analysis va ON i.id = va.invoice_id
-                    WHERE i.invoice_date >= DATE('now', ?)
-                ''', (f'-{days} days',))
+                    LEFT JOIN variance_analysis va ON i.id = va.invoice_id AND va.is_current = 1
+                    WHERE i.invoice_date >= DATE('now', ?){project_filter}
+                ''', (f'-{days} days', *params))
                 
                 row = cursor.fetchone()
                 return {
@@ -392,6 +1023,7 @@ class Database:
             print(f"Error getting statistics: {e}")
             return {}
 
+    @cached_query
     def search_invoices(self, 
                        query: str = None,
                        start_date: datetime = None,
@@ -422,10 +1054,11 @@ class Database:
                         AVG(va.variance_percentage) as avg_variance
                     FROM invoices i
                     LEFT JOIN invoice_items ii ON i.id = ii.invoice_id
-                    LEFT JOIN variance_analysis va ON i.id = va.invoice_id
+                    LEFT JOIN variance_analysis va ON i.id = va.invoice_id AND va.is_current = 1
                     WHERE 1=1
                 '''
-                params = []
+                project_filter, params = self._project_filter('i')
+                sql += project_filter
                 
                 if query:
                     sql += ''' AND (
@@ -494,6 +1127,572 @@ class Database:
             print(f"Error searching invoices: {e}")
             return []
 
+    def refresh_weekly_aggregates(self) -> int:
+        """
+        Recompute the weekly aggregates of weeks that received new rows.
+
+        Invoices belong to the week they were received in (created_at).
+        Only weeks with invoices or variance rows written since the last
+        refresh are recomputed, each with a query bounded to that week, so
+        the cost follows the new data rather than the history. Covers all
+        projects stored in this database file.
+
+        Returns:
+            int: Weeks recomputed
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                last_invoice_id, last_variance_id = cursor.execute(
+                    'SELECT last_invoice_id, last_variance_id FROM report_state WHERE id = 1'
+                ).fetchone()
+                max_invoice_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM invoices').fetchone()[0]
+                max_variance_id = cursor.execute(
+                    'SELECT COALESCE(MAX(id), 0) FROM variance_analysis'
+                ).fetchone()[0]
+
+                weeks = cursor.execute(f'''
+                    SELECT project_id, {_WEEK_START.format(column='created_at')}
+                    FROM invoices
+                    WHERE id > ? AND id <= ?
+                    UNION
+                    SELECT i.project_id, {_WEEK_START.format(column='i.created_at')}
+                    FROM variance_analysis va
+                    JOIN invoices i ON i.id = va.invoice_id
+                    WHERE va.id > ? AND va.id <= ?
+                ''', (last_invoice_id, max_invoice_id, last_variance_id, max_variance_id)).fetchall()
+
+                for project_id, week_start in weeks:
+                    week_range = (project_id, week_start, week_start)
+                    invoices = cursor.execute('''
+                        SELECT COUNT(*), COALESCE(SUM(total_amount), 0), COUNT(DISTINCT vendor_name)
+                        FROM invoices
+                        WHERE project_id = ? AND created_at >= ? AND created_at < DATE(?, '+7 days')
+                    ''', week_range).fetchone()
+                    variances = cursor.execute('''
+                        SELECT
+                            COALESCE(SUM(va.variance_amount), 0),
+                            COUNT(CASE WHEN ABS(va.variance_percentage) > 10 THEN 1 END)
+                        FROM invoices i
+                        JOIN variance_analysis va ON va.invoice_id = i.id AND va.is_current = 1
+                        WHERE i.project_id = ? AND i.created_at >= ? AND i.created_at < DATE(?, '+7 days')
+                    ''', week_range).fetchone()
+                    cursor.execute('''
+                        INSERT INTO weekly_aggregates (
+                            project_id, week_start, total_invoices, total_amount, unique_vendors,
+                            variance_amount, high_variance_items, updated_at
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT(project_id, week_start) DO UPDATE SET
+                            total_invoices = excluded.total_invoices,
+                            total_amount = excluded.total_amount,
+                            unique_vendors = excluded.unique_vendors,
+                            variance_amount = excluded.variance_amount,
+                            high_variance_items = excluded.high_variance_items,
+                            updated_at = excluded.updated_at
+                    ''', (project_id, week_start, *invoices, *variances))
+
+                cursor.execute(
+                    'UPDATE report_state SET last_invoice_id = ?, last_variance_id = ? WHERE id = 1',
+                    (max_invoice_id, max_variance_id)
+                )
+                conn.commit()
+                return len(weeks)
+        except Exception as e:
+            print(f"Error refreshing weekly aggregates: {e}")
+            return 0
+
+    def _reset_weekly_aggregates(self, cursor):
+        """Drop this project's weekly aggregates and rewind the refresh cursor so every week is recomputed."""
+        project_filter, params = self._project_filter()
+        cursor.execute(f'DELETE FROM weekly_aggregates WHERE 1=1{project_filter}', params)
+        cursor.execute('UPDATE report_state SET last_invoice_id = 0, last_variance_id = 0 WHERE id = 1')
+
+    def get_weekly_aggregate(self, week_start: str) -> Dict[str, Any]:
+        """Retrieve the precomputed aggregate of one week (Monday date) of this project."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute('''
+                    SELECT week_start, total_invoices, total_amount, unique_vendors,
+                           variance_amount, high_variance_items
+                    FROM weekly_aggregates
+                    WHERE project_id = ? AND week_start = ?
+                ''', (self.write_project_id, week_start)).fetchone()
+                if row:
+                    return dict(row)
+                return {
+                    'week_start': week_start, 'total_invoices': 0, 'total_amount': 0,
+                    'unique_vendors': 0, 'variance_amount': 0, 'high_variance_items': 0
+                }
+        except Exception as e:
+            print(f"Error retrieving weekly aggregate: {e}")
+            return {}
+
+    def get_week_invoices(self, week_start: str) -> List[Dict[str, Any]]:
+        """Retrieve the invoices of this project received in one week."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute('''
+                    SELECT invoice_number, vendor_name, invoice_date, total_amount, processing_status
+                    FROM invoices
+                    WHERE project_id = ? AND created_at >= ? AND created_at < DATE(?, '+7 days')
+                    ORDER BY created_at
+                ''', (self.write_project_id, week_start, week_start)).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error retrieving week invoices: {e}")
+            return []
+
+    def get_week_alerts(self, week_start: str) -> List[Dict[str, Any]]:
+        """Retrieve the alerts of this project raised in one week."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute('''
+                    SELECT alert_type, message, severity, created_at
+                    FROM alerts
+                    WHERE project_id = ? AND created_at >= ? AND created_at < DATE(?, '+7 days')
+                    ORDER BY created_at
+                ''', (self.write_project_id, week_start, week_start)).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error retrieving week alerts: {e}")
+            return []
+
+    def save_weekly_report(self, week_start: str, week_end: str, aggregate: Dict[str, Any],
+                           report_path: str) -> bool:
+        """Record a rendered weekly report; a report rendered again replaces the old one."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('''
+                    INSERT INTO weekly_reports (
+                        project_id, week_start_date, week_end_date, total_invoices,
+                        total_amount, variance_amount, report_path
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(project_id, week_start_date) DO UPDATE SET
+                        total_invoices = excluded.total_invoices,
+                        total_amount = excluded.total_amount,
+                        variance_amount = excluded.variance_amount,
+                        report_path = excluded.report_path,
+                        created_at = CURRENT_TIMESTAMP
+                ''', (
+                    self.write_project_id, week_start, week_end,
+                    aggregate.get('total_invoices'), aggregate.get('total_amount'),
+                    aggregate.get('variance_amount'), report_path
+                ))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error saving weekly report: {e}")
+            return False
+
+    def get_weekly_reports(self) -> List[Dict[str, Any]]:
+        """Retrieve the weekly reports of this project, newest first."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                project_filter, params = self._project_filter()
+                rows = conn.execute(f'''
+                    SELECT id, project_id, week_start_date, week_end_date, total_invoices,
+                           total_amount, variance_amount, report_path, created_at
+                    FROM weekly_reports
+                    WHERE 1=1{project_filter}
+                    ORDER BY week_start_date DESC
+                ''', params).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error retrieving weekly reports: {e}")
+            return []
+
+    @traced('db.refresh_dashboard_snapshots')
+    def refresh_dashboard_snapshots(self) -> int:
+        """
+        Bring the dashboard snapshot tables up to date with new rows.
+
+        Invoices never change once written, so their day, status and vendor
+        totals are added as deltas. Categories (pricing rows) are recomputed
+        for the invoices that received variance rows, including the keys of
+        rows they superseded, with queries bounded to each category. Runs in
+        one write transaction so concurrent refreshes never add a delta
+        twice. Covers all projects stored in this database file.
+
+        Returns:
+            int: Invoices and variance rows added to the snapshots
+        """
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        except Exception as e:
+            print(f"Error refreshing dashboard snapshots: {e}")
+            return 0
+        try:
+            cursor = conn.cursor()
+            state = cursor.execute(
+                'SELECT last_invoice_id, last_variance_id FROM dashboard_state WHERE id = 1'
+            ).fetchone()
+            latest = cursor.execute('''
+                SELECT (SELECT COALESCE(MAX(id), 0) FROM invoices),
+                       (SELECT COALESCE(MAX(id), 0) FROM variance_analysis)
+            ''').fetchone()
+            if tuple(state) == tuple(latest):
+                return 0
+
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Re-read under the write lock; another process may have refreshed
+                last_invoice_id, last_variance_id = cursor.execute(
+                    'SELECT last_invoice_id, last_variance_id FROM dashboard_state WHERE id = 1'
+                ).fetchone()
+                max_invoice_id, max_variance_id = cursor.execute('''
+                    SELECT (SELECT COALESCE(MAX(id), 0) FROM invoices),
+                           (SELECT COALESCE(MAX(id), 0) FROM variance_analysis)
+                ''').fetchone()
+                invoice_range = (last_invoice_id, max_invoice_id)
+
+                day = _INVOICE_DAY.format(alias='')
+                cursor.execute(f'''
+                    INSERT INTO dashboard_daily (project_id, day, status, invoices, total_amount)
+                    SELECT project_id, {day}, COALESCE(processing_status, 'processed'),
+                           COUNT(*), COALESCE(SUM(total_amount), 0)
+                    FROM invoices
+                    WHERE id > ? AND id <= ?
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT(project_id, day, status) DO UPDATE SET
+                        invoices = invoices + excluded.invoices,
+                        total_amount = total_amount + excluded.total_amount
+                ''', invoice_range)
+                for period in ("'all'", _WEEK_START.format(column=day)):
+                    cursor.execute(f'''
+                        INSERT INTO dashboard_vendors (project_id, period, vendor_name, invoices, total_amount)
+                        SELECT project_id, {period}, COALESCE(vendor_name, ''),
+                               COUNT(*), COALESCE(SUM(total_amount), 0)
+                        FROM invoices
+                        WHERE id > ? AND id <= ?
+                        GROUP BY 1, 2, 3
+                        ON CONFLICT(project_id, period, vendor_name) DO UPDATE SET
+                            invoices = invoices + excluded.invoices,
+                            total_amount = total_amount + excluded.total_amount
+                    ''', invoice_range)
+
+                # Every key the touched invoices ever had, so superseded rows
+                # leave the categories they moved out of
+                week = _WEEK_START.format(column=_INVOICE_DAY.format(alias='i.'))
+                touched = cursor.execute(f'''
+                    SELECT DISTINCT va.project_id, va.pricing_row_key, {week}
+                    FROM variance_analysis va
+                    JOIN invoices i ON i.id = va.invoice_id
+                    WHERE va.invoice_id IN (
+                        SELECT invoice_id FROM variance_analysis WHERE id > ? AND id <= ?
+                    )
+                ''', (last_variance_id, max_variance_id)).fetchall()
+                categories = {(project_id, row_key) for project_id, row_key, _ in touched}
+                for project_id, row_key in categories:
+                    self._refresh_category(cursor, project_id, row_key, 'all')
+                for project_id, row_key, week_start in touched:
+                    self._refresh_category(cursor, project_id, row_key, week_start)
+
+                cursor.execute(
+                    'UPDATE dashboard_state SET last_invoice_id = ?, last_variance_id = ? WHERE id = 1',
+                    (max_invoice_id, max_variance_id)
+                )
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            return (max_invoice_id - last_invoice_id) + (max_variance_id - last_variance_id)
+        except Exception as e:
+            print(f"Error refreshing dashboard snapshots: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _refresh_category(cursor, project_id: int, row_key: Optional[str], period: str):
+        """Recompute one category of a snapshot period ('all' or a week start)."""
+        sql = f'''
+            SELECT COUNT(*), MAX(va.item_description),
+                   COALESCE(SUM(va.base_price * va.quantity), 0),
+                   COALESCE(SUM(va.amount), 0),
+                   COALESCE(SUM(va.variance_amount), 0)
+            FROM variance_analysis va
+            JOIN invoices i ON i.id = va.invoice_id
+            WHERE va.project_id = ? AND va.is_current = 1 AND va.pricing_row_key IS ?
+        '''
+        params = [project_id, row_key]
+        if period != 'all':
+            day = _INVOICE_DAY.format(alias='i.')
+            sql += f" AND {day} >= ? AND {day} < DATE(?, '+7 days')"
+            params += [period, period]
+        items, description, expected, actual, variance = cursor.execute(sql, params).fetchone()
+
+        key = (project_id, period, row_key or '')
+        if not items:
+            cursor.execute('''
+                DELETE FROM dashboard_categories
+                WHERE project_id = ? AND period = ? AND category_key = ?
+            ''', key)
+            return
+        cursor.execute('''
+            INSERT INTO dashboard_categories (
+                project_id, period, category_key, category, items,
+                expected_amount, actual_amount, variance_amount
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(project_id, period, category_key) DO UPDATE SET
+                category = excluded.category,
+                items = excluded.items,
+                expected_amount = excluded.expected_amount,
+                actual_amount = excluded.actual_amount,
+                variance_amount = excluded.variance_amount
+        ''', (*key, description if row_key else 'Unmatched', items, expected, actual, variance))
+
+    @staticmethod
+    def _reset_dashboard_snapshots(cursor):
+        """Drop all snapshot rows so the next refresh rebuilds them."""
+        for table in ('dashboard_daily', 'dashboard_vendors', 'dashboard_categories'):
+            cursor.execute(f'DELETE FROM {table}')
+        cursor.execute('UPDATE dashboard_state SET last_invoice_id = 0, last_variance_id = 0 WHERE id = 1')
+
+    @cached_query
+    def get_category_snapshot(self, week_start: str = None) -> List[Dict[str, Any]]:
+        """
+        Expected and invoiced amounts per pricing category, largest first.
+
+        Args:
+            week_start (str, optional): Monday of a week (default: all time)
+        """
+        self.refresh_dashboard_snapshots()
+        try:
+            project_filter, params = self._project_filter()
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute(f'''
+                    SELECT category_key, MAX(category) AS category, SUM(items) AS items,
+                           SUM(expected_amount) AS expected_amount,
+                           SUM(actual_amount) AS actual_amount,
+                           SUM(variance_amount) AS variance_amount
+                    FROM dashboard_categories
+                    WHERE period = ?{project_filter}
+                    GROUP BY category_key
+                    ORDER BY actual_amount DESC
+                ''', (week_start or 'all', *params)).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error retrieving category snapshot: {e}")
+            return []
+
+    @cached_query
+    def get_vendor_snapshot(self, week_start: str = None) -> List[Dict[str, Any]]:
+        """
+        Invoice count and amounts per vendor, largest first.
+
+        Args:
+            week_start (str, optional): Monday of a week (default: all time)
+        """
+        self.refresh_dashboard_snapshots()
+        try:
+            project_filter, params = self._project_filter()
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute(f'''
+                    SELECT vendor_name, SUM(invoices) AS invoice_count,
+                           SUM(total_amount) AS total_amount,
+                           SUM(total_amount) / SUM(invoices) AS average_amount
+                    FROM dashboard_vendors
+                    WHERE period = ?{project_filter}
+                    GROUP BY vendor_name
+                    ORDER BY total_amount DESC
+                ''', (week_start or 'all', *params)).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error retrieving vendor snapshot: {e}")
+            return []
+
+    @cached_query
+    def get_daily_snapshot(self, start_date: str = None, end_date: str = None,
+                           by_status: bool = False) -> List[Dict[str, Any]]:
+        """
+        Invoice count and amounts per day, or per processing status.
+
+        Args:
+            start_date (str, optional): First day included
+            end_date (str, optional): Last day included
+            by_status (bool): Group by processing status instead of day
+        """
+        self.refresh_dashboard_snapshots()
+        try:
+            group = 'status' if by_status else 'day'
+            sql = f'''
+                SELECT {group}, SUM(invoices) AS invoices, SUM(total_amount) AS total_amount
+                FROM dashboard_daily
+                WHERE 1=1
+            '''
+            project_filter, params = self._project_filter()
+            sql += project_filter
+            if start_date:
+                sql += ' AND day >= ?'
+                params.append(start_date)
+            if end_date:
+                sql += ' AND day <= ?'
+                params.append(end_date)
+            sql += f' GROUP BY {group} ORDER BY {group}'
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        except Exception as e:
+            print(f"Error retrieving daily snapshot: {e}")
+            return []
+
+    def get_weekly_dashboard(self, week_start: str) -> Dict[str, Any]:
+        """
+        Data of Visualizer.create_weekly_summary_subplot for one week, from the snapshots.
+
+        Args:
+            week_start (str): Monday of the week
+        """
+        week_end = (datetime.strptime(week_start, '%Y-%m-%d') + timedelta(days=6)).strftime('%Y-%m-%d')
+        daily = self.get_daily_snapshot(week_start, week_end)
+        statuses = self.get_daily_snapshot(week_start, week_end, by_status=True)
+        categories = self.get_category_snapshot(week_start)
+        vendors = self.get_vendor_snapshot(week_start)
+        return {
+            'daily_expenses': {
+                'dates': [row['day'] for row in daily],
+                'amounts': [row['total_amount'] for row in daily],
+            },
+            'category_distribution': {
+                'categories': [row['category'] for row in categories],
+                'amounts': [row['actual_amount'] for row in categories],
+            },
+            'invoice_status': {
+                'status': [row['status'] for row in statuses],
+                'count': [row['invoices'] for row in statuses],
+            },
+            'top_vendors': {
+                'names': [row['vendor_name'] for row in vendors],
+                'amounts': [row['total_amount'] for row in vendors],
+            },
+        }
+
+    def save_trace(self, trace: Trace) -> bool:
+        """
+        Store the stage timings and counters of a finished trace.
+
+        Traces older than METRICS_RETENTION_DAYS are dropped on the way. The
+        trace also feeds the published metrics (utils/metrics.py).
+        """
+        record_trace(trace)
+        try:
+            attributes = dict(trace.attributes)
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO traces (trace_id, project_id, name, ref, duration_ms, attributes, counters)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    trace.trace_id,
+                    self.write_project_id,
+                    trace.name,
+                    attributes.pop('ref', None),
+                    trace.duration * 1000,
+                    json.dumps(attributes, ensure_ascii=False, default=str),
+                    json.dumps(dict(trace.counters)),
+                ))
+                cursor.executemany('''
+                    INSERT INTO stage_metrics (trace_id, stage, calls, duration_ms)
+                    VALUES (?, ?, ?, ?)
+                ''', [
+                    (trace.trace_id, stage, calls, seconds * 1000)
+                    for stage, (calls, seconds) in trace.stages.items()
+                ])
+                cursor.execute('''
+                    DELETE FROM stage_metrics WHERE trace_id IN (
+                        SELECT trace_id FROM traces WHERE created_at < DATETIME('now', ?)
+                    )
+                ''', (f'-{METRICS_RETENTION_DAYS} days',))
+                cursor.execute(
+                    "DELETE FROM traces WHERE created_at < DATETIME('now', ?)",
+                    (f'-{METRICS_RETENTION_DAYS} days',)
+                )
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error saving trace: {e}")
+            return False
+
+    def get_stage_metrics(self, days: int = 7, name: str = 'invoice') -> pd.DataFrame:
+        """
+        Percentiles of per-trace stage durations.
+
+        Args:
+            days (int): Traces of the last days included
+            name (str): Kind of trace
+
+        Returns:
+            pd.DataFrame: stage, traces, calls, p50_ms, p95_ms, p99_ms, max_ms; the
+                first row ('total') covers whole traces
+        """
+        try:
+            project_filter, params = self._project_filter('t')
+            with sqlite3.connect(self.db_path) as conn:
+                rows = pd.read_sql_query(f'''
+                    SELECT t.trace_id, 'total' AS stage, 1 AS calls, t.duration_ms
+                    FROM traces t
+                    WHERE t.name = ? AND t.created_at >= DATETIME('now', ?){project_filter}
+                    UNION ALL
+                    SELECT sm.trace_id, sm.stage, sm.calls, sm.duration_ms
+                    FROM stage_metrics sm
+                    JOIN traces t ON t.trace_id = sm.trace_id
+                    WHERE t.name = ? AND t.created_at >= DATETIME('now', ?){project_filter}
+                ''', conn, params=[name, f'-{days} days', *params] * 2)
+        except Exception as e:
+            print(f"Error retrieving stage metrics: {e}")
+            return pd.DataFrame()
+        if rows.empty:
+            return rows
+
+        grouped = rows.groupby('stage')
+        metrics = pd.DataFrame({
+            'traces': grouped['trace_id'].nunique(),
+            'calls': grouped['calls'].sum(),
+            'p50_ms': grouped['duration_ms'].quantile(0.5),
+            'p95_ms': grouped['duration_ms'].quantile(0.95),
+            'p99_ms': grouped['duration_ms'].quantile(0.99),
+            'max_ms': grouped['duration_ms'].max(),
+        }).reset_index()
+        metrics['order'] = metrics['stage'] != 'total'
+        return metrics.sort_values(['order', 'p95_ms'], ascending=[True, False]).drop(columns='order').reset_index(drop=True)
+
+    def get_trace_counters(self, days: int = 7, name: str = 'invoice') -> Dict[str, Dict[str, float]]:
+        """
+        Totals and per-trace means of trace counters (pages, cache hits, ...).
+
+        Args:
+            days (int): Traces of the last days included
+            name (str): Kind of trace
+        """
+        try:
+            project_filter, params = self._project_filter()
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(f'''
+                    SELECT counters FROM traces
+                    WHERE name = ? AND created_at >= DATETIME('now', ?){project_filter}
+                ''', (name, f'-{days} days', *params)).fetchall()
+        except Exception as e:
+            print(f"Error retrieving trace counters: {e}")
+            return {}
+
+        totals: Dict[str, float] = {}
+        for (counters,) in rows:
+            for counter, amount in json.loads(counters or '{}').items():
+                totals[counter] = totals.get(counter, 0) + amount
+        return {
+            counter: {'total': total, 'per_trace': total / len(rows)}
+            for counter, total in sorted(totals.items())
+        }
+
     def backup_database(self) -> str:
         """Create a versioned backup with metadata."""
         try:
@@ -565,6 +1764,9 @@ class Database:
             with zipfile.ZipFile(backup_zip_path, 'r') as zipf:
                 zipf.extractall(temp_dir)
 
+            # Restored data may carry an older change counter than cached reads
+            previous_data_version = self.get_data_version()
+            
             # Stop database connections
             self.__del__()
 
@@ -585,6 +1787,13 @@ class Database:
 
             # Clean up
             shutil.rmtree(temp_dir)
+            
+            # Bring older backups up to the current schema and invalidate cached reads
+            self.init_database()
+            with sqlite3.connect(self.db_path) as conn:
+                self._bump_data_version(conn.cursor(), previous_data_version)
+                conn.commit()
+            query_cache.clear()
 
             return True
         except Exception as e:
@@ -606,7 +1815,19 @@ class Database:
                 ]
                 
                 for table in tables:
-                    df = pd.read_sql_query(f'SELECT * FROM {table}', conn)
+                    if self.project_id is None:
+                        df = pd.read_sql_query(f'SELECT * FROM {table}', conn)
+                    elif table == 'invoice_items':
+                        df = pd.read_sql_query('''
+                            SELECT ii.* FROM invoice_items ii
+                            JOIN invoices i ON ii.invoice_id = i.id
+                            WHERE i.project_id = ?
+                        ''', conn, params=(self.project_id,))
+                    else:
+                        df = pd.read_sql_query(
+                            f'SELECT * FROM {table} WHERE project_id = ?',
+                            conn, params=(self.project_id,)
+                        )
                     df.to_csv(
                         os.path.join(export_dir, f"{table}.csv"),
                         index=False
@@ -618,28 +1839,87 @@ class Database:
             return False
 
     def import_data(self, import_dir: str) -> bool:
-        """Import data from CSV files into database."""
+        """
+        Import data exported by export_data() into this database's project.
+
+        The project's pricing, invoices, items and variance rows are replaced
+        in one transaction; other projects' rows, the tables and their indexes
+        are left alone. Imported rows get this project's id and new row ids,
+        with the items and variance rows pointed at their invoices' new ids.
+        A database without a project imports every project's rows as exported.
+        """
         try:
             with sqlite3.connect(self.db_path) as conn:
-                # Import tables from CSV
-                tables = [
-                    'initial_pricing',
-                    'invoices',
-                    'invoice_items',
-                    'variance_analysis'
-                ]
-                
-                for table in tables:
+                tables = {}
+                for table in ('initial_pricing', 'invoices', 'invoice_items', 'variance_analysis'):
                     csv_path = os.path.join(import_dir, f"{table}.csv")
                     if os.path.exists(csv_path):
-                        df = pd.read_csv(csv_path)
-                        df.to_sql(table, conn, if_exists='replace', index=False)
+                        tables[table] = pd.read_csv(csv_path)
+                
+                if self.project_id is None:
+                    condition, params = '', []
+                    invoice_condition = ''
+                else:
+                    condition, params = ' WHERE project_id = ?', [self.project_id]
+                    invoice_condition = ' WHERE invoice_id IN (SELECT id FROM invoices WHERE project_id = ?)'
+                
+                if 'initial_pricing' in tables:
+                    conn.execute(f'DELETE FROM initial_pricing{condition}', params)
+                    self._import_rows(conn, 'initial_pricing', tables['initial_pricing'])
+                
+                # Items and variance rows belong to invoices and are replaced with them
+                if 'invoices' in tables:
+                    conn.execute(f'DELETE FROM variance_analysis{condition}', params)
+                    conn.execute(f'DELETE FROM invoice_items{invoice_condition}', params)
+                    conn.execute(f'DELETE FROM invoices{condition}', params)
+                    invoice_ids = self._import_rows(conn, 'invoices', tables['invoices'])
+                    for table in ('invoice_items', 'variance_analysis'):
+                        if table in tables:
+                            rows = tables[table]
+                            rows = rows[rows['invoice_id'].isin(list(invoice_ids))].copy()
+                            rows['invoice_id'] = rows['invoice_id'].map(invoice_ids)
+                            self._import_rows(conn, table, rows)
+                
+                # Weeks whose invoices were replaced would keep stale totals otherwise
+                self._reset_dashboard_snapshots(conn.cursor())
+                self._reset_weekly_aggregates(conn.cursor())
+                self._bump_data_version(conn.cursor())
+                conn.commit()
             
             return True
         except Exception as e:
             print(f"Error importing data: {e}")
             return False
 
+    def _import_rows(self, conn: sqlite3.Connection, table: str, rows: pd.DataFrame) -> Dict[Any, int]:
+        """
+        Insert exported rows under new ids.
+
+        Args:
+            conn (sqlite3.Connection): Connection of the import's transaction
+            table (str): Table the rows were exported from
+            rows (pd.DataFrame): Exported rows
+
+        Returns:
+            Dict[Any, int]: New row id by exported id
+        """
+        table_columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        columns = [column for column in rows.columns if column in table_columns and column != 'id']
+        if self.project_id is not None and 'project_id' in table_columns:
+            rows = rows.assign(project_id=self.project_id)
+            if 'project_id' not in columns:
+                columns.append('project_id')
+        values = rows[columns].astype(object).where(rows[columns].notna(), None)
+        placeholders = ', '.join('?' for _ in columns)
+        
+        new_ids = {}
+        for old_id, row in zip(rows['id'] if 'id' in rows.columns else rows.index, values.itertuples(index=False)):
+            cursor = conn.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})', tuple(row)
+            )
+            new_ids[old_id] = cursor.lastrowid
+        return new_ids
+
     def cleanup_old_files(self, days_old: int = 30) -> bool:
         """Clean up old files and backups."""
         try:
@@ -0,0 +1,105 @@
+import re
+import unicodedata
+from typing import Any, Optional
+
+import numpy as np
+from PIL import Image
+
+from .tracing import traced
+
+# Side of the dHash grid (a 144-bit hash)
+HASH_SIZE = 12
+
+# Largest Hamming distance between hashes of the same page scanned twice.
+# Re-scans with up to about a degree of skew stay within it; different
+# invoices on the same vendor letterhead usually land above it, and a page
+# match also requires the same total.
+IMAGE_HASH_DISTANCE = 12
+
+# First pages are hashed from a low resolution render
+HASH_RENDER_DPI = 36
+
+_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+
+# Arabic spelling variants that OCR and typists use interchangeably
+_ARABIC_VARIANTS = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ة': 'ه', 'ى': 'ي', 'ـ': None})
+
+_WORDS = re.compile(r'\w+')
+
+
+def _normalize_text(value: Any) -> str:
+    text = unicodedata.normalize('NFKC', str(value)).translate(_DIGITS).translate(_ARABIC_VARIANTS)
+    # Drop Arabic diacritics and other combining marks
+    text = ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c))
+    return text.casefold()
+
+
+def normalize_invoice_key(vendor_name: Any, invoice_number: Any) -> Optional[str]:
+    """
+    Key identifying an invoice regardless of formatting.
+
+    Separators in the number ('INV-001' / 'INV 001'), case, digit script
+    and Arabic spelling variants of the vendor are ignored.
+
+    Args:
+        vendor_name (Any): Vendor as extracted
+        invoice_number (Any): Invoice number as extracted
+
+    Returns:
+        Optional[str]: 'vendor|number', or None without an invoice number
+    """
+    if invoice_number is None:
+        return None
+    number = ''.join(_WORDS.findall(_normalize_text(invoice_number))).replace('_', '')
+    if not number:
+        return None
+    vendor = ' '.join(_WORDS.findall(_normalize_text(vendor_name))) if vendor_name else ''
+    return f"{vendor}|{number}"
+
+
+def image_hash(image: Image.Image, hash_size: int = HASH_SIZE) -> str:
+    """
+    Difference hash (dHash) of a page image.
+
+    Args:
+        image (Image.Image): Page image
+        hash_size (int): Side of the hash grid
+
+    Returns:
+        str: Hex digest of hash_size * hash_size bits
+    """
+    pixels = np.asarray(
+        image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS),
+        dtype=np.int16
+    )
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):0{hash_size * hash_size // 4}x}"
+
+
+@traced('hash.page_image')
+def page_image_hash(file_path: str) -> Optional[str]:
+    """
+    Perceptual hash of the first page of a PDF or image file.
+
+    Args:
+        file_path (str): Path to the invoice file
+
+    Returns:
+        Optional[str]: Hex digest, or None if the file cannot be rendered
+    """
+    try:
+        if file_path.lower().endswith('.pdf'):
+            from .rasterizer import PageRasterizer
+
+            with PageRasterizer(file_path, HASH_RENDER_DPI) as rasterizer:
+                return image_hash(Image.fromarray(rasterizer.render(0)[..., ::-1]))
+        with Image.open(file_path) as image:
+            image.draft('L', (image.width // 8 or 1, image.height // 8 or 1))
+            return image_hash(image)
+    except Exception:
+        return None
+
+
+def hash_distance(first: str, second: str) -> int:
+    """Number of differing bits between two hex hashes of the same size."""
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
@@ -0,0 +1,230 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from .table_extractor import parse_number
+
+PATTERN_PACK_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'patterns')
+
+# Day/month/year or year/month/day with -, / or . separators
+_DATE_PATTERN = re.compile(r'(\d{1,4})[-/.](\d{1,2})[-/.](\d{1,4})')
+
+NUMERIC_FIELDS = {'total_amount', 'tax'}
+DATE_FIELDS = {'date'}
+
+
+def normalize_date(value: str) -> Optional[date]:
+    """
+    Parse a day-first or year-first date without trying formats one by one.
+
+    Args:
+        value (str): Date text such as 12/03/2024, 2024-03-12 or ١٢/٠٣/٢٠٢٤
+
+    Returns:
+        Optional[date]: Parsed date, or None if the text is not a valid date
+    """
+    match = _DATE_PATTERN.search(value)
+    if not match:
+        return None
+
+    first, month, last = (int(part) for part in match.groups())
+    if len(match.group(1)) == 4:
+        year, day = first, last
+    else:
+        day, year = first, last
+        if len(match.group(3)) == 2:
+            year += 2000
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+class FieldExtractor:
+    """
+    Extract invoice header fields with a single precompiled scanner.
+
+    All field patterns are combined into one alternation, so the document
+    text is scanned once and every candidate match is recorded with its
+    position. Each pattern must contain exactly one capturing group holding
+    the field value.
+    """
+
+    def __init__(self, patterns: Dict[str, str]):
+        """
+        Compile the field patterns into a single scanner.
+
+        Args:
+            patterns (Dict[str, str]): Regex pattern per field name
+        """
+        self.logger = logging.getLogger(__name__)
+        self.patterns = dict(patterns)
+
+        alternatives = []
+        for field, pattern in self.patterns.items():
+            if re.compile(pattern).groups != 1:
+                raise ValueError(f"Pattern for {field} must have exactly one capturing group")
+            alternatives.append(f'(?P<{field}>{pattern})')
+        self._scanner = re.compile('|'.join(alternatives), re.IGNORECASE | re.MULTILINE)
+
+        # The value group directly follows each field's named group
+        self._value_groups = {
+            field: index + 1 for field, index in self._scanner.groupindex.items()
+        }
+
+    def scan(self, text_content: str) -> List[Dict[str, Any]]:
+        """
+        Find every candidate field match in one pass over the text.
+
+        After each match the scan resumes at the start of its value, so a
+        greedy value (e.g. a vendor name running to the end of the line) does
+        not hide other labels on the same line.
+
+        Args:
+            text_content (str): Extracted text from the invoice
+
+        Returns:
+            List[Dict[str, Any]]: Candidates with field, raw value and start/end offsets
+        """
+        candidates = []
+        position = 0
+        search = self._scanner.search
+        while True:
+            match = search(text_content, position)
+            if match is None:
+                break
+            field = match.lastgroup
+            group = self._value_groups[field]
+            candidates.append({
+                'field': field,
+                'value': match.group(group).strip(),
+                'start': match.start(group),
+                'end': match.end(group),
+            })
+            position = max(match.start(group), match.start() + 1)
+        return candidates
+
+    def normalize(self, field: str, value: str) -> Any:
+        """Convert a raw field value to a date or number where applicable."""
+        if field in DATE_FIELDS:
+            parsed = normalize_date(value)
+            if parsed is None:
+                self.logger.warning(f"Could not parse date: {value}")
+                return value
+            return parsed
+        if field in NUMERIC_FIELDS:
+            number = parse_number(value)
+            if number is None:
+                self.logger.warning(f"Could not parse number: {value}")
+                return value
+            return number
+        return value
+
+    def extract(self, text_content: str) -> Dict[str, Any]:
+        """
+        Extract the first match of every field.
+
+        Args:
+            text_content (str): Extracted text from the invoice
+
+        Returns:
+            Dict[str, Any]: Normalized field values
+        """
+        invoice_data = {}
+        for candidate in self.scan(text_content):
+            field = candidate['field']
+            if field not in invoice_data:
+                invoice_data[field] = self.normalize(field, candidate['value'])
+        return invoice_data
+
+
+class PatternPackRegistry:
+    """
+    Per-vendor pattern packs, loaded and compiled once per directory.
+
+    Each JSON file in the directory describes one vendor:
+
+        {
+            "vendor": "Gulf Concrete Co.",
+            "match": ["gulf concrete", "خليج للخرسانة"],
+            "patterns": {"invoice_number": "Ref\\\\s*:\\\\s*(GC-\\\\d+)"}
+        }
+
+    Pack patterns override the default patterns for the same field.
+    """
+
+    _instances: Dict[Any, 'PatternPackRegistry'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, default_patterns: Dict[str, str], pack_dir: str = PATTERN_PACK_DIR):
+        self.logger = logging.getLogger(__name__)
+        self.pack_dir = pack_dir
+        self.default = FieldExtractor(default_patterns)
+        self.packs: List[Dict[str, Any]] = []
+
+        for path in sorted(glob.glob(os.path.join(pack_dir, '*.json'))):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    pack = json.load(f)
+                self.packs.append({
+                    'vendor': pack['vendor'],
+                    'match': [m.lower() for m in pack.get('match', [pack['vendor']])],
+                    'extractor': FieldExtractor({**default_patterns, **pack.get('patterns', {})}),
+                })
+            except Exception as e:
+                self.logger.error(f"Error loading pattern pack {path}: {str(e)}")
+
+    @classmethod
+    def load(cls, default_patterns: Dict[str, str], pack_dir: str = PATTERN_PACK_DIR) -> 'PatternPackRegistry':
+        """Get the registry for a directory, compiling its packs on first use."""
+        key = (pack_dir, tuple(sorted(default_patterns.items())))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(default_patterns, pack_dir)
+            return cls._instances[key]
+
+    def match(self, text_content: str) -> Optional[Dict[str, Any]]:
+        """Find the pack whose vendor keywords appear in the text."""
+        lowered = text_content.lower()
+        for pack in self.packs:
+            if any(keyword in lowered for keyword in pack['match']):
+                return pack
+        return None
+
+    def select(self, text_content: str, header_chars: int = 2000) -> Tuple[FieldExtractor, Optional[str]]:
+        """
+        Choose the extractor for an invoice from its leading text.
+
+        Args:
+            text_content (str): Extracted text, or the text of the first page
+            header_chars (int): Leading characters searched for vendor keywords
+
+        Returns:
+            Tuple[FieldExtractor, Optional[str]]: Extractor and the pack's vendor name, if any
+        """
+        pack = self.match(text_content[:header_chars]) if self.packs else None
+        if pack is None:
+            return self.default, None
+        return pack['extractor'], pack['vendor']
+
+    def extract(self, text_content: str, header_chars: int = 2000) -> Dict[str, Any]:
+        """
+        Extract fields with the matching vendor pack, or the default patterns.
+
+        Args:
+            text_content (str): Extracted text from the invoice
+            header_chars (int): Leading characters searched for vendor keywords
+
+        Returns:
+            Dict[str, Any]: Normalized field values
+        """
+        extractor, vendor = self.select(text_content, header_chars)
+        invoice_data = extractor.extract(text_content)
+        if vendor:
+            invoice_data.setdefault('vendor', vendor)
+        return invoice_data
@@ -1,8 +1,5 @@
 import pandas as pd
-import pdfplumber
-import pytesseract
 from PIL import Image
-import openai
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -11,8 +8,8 @@ import json
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI
-openai.api_key = os.getenv('OPENAI_API_KEY')
+# OpenAI, pdfplumber and pytesseract are imported on first use; openai alone takes seconds
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
 # Xero configuration
 XERO_CLIENT_ID = os.getenv('XERO_CLIENT_ID')
@@ -35,6 +32,8 @@ class FileProcessor:
     def process_pdf(file_path):
         """Process PDF files and extract invoice data using pdfplumber."""
         try:
+            import pdfplumber
+
             extracted_text = []
             with pdfplumber.open(file_path) as pdf:
                 for page in pdf.pages:
@@ -52,6 +51,8 @@ class FileProcessor:
     def process_image(file_path):
         """Process image files and extract invoice data using OCR."""
         try:
+            import pytesseract
+
             image = Image.open(file_path)
             text = pytesseract.image_to_string(image, lang='ara+eng')
             
@@ -66,6 +67,9 @@ class FileProcessor:
     def _structure_with_gpt(text):
         """Use GPT to structure extracted text into invoice data."""
         try:
+            import openai
+
+            openai.api_key = OPENAI_API_KEY
             response = openai.ChatCompletion.create(
                 model="gpt-4",
                 messages=[
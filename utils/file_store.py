@@ -0,0 +1,162 @@
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional, Tuple, Union
+
+from .tracing import traced
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def copy_stream(source: BinaryIO, destination: BinaryIO, digest: Optional['hashlib._Hash'] = None,
+                chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Copy a file object chunk by chunk, optionally hashing it on the way.
+
+    In-memory uploads (BytesIO, Streamlit's UploadedFile) are written from a
+    view of their buffer instead of getvalue(), which would copy the whole
+    file first; other files are read into one reused chunk buffer.
+
+    Args:
+        source (BinaryIO): File to copy from its start
+        destination (BinaryIO): File opened for binary writing
+        digest (hashlib._Hash, optional): Hash updated with every chunk
+        chunk_size (int): Bytes written at a time
+
+    Returns:
+        int: Bytes copied
+    """
+    if hasattr(source, 'getbuffer'):
+        with source.getbuffer() as view:
+            for start in range(0, len(view), chunk_size):
+                chunk = view[start:start + chunk_size]
+                destination.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+            return len(view)
+
+    source.seek(0)
+    buffer = bytearray(chunk_size)
+    size = 0
+    with memoryview(buffer) as view:
+        while True:
+            read = source.readinto(buffer)
+            if not read:
+                return size
+            destination.write(view[:read])
+            if digest is not None:
+                digest.update(view[:read])
+            size += read
+
+
+@traced('hash.file')
+def file_hash(source: Union[str, bytes, BinaryIO]) -> str:
+    """
+    SHA-256 of a file, read in chunks when given a path.
+
+    In-memory uploads (BytesIO, Streamlit's UploadedFile) are hashed from a
+    view of their buffer without copying them.
+
+    Args:
+        source (Union[str, bytes, BinaryIO]): File path, file content or file object
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif hasattr(source, 'getbuffer'):
+        with source.getbuffer() as view:
+            digest.update(view)
+    elif hasattr(source, 'read'):
+        source.seek(0)
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileStore:
+    """
+    Content-addressed store of uploaded files.
+
+    Files are named by the SHA-256 of their content plus their extension
+    (<directory>/<sha256>.pdf). They are written to a temporary file in the
+    same directory while being hashed, then renamed into place, so a file
+    is read once, never held in memory as a whole, and a stored path is
+    always complete. Uploading the same content again reuses the stored file.
+
+    Stored files are immutable and may be shared by several invoices; only
+    the caller that created a file (see put()) should remove it.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory (str): Directory the files are stored in
+        """
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, digest: str, file_name: str) -> str:
+        """Stored path of content with the given hash, keeping the extension of file_name."""
+        return os.path.join(self.directory, digest + os.path.splitext(file_name)[1].lower())
+
+    def temporary(self) -> BinaryIO:
+        """Open a temporary file in the store for writing; commit() moves it into place."""
+        return tempfile.NamedTemporaryFile('wb', dir=self.directory, prefix='.upload_', delete=False)
+
+    def commit(self, temporary_path: str, digest: str, file_name: str) -> Tuple[str, bool]:
+        """
+        Move a written temporary file to its content address.
+
+        Args:
+            temporary_path (str): File written through temporary()
+            digest (str): SHA-256 of its content
+            file_name (str): Original file name, for the extension
+
+        Returns:
+            Tuple[str, bool]: Stored path and whether it was created (False if the content was already stored)
+        """
+        path = self.path_for(digest, file_name)
+        if os.path.exists(path):
+            os.remove(temporary_path)
+            # Keep a re-uploaded file from being cleaned up as old
+            os.utime(path)
+            return path, False
+        os.replace(temporary_path, path)
+        return path, True
+
+    def put(self, source: BinaryIO, file_name: str, digest: Optional[str] = None) -> Tuple[str, str, bool]:
+        """
+        Store a file object.
+
+        Args:
+            source (BinaryIO): Upload or open file
+            file_name (str): Original file name, for the extension
+            digest (str, optional): SHA-256 of the content if already known; nothing is written
+                when that content is stored
+
+        Returns:
+            Tuple[str, str, bool]: Stored path, SHA-256 and whether the file was created
+        """
+        if digest is not None and os.path.exists(self.path_for(digest, file_name)):
+            path = self.path_for(digest, file_name)
+            os.utime(path)
+            return path, digest, False
+
+        hasher = hashlib.sha256()
+        f = self.temporary()
+        try:
+            with f:
+                copy_stream(source, f, hasher)
+        except Exception:
+            os.remove(f.name)
+            raise
+        digest = hasher.hexdigest()
+        path, created = self.commit(f.name, digest, file_name)
+        return path, digest, created
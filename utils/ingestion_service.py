@@ -0,0 +1,470 @@
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from aiohttp import web
+
+from .database import Database
+from .duplicate_detector import page_image_hash
+from .file_store import FileStore
+from .metrics import CONTENT_TYPE, INVOICES_FAILED, QUEUE_CAPACITY, QUEUE_DEPTH, registry
+from .invoice_processor import InvoiceProcessor
+from .price_comparator import PriceComparator
+from .pricing_store import PricingStore
+from .template_store import TemplateStore
+from .tracing import Trace, trace
+
+ALLOWED_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg'}
+
+CHUNK_SIZE = 256 * 1024
+
+# Per-process invoice processor, created once by the pool initializer
+_worker_processor: Optional[InvoiceProcessor] = None
+
+
+def _init_worker():
+    """Load the OCR engines once per worker process."""
+    global _worker_processor
+    _worker_processor = InvoiceProcessor(template_store=TemplateStore(Database()))
+    _worker_processor.ocr.warm_up(background=False)
+
+
+def _extract_invoice(file_path: str, stop_when_complete: bool
+                     ) -> Tuple[Dict[str, Any], Optional[str], Dict[str, Any]]:
+    """
+    Run the CPU-bound extraction and first-page hashing in a worker process.
+
+    Returns the invoice data, the page image hash and the worker's trace,
+    which the service merges into the invoice's trace.
+    """
+    with trace('extract') as worker_trace:
+        invoice_data = _worker_processor.process_invoice(file_path, stop_when_complete)
+        image_hash = page_image_hash(file_path) if invoice_data else None
+    return invoice_data, image_hash, worker_trace.to_dict()
+
+
+class IngestionService:
+    """
+    Async HTTP API for pushing invoices into the processing pipeline.
+
+    Uploads are streamed to disk without blocking the event loop and queued
+    as jobs. OCR and extraction run in a process pool; price comparison and
+    database writes run in a thread so the SQLite writer stays in this
+    process. Requests beyond the concurrency limit get 429 and uploads
+    arriving while the queue is full are shed with 503.
+
+    Duplicates are caught in two tiers. Uploads are hashed while they
+    stream, and a file already imported (or queued) is answered with 200
+    and the existing invoice before any OCR runs. After extraction, a
+    matching normalized vendor and number, or a near-identical first page
+    with the same total, marks the job 'duplicate' instead of saving it.
+
+    Endpoints:
+        POST /invoices        Upload an invoice (multipart 'file' field, or raw body with ?filename=);
+                              ?project_id= assigns it to a registered project (404 otherwise);
+                              202 with a job, or 200 with the existing invoice or job for
+                              already seen content
+        GET  /jobs/{job_id}   Job status and result summary
+        GET  /jobs            Recent jobs
+        GET  /health          Queue depth and worker status
+        GET  /metrics         Counters and histograms in the Prometheus text format
+    """
+
+    def __init__(self,
+                 workers: Optional[int] = None,
+                 queue_size: int = 100,
+                 max_concurrent_requests: int = 32,
+                 max_upload_bytes: int = 50 * 1024 * 1024,
+                 tolerance: float = 0.05,
+                 stop_when_complete: bool = True,
+                 max_jobs: int = 10000):
+        """
+        Initialize the ingestion service.
+
+        Args:
+            workers (int, optional): OCR worker processes (default: CPU count)
+            queue_size (int): Jobs waiting for a worker before uploads are shed
+            max_concurrent_requests (int): In-flight HTTP requests before 429 responses
+            max_upload_bytes (int): Largest accepted upload
+            tolerance (float): Variance tolerance for price comparison
+            stop_when_complete (bool): Stop reading pages once header fields and totals are found
+            max_jobs (int): Finished jobs kept for status queries
+        """
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.max_upload_bytes = max_upload_bytes
+        self.tolerance = tolerance
+        self.stop_when_complete = stop_when_complete
+        self.max_jobs = max_jobs
+
+        self.db = Database()
+        self.price_comparator = PriceComparator()
+        self._projects: Dict[Optional[int], Any] = {}
+        self._projects_lock = threading.Lock()
+        self.jobs: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        # (project_id, file_hash) of jobs that are queued or processing
+        self._pending_files: Dict[Tuple[Optional[int], str], str] = {}
+
+        self._request_slots = asyncio.Semaphore(max_concurrent_requests)
+        self._queue: Optional[asyncio.Queue] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._worker_tasks = []
+        self._stopping = False
+
+    def create_app(self) -> web.Application:
+        """Create the aiohttp application."""
+        app = web.Application(middlewares=[self._concurrency_middleware])
+        app.router.add_post('/invoices', self.handle_upload)
+        app.router.add_get('/jobs', self.handle_list_jobs)
+        app.router.add_get('/jobs/{job_id}', self.handle_job_status)
+        app.router.add_get('/health', self.handle_health)
+        app.router.add_get('/metrics', self.handle_metrics)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app: web.Application):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        QUEUE_DEPTH.set_function(self._queue.qsize)
+        QUEUE_CAPACITY.set(self.queue_size)
+        self._pool = self._new_pool()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # Spawned workers avoid forking a process that may hold OCR/torch state
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+
+    async def _on_cleanup(self, app: web.Application):
+        self._stopping = True
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    @web.middleware
+    async def _concurrency_middleware(self, request: web.Request, handler):
+        if self._request_slots.locked():
+            return web.json_response(
+                {'error': 'Too many concurrent requests'},
+                status=429,
+                headers={'Retry-After': '1'}
+            )
+        async with self._request_slots:
+            return await handler(request)
+
+    def _shed(self) -> web.Response:
+        return web.json_response(
+            {'error': 'Ingestion queue is full', 'queue_depth': self._queue.qsize()},
+            status=503,
+            headers={'Retry-After': '5'}
+        )
+
+    async def handle_upload(self, request: web.Request) -> web.Response:
+        """Accept an invoice upload and queue it for processing."""
+        # Shed load before reading the body
+        if self._queue.full():
+            return self._shed()
+
+        try:
+            project_id = int(request.query['project_id']) if 'project_id' in request.query else None
+        except ValueError:
+            return web.json_response({'error': 'project_id must be an integer'}, status=400)
+
+        loop = asyncio.get_running_loop()
+        try:
+            _, _, file_store = await loop.run_in_executor(None, self._project, project_id)
+        except KeyError:
+            return web.json_response({'error': f'Unknown project {project_id}'}, status=404)
+
+        job_id = uuid.uuid4().hex
+        try:
+            if request.content_type.startswith('multipart/'):
+                reader = await request.multipart()
+                field = await reader.next()
+                while field is not None and field.name != 'file':
+                    field = await reader.next()
+                if field is None:
+                    return web.json_response({'error': "Missing 'file' field"}, status=400)
+                file_name = field.filename or request.query.get('filename', '')
+                read_chunk = lambda: field.read_chunk(CHUNK_SIZE)
+            else:
+                file_name = request.query.get('filename', '')
+                read_chunk = lambda: request.content.read(CHUNK_SIZE)
+
+            file_name = os.path.basename(file_name)
+            extension = os.path.splitext(file_name)[1].lower()
+            if extension not in ALLOWED_EXTENSIONS:
+                return web.json_response(
+                    {'error': f"Unsupported file type: {extension or 'none'}"},
+                    status=415
+                )
+
+            file_path, size, file_hash, created = await self._save_stream(read_chunk, file_name, file_store)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=413)
+
+        # Tier one: identical content is answered before any OCR runs
+        duplicate = await self._find_file_duplicate(project_id, file_hash)
+        if duplicate is not None:
+            if created:
+                await loop.run_in_executor(None, os.remove, file_path)
+            return web.json_response({'status': 'duplicate', **duplicate}, status=200)
+
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'file_name': file_name,
+            'file_path': file_path,
+            'project_id': project_id,
+            'size': size,
+            'file_hash': file_hash,
+            'created_at': datetime.now().isoformat(),
+        }
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            if created:
+                await loop.run_in_executor(None, os.remove, file_path)
+            return self._shed()
+
+        self._remember(job)
+        self._pending_files[(project_id, file_hash)] = job_id
+        return web.json_response(
+            {'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'},
+            status=202
+        )
+
+    async def _save_stream(self, read_chunk, file_name: str, file_store: FileStore) -> Tuple[str, int, str, bool]:
+        """
+        Write an upload into a project's file store chunk by chunk, off the event loop, hashing it on the way.
+
+        Returns:
+            Tuple[str, int, str, bool]: Stored path, size, SHA-256 and whether the file was created
+                (False when the same content is already stored, possibly for a pending job)
+        """
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(None, file_store.temporary)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            while True:
+                chunk = await read_chunk()
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > self.max_upload_bytes:
+                    raise ValueError(f"Upload exceeds {self.max_upload_bytes} bytes")
+                await loop.run_in_executor(None, _write_and_hash, f, digest, chunk)
+        except Exception:
+            await loop.run_in_executor(None, f.close)
+            await loop.run_in_executor(None, os.remove, f.name)
+            raise
+        await loop.run_in_executor(None, f.close)
+        file_path, created = await loop.run_in_executor(
+            None, file_store.commit, f.name, digest.hexdigest(), file_name
+        )
+        return file_path, size, digest.hexdigest(), created
+
+    async def _find_file_duplicate(self, project_id: Optional[int], file_hash: str) -> Optional[Dict[str, Any]]:
+        """Existing invoice or pending job with the same file content."""
+        job_id = self._pending_files.get((project_id, file_hash))
+        if job_id is not None:
+            return {'duplicate_of_job': job_id, 'status_url': f'/jobs/{job_id}'}
+        loop = asyncio.get_running_loop()
+        db, _, _ = await loop.run_in_executor(None, self._project, project_id)
+        invoice = await loop.run_in_executor(None, db.find_invoice_by_file_hash, file_hash)
+        if invoice is None:
+            return None
+        return {'duplicate_of': invoice['id'], 'match': 'file', 'invoice': invoice}
+
+    def _remember(self, job: Dict[str, Any]):
+        self.jobs[job['id']] = job
+        # Forget the oldest finished jobs
+        while len(self.jobs) > self.max_jobs:
+            oldest_id, oldest = next(iter(self.jobs.items()))
+            if oldest['status'] in ('queued', 'processing'):
+                break
+            del self.jobs[oldest_id]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs[job_id]
+            job['status'] = 'processing'
+            job['started_at'] = datetime.now().isoformat()
+            # The pool this job runs in; another worker may replace self._pool meanwhile
+            pool = self._pool
+            try:
+                invoice_data, image_hash, worker_trace = await loop.run_in_executor(
+                    pool, _extract_invoice, job['file_path'], self.stop_when_complete
+                )
+                if not invoice_data:
+                    raise ValueError("No invoice data could be extracted")
+                job.update(await loop.run_in_executor(
+                    None, self._compare_and_save, invoice_data, job['file_path'], job['project_id'],
+                    job['file_hash'], image_hash, worker_trace
+                ))
+                job['status'] = 'duplicate' if 'duplicate_of' in job else 'done'
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory). Every job in that pool fails with
+                # this error; the first worker to see it replaces the pool for the next jobs
+                self.logger.error(f"Worker pool failed on job {job_id}: {str(e)}")
+                INVOICES_FAILED.inc(source='service')
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                if self._pool is pool:
+                    self._pool = self._new_pool()
+                    pool.shutdown(wait=False)
+            except asyncio.CancelledError:
+                # The job's future was cancelled, or the service is stopping
+                self.logger.error(f"Job {job_id} was cancelled")
+                INVOICES_FAILED.inc(source='service')
+                job['status'] = 'failed'
+                job['error'] = 'Cancelled'
+                if self._stopping:
+                    raise
+            except Exception as e:
+                self.logger.error(f"Error processing job {job_id}: {str(e)}")
+                INVOICES_FAILED.inc(source='service')
+                job['status'] = 'failed'
+                job['error'] = str(e)
+            finally:
+                job['finished_at'] = datetime.now().isoformat()
+                self._pending_files.pop((job['project_id'], job['file_hash']), None)
+                self._queue.task_done()
+
+    def _project(self, project_id: Optional[int]) -> Tuple[Database, PricingStore, FileStore]:
+        """
+        Database, pricing store and upload store of a project, opened once.
+
+        Uploads are kept in the project's data directory, like the app's.
+
+        Raises:
+            KeyError: If the project is not registered
+        """
+        with self._projects_lock:
+            if project_id not in self._projects:
+                if project_id and project_id not in {project['id'] for project in self.db.get_projects()}:
+                    raise KeyError(project_id)
+                db = self.db.for_project(project_id) if project_id else self.db
+                file_store = FileStore(os.path.join(db.data_dir, 'invoices'))
+                self._projects[project_id] = (db, PricingStore(db), file_store)
+            return self._projects[project_id]
+
+    def _compare_and_save(self, invoice_data: Dict[str, Any], file_path: str,
+                          project_id: Optional[int] = None, file_hash: Optional[str] = None,
+                          image_hash: Optional[str] = None,
+                          worker_trace: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Compare prices and persist the invoice unless it duplicates one (runs in a thread).
+
+        The stage timings of the whole invoice, extraction included, are saved
+        with Database.save_trace.
+        """
+        db, pricing_store, _ = self._project(project_id)
+        invoice_trace = Trace('invoice', ref=file_hash, source='service')
+        invoice_trace.merge(worker_trace)
+        with invoice_trace.activate():
+            result = self._check_and_save(db, pricing_store, invoice_data, file_path, file_hash, image_hash)
+        invoice_trace.attributes['status'] = 'duplicate' if 'duplicate_of' in result else 'saved'
+        db.save_trace(invoice_trace)
+        return result
+
+    def _check_and_save(self, db: Database, pricing_store: PricingStore, invoice_data: Dict[str, Any],
+                        file_path: str, file_hash: Optional[str], image_hash: Optional[str]) -> Dict[str, Any]:
+        result = {
+            'invoice_number': invoice_data.get('invoice_number'),
+            'vendor': invoice_data.get('vendor'),
+            'total_amount': invoice_data.get('total_amount'),
+            'line_items': len(invoice_data.get('line_items', [])),
+        }
+
+        # Tier two: same normalized vendor and number, or a re-scan of the same page
+        duplicate = db.find_duplicate_invoice(invoice_data, image_hash)
+        if duplicate is not None:
+            result['duplicate_of'] = duplicate['id']
+            result['match'] = duplicate['match']
+            return result
+
+        invoice_id = db.save_invoice(invoice_data, file_path, file_hash, image_hash)
+        result['invoice_id'] = invoice_id
+
+        pricing, index, version = pricing_store.current()
+        if invoice_id and pricing is not None and not pricing.empty:
+            comparison = self.price_comparator.compare_prices(invoice_data, pricing, self.tolerance, index)
+            if comparison:
+                db.save_variance_analysis(invoice_id, comparison, version['id'])
+                result['variance'] = {
+                    'total_variance': comparison['total_variance'],
+                    **comparison['summary'],
+                }
+        return result
+
+    async def handle_job_status(self, request: web.Request) -> web.Response:
+        job = self.jobs.get(request.match_info['job_id'])
+        if job is None:
+            return web.json_response({'error': 'Unknown job'}, status=404)
+        return web.json_response(self._public(job), dumps=_dumps)
+
+    async def handle_list_jobs(self, request: web.Request) -> web.Response:
+        limit = int(request.query.get('limit', 50))
+        jobs = list(self.jobs.values())[-limit:]
+        return web.json_response([self._public(job) for job in reversed(jobs)], dumps=_dumps)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        statuses = {}
+        for job in self.jobs.values():
+            statuses[job['status']] = statuses.get(job['status'], 0) + 1
+        return web.json_response({
+            'status': 'ok',
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self.queue_size,
+            'jobs': statuses,
+        })
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    def _public(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in job.items() if k != 'file_path'}
+
+
+def _write_and_hash(f, digest, chunk: bytes):
+    f.write(chunk)
+    digest.update(chunk)
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def run_service(host: str = '127.0.0.1', port: int = 8080, **kwargs):
+    """
+    Run the ingestion service until interrupted.
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to listen on
+        **kwargs: Options passed to IngestionService
+    """
+    service = IngestionService(**kwargs)
+    web.run_app(service.create_app(), host=host, port=port)
@@ -1,16 +1,43 @@
+import contextlib
 import os
 import re
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import ContextManager, Dict, Any, Iterator, List, Optional, Tuple
 import logging
 from .ocr_processor import OCRProcessor
+from .table_extractor import TableExtractor, normalize_word_boxes
+from .field_extractor import PatternPackRegistry
+from .profiler import SlowInvoiceProfiler
+from .tracing import count, span
+from .template_store import (
+    HEADER_RATIO,
+    TemplateStore,
+    fingerprint_page,
+    pick_value_words,
+    region_box,
+)
 import pandas as pd
 
+# Fields that must be found before streamed processing may stop reading pages
+COMPLETE_FIELDS = ('invoice_number', 'date', 'vendor', 'total_amount')
+
 class InvoiceProcessor:
-    def __init__(self):
-        """Initialize the invoice processor with OCR capabilities."""
+    def __init__(self, template_store: Optional[TemplateStore] = None,
+                 profiler: Optional[SlowInvoiceProfiler] = None):
+        """
+        Initialize the invoice processor with OCR capabilities.
+        
+        Args:
+            template_store (TemplateStore, optional): Learned vendor layouts used
+                to extract known invoices by region lookup
+            profiler (SlowInvoiceProfiler, optional): Keeps profiles of slow invoices
+                (default: configured by INVOICE_PROFILE_THRESHOLD, off when unset)
+        """
         self.logger = logging.getLogger(__name__)
         self.ocr = OCRProcessor()
+        self.table_extractor = TableExtractor()
+        self.template_store = template_store
+        self.profiler = profiler if profiler is not None else SlowInvoiceProfiler.from_env()
         
         # Common Arabic-English patterns for invoice fields
         self.patterns = {
@@ -20,79 +47,236 @@ class InvoiceProcessor:
             'tax': r'(?:Tax|VAT|ضريبة القيمة المضافة)\s*[:#]?\s*([\d,]+(?:\.\d{2})?)',
             'vendor': r'(?:Vendor|Company|المورد|الشركة)\s*[:#]?\s*([^\n]+)',
         }
+        
+        # Compiled once per process, together with any per-vendor pattern packs
+        self.field_extractor = PatternPackRegistry.load(self.patterns)
 
-    def process_invoice(self, file_path: str) -> Dict[str, Any]:
+    def process_invoice(self, file_path: str, stop_when_complete: bool = False) -> Dict[str, Any]:
         """
         Process an invoice file and extract relevant information.
         
         Args:
             file_path (str): Path to the invoice file (PDF or image)
+            stop_when_complete (bool): Stop reading pages once header fields and totals are found
             
         Returns:
             Dict[str, Any]: Extracted invoice data
         """
         try:
-            # Extract text based on file type
-            if file_path.lower().endswith('.pdf'):
-                text_content = ' '.join(self.ocr.extract_text_from_pdf(file_path))
-            else:  # Assume image file
-                text_content = self.ocr.extract_text_from_image(file_path)
+            invoice_data = {}
+            with self.profile(file_path):
+                for event in self.iter_process_invoice(file_path, stop_when_complete):
+                    if event['type'] == 'result':
+                        invoice_data = event['invoice']
+            return invoice_data
 
-            # Extract structured data
-            structured_data = self.ocr.extract_structured_data(file_path)
+        except Exception as e:
+            self.logger.error(f"Error processing invoice {file_path}: {str(e)}")
+            return {}
 
-            # Combine extracted information
-            invoice_data = self._extract_invoice_fields(text_content)
-            invoice_data.update(self._process_structured_data(structured_data))
+    def profile(self, file_path: str) -> ContextManager:
+        """
+        Profile the enclosed processing of file_path when profiling is enabled.
 
-            # Extract table data if present
-            invoice_data['line_items'] = self._extract_table_data(text_content)
+        process_invoice profiles itself; callers driving iter_process_invoice wrap their loop in it.
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.profile(file_path)
 
-            return invoice_data
+    def iter_process_invoice(self, file_path: str, stop_when_complete: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Process an invoice page by page, yielding progress as it goes.
+        
+        Only the current page's word boxes are held in memory. After each
+        page a 'page' event reports the fields found so far; a final
+        'result' event carries the complete invoice data.
+        
+        Args:
+            file_path (str): Path to the invoice file (PDF or image)
+            stop_when_complete (bool): Stop reading pages once header fields and totals are found
+            
+        Yields:
+            Dict[str, Any]: 'page' events (page_number, page_count, fields, line_items, complete)
+            followed by one 'result' event (invoice, pages_processed, page_count, stopped_early)
+        """
+        # Known vendor layouts skip full-page OCR and the generic heuristics
+        if self.template_store is not None and len(self.template_store):
+            with span('extract.template'):
+                invoice_data, page_count = self._process_with_template(file_path)
+            count('template.hits' if invoice_data else 'template.misses')
+            if invoice_data:
+                # Templates read the first page only
+                yield {
+                    'type': 'result',
+                    'invoice': invoice_data,
+                    'pages_processed': 1,
+                    'page_count': page_count,
+                    'stopped_early': False,
+                }
+                return
+
+        invoice_data: Dict[str, Any] = {}
+        structured_data: Dict[str, str] = {}
+        line_items: List[Dict[str, Any]] = []
+        page_texts: List[str] = []
+        extractor = None
+        page_number = page_count = 0
+        stopped_early = False
+
+        pages = self.ocr.iter_file_pages(file_path)
+        try:
+            for page in pages:
+                page_number, page_count = page['page_number'], page['page_count']
+
+                with span('extract.fields'):
+                    # The vendor pattern pack is chosen from the first page
+                    first_page = extractor is None
+                    if first_page:
+                        extractor, vendor = self.field_extractor.select(page['text'])
+
+                    # The first match of each field wins, as in a full-text scan
+                    for field, value in extractor.extract(page['text']).items():
+                        invoice_data.setdefault(field, value)
+
+                    # As in PatternPackRegistry.extract, an extracted vendor wins over the pack's
+                    if first_page and vendor:
+                        invoice_data.setdefault('vendor', vendor)
+                with span('extract.structured'):
+                    structured_data.update(self.ocr.structured_data_from_words(page['words']))
+                with span('extract.table'):
+                    line_items.extend(self.table_extractor.extract(page['words']))
+                page_texts.append(page['text'])
+
+                complete = all(invoice_data.get(field) for field in COMPLETE_FIELDS)
+                yield {
+                    'type': 'page',
+                    'page_number': page_number,
+                    'page_count': page_count,
+                    'backend': page.get('backend'),
+                    'fields': dict(invoice_data),
+                    'line_items': len(line_items),
+                    'complete': complete,
+                }
 
+                if stop_when_complete and complete and page_number < page_count:
+                    stopped_early = True
+                    break
+        finally:
+            pages.close()
+
+        invoice_data.update(self._process_structured_data(structured_data))
+
+        # Fall back to the text heuristic when no table was found geometrically
+        if not line_items:
+            with span('extract.table_text'):
+                line_items = self._extract_table_data('\n'.join(page_texts))
+        invoice_data['line_items'] = line_items
+
+        yield {
+            'type': 'result',
+            'invoice': invoice_data,
+            'pages_processed': page_number,
+            'page_count': page_count,
+            'stopped_early': stopped_early,
+        }
+
+    def _region_words(self, page: Dict[str, Any], box) -> List[Dict[str, Any]]:
+        """Get the words inside a page region, running OCR on the region only if needed."""
+        x0, y0, x1, y1 = box
+        if page['words'] is None:
+            return normalize_word_boxes(self.ocr.ocr_region(page['image'], box)['words'])
+        return [
+            w for w in normalize_word_boxes(page['words'])
+            if x0 <= (w['x0'] + w['x1']) / 2 <= x1 and y0 <= (w['y0'] + w['y1']) / 2 <= y1
+        ]
+
+    def _process_with_template(self, file_path: str) -> Tuple[Dict[str, Any], int]:
+        """
+        Extract an invoice by direct region lookup in a learned vendor template.
+        
+        Args:
+            file_path (str): Path to the invoice file (PDF or image)
+            
+        Returns:
+            Tuple[Dict[str, Any], int]: Extracted invoice data, or an empty dict if no
+            template matches or the result does not validate, and the document's page count
+        """
+        page = self.ocr.load_page(file_path)
+        width, height = page['width'], page['height']
+
+        header_words = self._region_words(page, (0, 0, int(width), int(height * HEADER_RATIO)))
+        template = self.template_store.find(fingerprint_page(header_words, width, height))
+        if template is None:
+            return {}, page['page_count']
+
+        invoice_data = {}
+        if template.get('vendor'):
+            invoice_data['vendor'] = template['vendor']
+
+        for field, region in template['fields'].items():
+            words = self._region_words(page, region_box(region['box'], width, height))
+            if not words:
+                continue
+            words = pick_value_words(words, region['box'], region['tokens'], width, height)
+            value = ' '.join(w['text'] for w in words)
+            invoice_data[field] = self.field_extractor.default.normalize(field, value)
+
+        line_items = []
+        table = template.get('table')
+        if table:
+            top = int(table['header_y1'] * height)
+            total_box = template['fields'].get('total_amount', {}).get('box')
+            bottom = int(total_box[1] * height) if total_box and total_box[1] * height > top else int(height)
+            words = self._region_words(page, (0, top, int(width), bottom))
+            columns = [(x0 * width, x1 * width, role) for x0, x1, role in table['columns']]
+            line_items = self.table_extractor.extract_items(
+                self.table_extractor.cluster_rows(words), columns
+            )
+        invoice_data['line_items'] = line_items
+
+        errors = self.validate_invoice(invoice_data)
+        if errors:
+            self.logger.info(f"Template {template['fingerprint'][:8]} did not validate: {'; '.join(errors)}")
+            return {}, page['page_count']
+        return invoice_data, page['page_count']
+
+    def learn_template(self, file_path: str, invoice_data: Dict[str, Any]) -> bool:
+        """
+        Learn the vendor layout of a confirmed invoice.
+        
+        Args:
+            file_path (str): Path to the invoice file (PDF or image)
+            invoice_data (Dict[str, Any]): Confirmed invoice data
+            
+        Returns:
+            bool: True if a template was stored
+        """
+        if self.template_store is None:
+            return False
+        try:
+            page = self.ocr.load_page(file_path)
+            if page['words'] is None:
+                page['words'] = self.ocr.ocr_image(page['image'])['words']
+            return self.template_store.learn(invoice_data, page) is not None
         except Exception as e:
-            self.logger.error(f"Error processing invoice {file_path}: {str(e)}")
-            return {}
+            self.logger.error(f"Error learning template from {file_path}: {str(e)}")
+            return False
 
     def _extract_invoice_fields(self, text_content: str) -> Dict[str, Any]:
         """
         Extract key invoice fields using regex patterns.
         
+        All patterns are scanned in a single pass over the text; see
+        FieldExtractor.
+        
         Args:
             text_content (str): Extracted text from the invoice
             
         Returns:
             Dict[str, Any]: Extracted field values
         """
-        invoice_data = {}
-        
-        for field, pattern in self.patterns.items():
-            match = re.search(pattern, text_content, re.IGNORECASE | re.MULTILINE)
-            if match:
-                value = match.group(1).strip()
-                
-                # Process specific fields
-                if field == 'date':
-                    try:
-                        # Try different date formats
-                        for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%Y-%m-%d']:
-                            try:
-                                value = datetime.strptime(value, fmt).date()
-                                break
-                            except ValueError:
-                                continue
-                    except ValueError:
-                        self.logger.warning(f"Could not parse date: {value}")
-                
-                elif field in ['total_amount', 'tax']:
-                    try:
-                        value = float(value.replace(',', ''))
-                    except ValueError:
-                        self.logger.warning(f"Could not parse number: {value}")
-                
-                invoice_data[field] = value
-        
-        return invoice_data
+        return self.field_extractor.extract(text_content)
 
     def _process_structured_data(self, structured_data: Dict[str, str]) -> Dict[str, Any]:
         """
@@ -108,8 +292,8 @@ class InvoiceProcessor:
         
         # Process key-value pairs
         for key, value in structured_data.items():
-            # Skip automatically generated keys
-            if key.startswith('text_'):
+            # Skip automatically generated keys and labels without a value
+            if key.startswith('text_') or not value.strip():
                 continue
                 
             # Clean and normalize key
@@ -122,6 +306,8 @@ class InvoiceProcessor:
         """
         Extract table data from invoice text.
         
+        Used when TableExtractor finds no table in the pages' word boxes.
+        
         Args:
             text_content (str): Extracted text from the invoice
             
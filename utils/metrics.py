@@ -0,0 +1,306 @@
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .query_cache import query_cache
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+PREFIX = 'invoice_analyzer_'
+
+# Seconds; database operations and single pages sit at the low end, whole invoices at the high end
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+INVOICE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Database methods timed as writes (see the @traced decorators in database.py)
+DB_WRITES = (
+    'save_invoice', 'save_variance_analysis', 'supersede_variance_items',
+    'update_statistics', 'refresh_dashboard_snapshots',
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """Base of the metric types: a name, help text and one child per label combination."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, object] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """Read the value from function on every scrape, e.g. a count kept elsewhere."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def _current(self) -> List[Tuple[LabelValues, float]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception:
+                values.pop(key, None)
+        return sorted(values.items())
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}_total{_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._current()
+        ]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}" for key, value in self._current()]
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets, with their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, count: int = 1, **labels):
+        """
+        Record an observation.
+
+        Args:
+            value (float): Observed value
+            count (int): Times it was observed, e.g. pages that took value seconds each on average
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[index] += count
+            self._values[key] = (counts, total + value * count)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics published together, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = Registry()
+
+INVOICES_PROCESSED = registry.counter(
+    'invoices_processed', "Invoices extracted, by source (upload, service) and status (saved, duplicate, empty)",
+    ('source', 'status')
+)
+INVOICES_FAILED = registry.counter('invoices_failed', "Invoices whose processing raised an error", ('source',))
+INVOICE_SECONDS = registry.histogram(
+    'invoice_processing_seconds', "Time from extraction to saved variance analysis per invoice",
+    ('source',), INVOICE_BUCKETS
+)
+PAGES = registry.counter('pages', "Pages read, by method (ocr, text_layer)", ('method',))
+PAGE_SECONDS = registry.histogram(
+    'page_seconds', "Seconds per page (rasterizing and recognition for OCR'd pages)", ('method',)
+)
+LINE_ITEMS = registry.counter(
+    'line_items', "Line items compared with the pricing sheet, by result (matched, unmatched)", ('result',)
+)
+TEMPLATE_LOOKUPS = registry.counter('template_lookups', "Vendor template lookups, by result (hit, miss)", ('result',))
+DB_WRITE_SECONDS = registry.histogram('db_write_seconds', "Database write latency", ('operation',))
+QUEUE_DEPTH = registry.gauge('ingestion_queue_depth', "Jobs waiting for an OCR worker")
+QUEUE_CAPACITY = registry.gauge('ingestion_queue_capacity', "Jobs the ingestion queue holds before shedding uploads")
+
+QUERY_CACHE_LOOKUPS = registry.counter('query_cache_lookups', "Cached query lookups, by result (hit, miss)", ('result',))
+QUERY_CACHE_LOOKUPS.set_function(lambda: query_cache.get_stats()['hits'], result='hit')
+QUERY_CACHE_LOOKUPS.set_function(lambda: query_cache.get_stats()['misses'], result='miss')
+QUERY_CACHE_HIT_RATIO = registry.gauge('query_cache_hit_ratio', "Share of cached query lookups answered from the cache")
+QUERY_CACHE_HIT_RATIO.set_function(lambda: query_cache.get_stats()['hit_rate'])
+QUERY_CACHE_ENTRIES = registry.gauge('query_cache_entries', "Results held by the query cache")
+QUERY_CACHE_ENTRIES.set_function(lambda: query_cache.get_stats()['entries'])
+
+
+def record_trace(trace):
+    """
+    Feed the metrics from a finished invoice trace (utils/tracing.py).
+
+    Traces carry the stages and counters of worker processes merged in, so
+    this process publishes them even though the OCR ran elsewhere. Stages
+    called several times in one trace are observed at their mean, once per call.
+    """
+    stages, counters = trace.stages, trace.counters
+    source = trace.attributes.get('source', 'unknown')
+    INVOICES_PROCESSED.inc(source=source, status=trace.attributes.get('status', 'saved'))
+    INVOICE_SECONDS.observe(trace.duration, source=source)
+
+    page_stages = {
+        'ocr': ('ocr.read_image', 'ocr.rasterize', 'ocr.recognize'),
+        'text_layer': ('ocr.text_layer',),
+    }
+    for method, names in page_stages.items():
+        pages = counters.get(f'pages.{method}', 0)
+        if pages:
+            PAGES.inc(pages, method=method)
+            seconds = sum(stages[name][1] for name in names if name in stages)
+            PAGE_SECONDS.observe(seconds / pages, pages, method=method)
+
+    for result in ('matched', 'unmatched'):
+        if counters.get(f'items.{result}'):
+            LINE_ITEMS.inc(counters[f'items.{result}'], result=result)
+    for result, counter in (('hit', 'template.hits'), ('miss', 'template.misses')):
+        if counters.get(counter):
+            TEMPLATE_LOOKUPS.inc(counters[counter], result=result)
+
+    for operation in DB_WRITES:
+        calls, seconds = stages.get(f'db.{operation}', (0, 0.0))
+        if calls:
+            DB_WRITE_SECONDS.observe(seconds / calls, calls, operation=operation)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_servers: Dict[Tuple[str, int], ThreadingHTTPServer] = {}
+_servers_lock = threading.Lock()
+
+
+def start_http_server(port: int, host: str = '127.0.0.1') -> Optional[ThreadingHTTPServer]:
+    """
+    Serve GET /metrics from a daemon thread; calling it again for the same address is a no-op.
+
+    Args:
+        port (int): Port to listen on
+        host (str): Interface to bind (local only by default)
+
+    Returns:
+        ThreadingHTTPServer: The server, or None if the port could not be bound
+    """
+    with _servers_lock:
+        if (host, port) in _servers:
+            return _servers[(host, port)]
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError:
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        _servers[(host, port)] = server
+        return server
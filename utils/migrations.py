@@ -0,0 +1,367 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Databases whose backfills are running in this process
+_running_backfills = set()
+_running_lock = threading.Lock()
+
+
+def _table_columns(cursor, table: str) -> set:
+    return {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+
+
+class AddColumn:
+    """Add a column; skipped when it exists or the table has not been created yet."""
+
+    def __init__(self, table: str, column: str, definition: str):
+        self.table = table
+        self.column = column
+        self.definition = definition
+
+    def apply(self, cursor):
+        columns = _table_columns(cursor, self.table)
+        if columns and self.column not in columns:
+            cursor.execute(f'ALTER TABLE {self.table} ADD COLUMN {self.column} {self.definition}')
+
+
+class CreateIndex:
+    """Create an index; skipped when the table has not been created yet."""
+
+    def __init__(self, name: str, table: str, columns: Sequence[str], unique: bool = False):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+
+    def apply(self, cursor):
+        if _table_columns(cursor, self.table):
+            cursor.execute(
+                f"CREATE {'UNIQUE ' if self.unique else ''}INDEX IF NOT EXISTS {self.name} "
+                f"ON {self.table} ({', '.join(self.columns)})"
+            )
+
+
+class RunSQL:
+    """Run statements as they are, e.g. FTS virtual tables or rollup tables."""
+
+    def __init__(self, *statements: str):
+        self.statements = statements
+
+    def apply(self, cursor):
+        for statement in self.statements:
+            cursor.execute(statement)
+
+
+class RunPython:
+    """Run a function with the migration cursor."""
+
+    def __init__(self, func: Callable):
+        self.func = func
+
+    def apply(self, cursor):
+        self.func(cursor)
+
+
+class Backfill:
+    """
+    Batched update of existing rows, run after its migration has committed.
+
+    Rows are selected in id order, a batch per short transaction, so readers
+    and writers are only blocked for one batch at a time. Progress is stored
+    in migration_backfills, so an interrupted backfill resumes where it
+    stopped. The condition must exclude rows that are already filled.
+    """
+
+    def __init__(self, name: str, table: str, condition: str,
+                 assignments: Optional[str] = None,
+                 columns: Sequence[str] = (),
+                 compute: Optional[Callable[[tuple], Dict[str, Any]]] = None,
+                 batch_size: int = 1000):
+        """
+        Args:
+            name (str): Backfill name, unique within its migration
+            table (str): Table to update
+            condition (str): SQL condition selecting rows that still need the backfill
+            assignments (str, optional): SQL SET clause, for backfills expressible in SQL
+            columns (Sequence[str]): Columns passed to compute
+            compute (Callable, optional): Maps a row of columns to {column: value}
+            batch_size (int): Rows per transaction
+        """
+        self.name = name
+        self.table = table
+        self.condition = condition
+        self.assignments = assignments
+        self.columns = list(columns)
+        self.compute = compute
+        self.batch_size = batch_size
+
+    def run_batch(self, cursor, last_id: int) -> Optional[int]:
+        """Update one batch; returns the last id processed, or None when done."""
+        selected = ', '.join(['id'] + self.columns)
+        rows = cursor.execute(f'''
+            SELECT {selected} FROM {self.table}
+            WHERE id > ? AND ({self.condition})
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, self.batch_size)).fetchall()
+        if not rows:
+            return None
+
+        if self.compute is None:
+            cursor.execute(
+                f"UPDATE {self.table} SET {self.assignments} WHERE id IN ({', '.join('?' * len(rows))})",
+                [row[0] for row in rows]
+            )
+        else:
+            for row in rows:
+                values = self.compute(row[1:])
+                cursor.execute(
+                    f"UPDATE {self.table} SET {', '.join(f'{c} = ?' for c in values)} WHERE id = ?",
+                    (*values.values(), row[0])
+                )
+        return rows[-1][0]
+
+
+class Migration:
+    """An ordered schema change recorded in db_version."""
+
+    def __init__(self, version: int, description: str, operations: Sequence[Any],
+                 backfills: Sequence[Backfill] = ()):
+        self.version = version
+        self.description = description
+        self.operations = operations
+        self.backfills = backfills
+
+
+class MigrationRunner:
+    """
+    Bring a database to the latest schema version.
+
+    New databases get the full schema and are stamped with the latest
+    version. Existing databases get each pending migration in its own
+    transaction (schema changes and the db_version row commit together),
+    after which the idempotent schema creates tables and indexes that the
+    database does not have yet. Databases already at the latest version are
+    left alone without taking the write lock, so tables added to the schema
+    script need a migration for existing databases to get them. Backfills
+    run afterwards in batches.
+    """
+
+    def __init__(self, db_path: str, migrations: List[Migration], schema_path: str,
+                 backfill_pause: float = 0.05):
+        """
+        Args:
+            db_path (str): SQLite database path
+            migrations (List[Migration]): Migrations in any order
+            schema_path (str): Idempotent schema script with the latest tables and indexes
+            backfill_pause (float): Seconds to yield between backfill batches
+        """
+        self.db_path = db_path
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        self.schema_path = schema_path
+        self.backfill_pause = backfill_pause
+        self.latest_version = self.migrations[-1].version if self.migrations else 1
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; transactions are explicit
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS db_version (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                version INTEGER NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                description TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS migration_backfills (
+                version INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                last_id INTEGER DEFAULT 0,
+                completed_at TIMESTAMP,
+                PRIMARY KEY (version, name)
+            )
+        ''')
+        return conn
+
+    @staticmethod
+    def _current_version(cursor) -> int:
+        return cursor.execute('SELECT MAX(version) FROM db_version').fetchone()[0] or 0
+
+    def migrate(self) -> List[int]:
+        """
+        Apply pending migrations.
+
+        Returns:
+            List[int]: Versions applied by this call
+        """
+        conn = self._connect()
+        applied = []
+        try:
+            cursor = conn.cursor()
+            fresh = cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'invoices'"
+            ).fetchone()[0] == 0
+
+            if fresh:
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    # Another process may have created the schema meanwhile
+                    if self._current_version(cursor) == 0:
+                        with open(self.schema_path, 'r') as schema_file:
+                            for statement in _split_statements(schema_file.read()):
+                                cursor.execute(statement)
+                        cursor.execute(
+                            'INSERT INTO db_version (version, description) VALUES (?, ?)',
+                            (self.latest_version, 'Initial schema')
+                        )
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    raise
+                return applied
+
+            # Up to date: nothing to lock, so opening a database never waits for writers
+            if self._current_version(cursor) >= self.latest_version:
+                return applied
+
+            for migration in self.migrations:
+                # Lock first, then re-check, so concurrent starts apply each migration once
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    if self._current_version(cursor) >= migration.version:
+                        cursor.execute('COMMIT')
+                        continue
+                    for operation in migration.operations:
+                        operation.apply(cursor)
+                    cursor.execute(
+                        'INSERT INTO db_version (version, description) VALUES (?, ?)',
+                        (migration.version, migration.description)
+                    )
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    logger.error(f"Migration {migration.version} ({migration.description}) failed")
+                    raise
+                applied.append(migration.version)
+                logger.info(f"Applied migration {migration.version}: {migration.description}")
+
+            # New tables and indexes; another process applied them if it applied the migrations
+            if not applied:
+                return applied
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                with open(self.schema_path, 'r') as schema_file:
+                    for statement in _split_statements(schema_file.read()):
+                        cursor.execute(statement)
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            return applied
+        finally:
+            conn.close()
+
+    def pending_backfills(self) -> List[tuple]:
+        """Backfills of applied migrations that have not completed."""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            current = self._current_version(cursor)
+            done = {
+                (row[0], row[1]) for row in cursor.execute(
+                    'SELECT version, name FROM migration_backfills WHERE completed_at IS NOT NULL'
+                )
+            }
+            return [
+                (migration, backfill)
+                for migration in self.migrations if migration.version <= current
+                for backfill in migration.backfills
+                if (migration.version, backfill.name) not in done
+            ]
+        finally:
+            conn.close()
+
+    def run_backfills(self):
+        """Run pending backfills to completion, one batch per transaction."""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            for migration, backfill in self.pending_backfills():
+                cursor.execute(
+                    'INSERT OR IGNORE INTO migration_backfills (version, name) VALUES (?, ?)',
+                    (migration.version, backfill.name)
+                )
+                last_id = cursor.execute(
+                    'SELECT last_id FROM migration_backfills WHERE version = ? AND name = ?',
+                    (migration.version, backfill.name)
+                ).fetchone()[0]
+
+                batches = 0
+                while True:
+                    cursor.execute('BEGIN IMMEDIATE')
+                    try:
+                        next_id = backfill.run_batch(cursor, last_id)
+                        if next_id is None:
+                            cursor.execute('''
+                                UPDATE migration_backfills SET completed_at = CURRENT_TIMESTAMP
+                                WHERE version = ? AND name = ?
+                            ''', (migration.version, backfill.name))
+                        else:
+                            cursor.execute('''
+                                UPDATE migration_backfills SET last_id = ?
+                                WHERE version = ? AND name = ?
+                            ''', (next_id, migration.version, backfill.name))
+                        cursor.execute('COMMIT')
+                    except Exception:
+                        cursor.execute('ROLLBACK')
+                        raise
+                    if next_id is None:
+                        break
+                    last_id = next_id
+                    batches += 1
+                    time.sleep(self.backfill_pause)
+
+                logger.info(f"Backfill {migration.version}/{backfill.name} completed ({batches} batches)")
+        finally:
+            conn.close()
+
+    def start_backfills(self) -> Optional[threading.Thread]:
+        """Run pending backfills in a background thread, once per database and process."""
+        if not self.pending_backfills():
+            return None
+        with _running_lock:
+            if self.db_path in _running_backfills:
+                return None
+            _running_backfills.add(self.db_path)
+
+        def run():
+            try:
+                self.run_backfills()
+            except Exception as e:
+                logger.error(f"Backfill failed for {self.db_path}: {str(e)}")
+            finally:
+                with _running_lock:
+                    _running_backfills.discard(self.db_path)
+
+        thread = threading.Thread(target=run, name='migration-backfill', daemon=True)
+        thread.start()
+        return thread
+
+
+def _split_statements(script: str) -> List[str]:
+    """Split a schema script into complete statements."""
+    statements, current = [], ''
+    for line in script.splitlines(keepends=True):
+        if not current and (not line.strip() or line.lstrip().startswith('--')):
+            continue
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ''
+    return statements
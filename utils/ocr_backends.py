@@ -0,0 +1,483 @@
+import importlib.util
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .tracing import span
+
+# Default mean word confidence (0-100) a page must reach to skip fallbacks
+DEFAULT_CONFIDENCE_TARGET = 70.0
+
+# Tesseract traineddata names for the language codes used across the app
+TESSERACT_LANGUAGES = {
+    'ar': 'ara',
+    'en': 'eng',
+}
+
+
+def contains_arabic(text: str) -> bool:
+    """Check whether the text contains any Arabic characters."""
+    return any('\u0600' <= c <= '\u06FF' for c in text)
+
+
+def preprocess_image(image: np.ndarray) -> np.ndarray:
+    """Binarize and denoise an image to improve Tesseract accuracy."""
+    import cv2
+
+    # Convert to grayscale
+    if len(image.shape) == 3:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = image
+
+    # Apply adaptive thresholding
+    thresh = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY, 11, 2
+    )
+
+    # Denoise
+    return cv2.fastNlMeansDenoising(thresh)
+
+
+def group_lines(words: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Group word boxes into text lines.
+
+    Words carrying a 'line' key (as produced by Tesseract) are grouped by it,
+    otherwise words whose vertical centres fall within half a word height of
+    each other are considered to be on the same line.
+
+    Args:
+        words (List[Dict[str, Any]]): Word boxes with x0, y0, x1, y1 keys
+
+    Returns:
+        List[List[Dict[str, Any]]]: Lines from top to bottom, each in reading order
+    """
+    if not words:
+        return []
+
+    lines: List[List[Dict[str, Any]]] = []
+    if all('line' in word for word in words):
+        by_line: Dict[Any, List[Dict[str, Any]]] = {}
+        for word in words:
+            by_line.setdefault(word['line'], []).append(word)
+        lines = list(by_line.values())
+        lines.sort(key=lambda line: min(w['y0'] for w in line))
+    else:
+        current: List[Dict[str, Any]] = []
+        current_center = None
+        current_height = 0.0
+        for word in sorted(words, key=lambda w: (w['y0'] + w['y1']) / 2):
+            center = (word['y0'] + word['y1']) / 2
+            height = max(word['y1'] - word['y0'], 1)
+            if current and abs(center - current_center) <= max(height, current_height) / 2:
+                current.append(word)
+            else:
+                if current:
+                    lines.append(current)
+                current = [word]
+                current_center = center
+                current_height = height
+        if current:
+            lines.append(current)
+
+    ordered = []
+    for line in lines:
+        line = sorted(line, key=lambda w: w['x0'])
+        # Arabic lines read right to left
+        if contains_arabic(' '.join(w['text'] for w in line)):
+            line.reverse()
+        ordered.append(line)
+    return ordered
+
+
+def build_page_result(words: List[Dict[str, Any]], backend: str, elapsed: float) -> Dict[str, Any]:
+    """
+    Build the page result dictionary shared by all OCR backends.
+
+    Args:
+        words (List[Dict[str, Any]]): Recognized word boxes
+        backend (str): Name of the backend that produced the words
+        elapsed (float): Recognition time in seconds
+
+    Returns:
+        Dict[str, Any]: Page text, word boxes, mean confidence and timing
+    """
+    lines = group_lines(words)
+    confidences = [w['conf'] for w in words if w.get('conf') is not None]
+    return {
+        'text': '\n'.join(' '.join(w['text'] for w in line) for line in lines),
+        'words': words,
+        'confidence': float(np.mean(confidences)) if confidences else 0.0,
+        'backend': backend,
+        'elapsed': elapsed,
+    }
+
+
+class OCRBackend(ABC):
+    """Base class for OCR engines producing word boxes with confidences."""
+
+    name = 'base'
+
+    def __init__(self, languages: Sequence[str] = ('ar', 'en')):
+        self.languages = list(languages)
+        self.logger = logging.getLogger(__name__)
+        self._stats_lock = threading.Lock()
+        self._stats = {'pages': 0, 'megapixels': 0.0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'errors': 0}
+
+    @abstractmethod
+    def is_available(self) -> bool:
+        """Check whether the engine can be loaded in this environment."""
+
+    @abstractmethod
+    def _recognize(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Run the engine on a prepared image.
+
+        Returns:
+            List[Dict[str, Any]]: Word boxes with text, conf (0-100), x0, y0, x1, y1
+        """
+
+    def prepare(self, image: np.ndarray) -> np.ndarray:
+        """Prepare a BGR or grayscale image for this engine."""
+        return image
+
+    def warm_up(self):
+        """Load the engine now instead of on the first page."""
+
+    def recognize(self, image: np.ndarray) -> Dict[str, Any]:
+        """
+        Recognize text in an image and record latency statistics.
+
+        Args:
+            image (np.ndarray): BGR or grayscale image
+
+        Returns:
+            Dict[str, Any]: Page result (see build_page_result)
+        """
+        start = time.perf_counter()
+        try:
+            with span('ocr.preprocess'):
+                prepared = self.prepare(image)
+            with span(f"ocr.engine.{self.name}"):
+                words = self._recognize(prepared)
+        except Exception:
+            with self._stats_lock:
+                self._stats['errors'] += 1
+            raise
+        elapsed = time.perf_counter() - start
+        self._record(elapsed, image)
+        return build_page_result(words, self.name, elapsed)
+
+    def _record(self, elapsed: float, image: np.ndarray):
+        with self._stats_lock:
+            self._stats['pages'] += 1
+            self._stats['megapixels'] += image.shape[0] * image.shape[1] / 1e6
+            self._stats['total_seconds'] += elapsed
+            self._stats['max_seconds'] = max(self._stats['max_seconds'], elapsed)
+
+    def seconds_per_megapixel(self) -> Optional[float]:
+        """
+        Mean recognition cost in seconds per megapixel, or None before the first call.
+
+        Normalized by image area so that region crops and full pages can be
+        compared when ranking backends by speed.
+        """
+        with self._stats_lock:
+            if not self._stats['megapixels']:
+                return None
+            return self._stats['total_seconds'] / self._stats['megapixels']
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get latency statistics for this backend."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['mean_seconds'] = stats['total_seconds'] / stats['pages'] if stats['pages'] else 0.0
+        return stats
+
+
+class TesseractBackend(OCRBackend):
+    """Tesseract engine through the in-process tesserocr API."""
+
+    name = 'tesseract'
+
+    def __init__(self, languages: Sequence[str] = ('ar', 'en')):
+        super().__init__(languages)
+        self._api = None
+        # PyTessBaseAPI instances are not thread safe
+        self._api_lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return importlib.util.find_spec('tesserocr') is not None
+
+    def warm_up(self):
+        with self._api_lock:
+            self._get_api()
+
+    def prepare(self, image: np.ndarray) -> np.ndarray:
+        return preprocess_image(image)
+
+    def _get_api(self):
+        if self._api is None:
+            from tesserocr import PyTessBaseAPI, PSM, OEM
+            lang = '+'.join(TESSERACT_LANGUAGES.get(l, l) for l in self.languages)
+            # Automatic page segmentation with OSD, default engine mode
+            self._api = PyTessBaseAPI(lang=lang, psm=PSM.AUTO_OSD, oem=OEM.DEFAULT)
+        return self._api
+
+    def _recognize(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        import cv2
+        from PIL import Image
+        from tesserocr import RIL, iterate_level
+
+        if len(image.shape) == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        words = []
+        with self._api_lock:
+            api = self._get_api()
+            api.SetImage(Image.fromarray(image))
+            api.Recognize()
+            iterator = api.GetIterator()
+            if iterator is None:
+                return words
+
+            line = -1
+            for result in iterate_level(iterator, RIL.WORD):
+                if result.IsAtBeginningOf(RIL.TEXTLINE):
+                    line += 1
+                text = result.GetUTF8Text(RIL.WORD)
+                if not text or not text.strip():
+                    continue
+                box = result.BoundingBox(RIL.WORD)
+                if box is None:
+                    continue
+                x0, y0, x1, y1 = box
+                words.append({
+                    'text': text.strip(),
+                    'conf': float(result.Confidence(RIL.WORD)),
+                    'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1,
+                    'line': max(line, 0),
+                })
+        return words
+
+
+class EasyOCRBackend(OCRBackend):
+    """EasyOCR engine; slower but more robust on Arabic script."""
+
+    name = 'easyocr'
+
+    def __init__(self, languages: Sequence[str] = ('ar', 'en')):
+        super().__init__(languages)
+        self._reader = None
+        self._reader_lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        # Importing easyocr loads torch; only check that it is installed
+        return importlib.util.find_spec('easyocr') is not None
+
+    def warm_up(self):
+        self._get_reader()
+
+    def _get_reader(self):
+        with self._reader_lock:
+            if self._reader is None:
+                import easyocr
+                self._reader = easyocr.Reader(self.languages)
+        return self._reader
+
+    def _recognize(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        words = []
+        for bbox, text, conf in self._get_reader().readtext(image):
+            if not text.strip():
+                continue
+            xs = [point[0] for point in bbox]
+            ys = [point[1] for point in bbox]
+            words.append({
+                'text': text.strip(),
+                'conf': float(conf) * 100,
+                'x0': int(min(xs)), 'y0': int(min(ys)),
+                'x1': int(max(xs)), 'y1': int(max(ys)),
+            })
+        return words
+
+
+class AutoOCRBackend(OCRBackend):
+    """
+    Route each page to the fastest engine that meets a confidence target.
+
+    Backends are tried in order of observed mean latency (declaration order
+    until each has been measured). When a page misses the target, the next
+    backend re-reads only the low-confidence lines (Arabic lines by default)
+    and keeps whichever reading is more confident. If most of the page is
+    low-confidence the next backend reads the whole page instead.
+    """
+
+    name = 'auto'
+
+    def __init__(self,
+                 backends: Sequence[OCRBackend],
+                 confidence_target: float = DEFAULT_CONFIDENCE_TARGET,
+                 arabic_only_fallback: bool = True,
+                 full_page_ratio: float = 0.5,
+                 region_padding: int = 4):
+        super().__init__(backends[0].languages if backends else ('ar', 'en'))
+        self.backends = [b for b in backends if b.is_available()]
+        if not self.backends:
+            raise RuntimeError("No OCR backend is available (install tesserocr or easyocr)")
+        self.confidence_target = confidence_target
+        self.arabic_only_fallback = arabic_only_fallback
+        self.full_page_ratio = full_page_ratio
+        self.region_padding = region_padding
+        self._stats.update({'first_pass_accepted': 0, 'region_fallbacks': 0, 'full_page_fallbacks': 0})
+
+    def is_available(self) -> bool:
+        return bool(self.backends)
+
+    def warm_up(self):
+        for backend in self.backends:
+            backend.warm_up()
+
+    def _recognize(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        return self.recognize(image)['words']
+
+    def _ordered_backends(self) -> List[OCRBackend]:
+        def latency_key(item):
+            index, backend = item
+            latency = backend.seconds_per_megapixel()
+            # Unmeasured backends keep their declared position
+            return (latency is None, latency or 0.0, index)
+        return [b for _, b in sorted(enumerate(self.backends), key=latency_key)]
+
+    def recognize(self, image: np.ndarray) -> Dict[str, Any]:
+        start = time.perf_counter()
+        result = None
+        route = []
+        for backend in self._ordered_backends():
+            try:
+                if result is None:
+                    result = backend.recognize(image)
+                else:
+                    result = self._refine(result, backend, image)
+                route.append(backend.name)
+            except Exception as e:
+                self.logger.warning(f"OCR backend {backend.name} failed: {str(e)}")
+                continue
+            if result['confidence'] >= self.confidence_target:
+                break
+
+        if result is None:
+            with self._stats_lock:
+                self._stats['errors'] += 1
+            raise RuntimeError("All OCR backends failed")
+
+        elapsed = time.perf_counter() - start
+        self._record(elapsed, image)
+        if len(route) == 1:
+            with self._stats_lock:
+                self._stats['first_pass_accepted'] += 1
+
+        result = build_page_result(result['words'], '+'.join(route), elapsed)
+        result['route'] = route
+        return result
+
+    def _refine(self, result: Dict[str, Any], backend: OCRBackend, image: np.ndarray) -> Dict[str, Any]:
+        """Re-read the low-confidence parts of a page with another backend."""
+        lines = group_lines(result['words'])
+        low_lines = [
+            line for line in lines
+            if np.mean([w['conf'] for w in line]) < self.confidence_target
+        ]
+        low_words = sum(len(line) for line in low_lines)
+
+        if not result['words'] or low_words > self.full_page_ratio * len(result['words']):
+            with self._stats_lock:
+                self._stats['full_page_fallbacks'] += 1
+            candidate = backend.recognize(image)
+            return candidate if candidate['confidence'] > result['confidence'] else result
+
+        if self.arabic_only_fallback:
+            low_lines = [
+                line for line in low_lines
+                if contains_arabic(' '.join(w['text'] for w in line))
+            ]
+        if not low_lines:
+            return result
+
+        with self._stats_lock:
+            self._stats['region_fallbacks'] += 1
+
+        height, width = image.shape[:2]
+        replaced = set()
+        new_words = []
+        for line in low_lines:
+            x0 = max(min(w['x0'] for w in line) - self.region_padding, 0)
+            y0 = max(min(w['y0'] for w in line) - self.region_padding, 0)
+            x1 = min(max(w['x1'] for w in line) + self.region_padding, width)
+            y1 = min(max(w['y1'] for w in line) + self.region_padding, height)
+            if x1 <= x0 or y1 <= y0:
+                continue
+
+            region = backend.recognize(image[y0:y1, x0:x1])
+            if region['confidence'] <= np.mean([w['conf'] for w in line]):
+                continue
+
+            replaced.update(id(w) for w in line)
+            line_key = ('refined', len(new_words), line[0].get('line'))
+            for word in region['words']:
+                new_words.append({
+                    **word,
+                    'x0': word['x0'] + x0, 'y0': word['y0'] + y0,
+                    'x1': word['x1'] + x0, 'y1': word['y1'] + y0,
+                    'line': line_key,
+                })
+
+        if not replaced:
+            return result
+
+        words = [w for w in result['words'] if id(w) not in replaced] + new_words
+        if any('line' not in w for w in words):
+            words = [{k: v for k, v in w.items() if k != 'line'} for w in words]
+        return build_page_result(words, result['backend'], result['elapsed'])
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats['backends'] = {b.name: b.get_stats() for b in self.backends}
+        stats['confidence_target'] = self.confidence_target
+        return stats
+
+
+BACKENDS = {
+    TesseractBackend.name: TesseractBackend,
+    EasyOCRBackend.name: EasyOCRBackend,
+}
+
+
+def create_backend(name: str = 'auto',
+                   languages: Sequence[str] = ('ar', 'en'),
+                   confidence_target: float = DEFAULT_CONFIDENCE_TARGET) -> OCRBackend:
+    """
+    Create an OCR backend by name.
+
+    Args:
+        name (str): 'tesseract', 'easyocr' or 'auto' for confidence-based routing
+        languages (Sequence[str]): Language codes to recognize
+        confidence_target (float): Mean word confidence required by 'auto'
+
+    Returns:
+        OCRBackend: The requested backend
+    """
+    if name == 'auto':
+        # Fast Tesseract first, EasyOCR as the fallback for weak regions
+        return AutoOCRBackend(
+            [TesseractBackend(languages), EasyOCRBackend(languages)],
+            confidence_target=confidence_target
+        )
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    return BACKENDS[name](languages)
@@ -1,51 +1,280 @@
+import contextlib
+import logging
 import os
-from typing import List, Dict, Any
-import pdfplumber
-from PIL import Image
-import io
-import easyocr
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple
 import numpy as np
-import cv2
+from .ocr_backends import (
+    DEFAULT_CONFIDENCE_TARGET,
+    OCRBackend,
+    build_page_result,
+    create_backend,
+    preprocess_image,
+)
+from .rasterizer import MAX_PAGE_PIXELS, RENDER_DPI, PageRasterizer
+from .tracing import count, span
+
+# Minimum number of words for a PDF text layer to be used instead of OCR
+MIN_TEXT_LAYER_WORDS = 10
 
 class OCRProcessor:
-    def __init__(self):
-        """Initialize the OCR processor with support for Arabic and English."""
-        # Initialize EasyOCR reader with Arabic and English support
-        self.reader = easyocr.Reader(['ar', 'en'])
-        
-    def process_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file using EasyOCR."""
-        text_content = []
-        
+    def __init__(self,
+                 languages: Optional[Sequence[str]] = None,
+                 backend: str = 'auto',
+                 confidence_target: float = DEFAULT_CONFIDENCE_TARGET,
+                 use_text_layer: bool = True,
+                 render_dpi: Optional[float] = None,
+                 max_page_pixels: Optional[int] = None):
+        """
+        Initialize the OCR processor with support for Arabic and English.
+
+        Args:
+            languages (Sequence[str], optional): Language codes (default: Arabic and English)
+            backend (str): OCR backend name ('auto', 'tesseract' or 'easyocr')
+            confidence_target (float): Mean word confidence the 'auto' backend aims for
+            use_text_layer (bool): Read born-digital PDF pages from their text layer
+            render_dpi (float, optional): Resolution scanned PDF pages are rendered at
+                (default: OCR_RENDER_DPI or 200)
+            max_page_pixels (int, optional): Pixel budget per rendered page; larger pages get a
+                lower resolution (default: OCR_MAX_PAGE_PIXELS or 24 million)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.languages = list(languages or ['ar', 'en'])
+        self.backend_name = backend
+        self.confidence_target = confidence_target
+        self.use_text_layer = use_text_layer
+        self.render_dpi = render_dpi or float(os.getenv('OCR_RENDER_DPI', RENDER_DPI))
+        self.max_page_pixels = max_page_pixels or int(os.getenv('OCR_MAX_PAGE_PIXELS', MAX_PAGE_PIXELS))
+        # Engines load on first use or in warm_up(), so creating a processor is cheap
+        self._backend: Optional[OCRBackend] = None
+        self._backend_lock = threading.Lock()
+
+    @property
+    def backend(self) -> OCRBackend:
+        """The OCR backend, created on first use."""
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = create_backend(self.backend_name, self.languages, self.confidence_target)
+        return self._backend
+
+    def warm_up(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Load the PDF and image libraries and the OCR engines before the first invoice needs them.
+
+        Args:
+            background (bool): Load in a daemon thread and return it
+
+        Returns:
+            threading.Thread: The warm-up thread when loading in the background
+        """
+        if not background:
+            self._warm_up()
+            return None
+        thread = threading.Thread(target=self._warm_up, name='ocr-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up(self):
+        try:
+            import cv2  # noqa: F401
+            import pdfplumber  # noqa: F401
+            self.backend.warm_up()
+        except Exception as e:
+            self.logger.warning(f"OCR warm-up failed: {str(e)}")
+
+    def rasterizer(self, pdf_path: str) -> PageRasterizer:
+        """Page rasterizer for a PDF with this processor's resolution and pixel budget."""
+        return PageRasterizer(pdf_path, self.render_dpi, self.max_page_pixels)
+
+    def _read_image(self, image_path: str) -> np.ndarray:
+        import cv2
+
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not read image at path: {image_path}")
+        return image
+
+    def _text_layer_page(self, page) -> Optional[Dict[str, Any]]:
+        """Build a page result from the PDF text layer, if it has one."""
+        words = page.extract_words()
+        if len(words) < MIN_TEXT_LAYER_WORDS:
+            return None
+
+        words = [
+            {
+                'text': w['text'], 'conf': 100.0,
+                'x0': w['x0'], 'y0': w['top'], 'x1': w['x1'], 'y1': w['bottom'],
+            }
+            for w in words
+        ]
+        result = build_page_result(words, 'text_layer', 0.0)
+        result['width'], result['height'] = float(page.width), float(page.height)
+        return result
+
+    def ocr_image(self, image: np.ndarray) -> Dict[str, Any]:
+        """
+        Run OCR on an image through the configured backend.
+
+        Args:
+            image (np.ndarray): BGR or grayscale image
+
+        Returns:
+            Dict[str, Any]: Page text, word boxes, mean confidence, backend used and page size
+        """
+        result = self.backend.recognize(image)
+        result['height'], result['width'] = image.shape[:2]
+        return result
+
+    def iter_file_pages(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Run OCR on a PDF or image file one page at a time.
+
+        Each page is rendered, recognized and released before the next one,
+        so memory use does not grow with the page count. Pages with a usable
+        text layer are read directly unless use_text_layer is disabled.
+
+        Args:
+            file_path (str): Path to the PDF or image file
+
+        Yields:
+            Dict[str, Any]: OCR result per page, with 1-based 'page_number' and 'page_count'
+        """
+        if not file_path.lower().endswith('.pdf'):
+            with span('ocr.read_image'):
+                image = self._read_image(file_path)
+            with span('ocr.recognize'):
+                result = self.ocr_image(image)
+            count('pages')
+            count('pages.ocr')
+            result['page_number'], result['page_count'] = 1, 1
+            yield result
+            return
+
+        with span('ocr.open'):
+            import pdfplumber
+            pdf = pdfplumber.open(file_path)
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(pdf)
+            # Opened when the first page without a text layer needs rendering
+            rasterizer = None
+            page_count = len(pdf.pages)
+            for page_number, page in enumerate(pdf.pages, start=1):
+                result = None
+                if self.use_text_layer:
+                    with span('ocr.text_layer'):
+                        result = self._text_layer_page(page)
+                if result is None:
+                    with span('ocr.rasterize'):
+                        if rasterizer is None:
+                            rasterizer = stack.enter_context(self.rasterizer(file_path))
+                        image = rasterizer.render(page_number - 1)
+                    with span('ocr.recognize'):
+                        result = self.ocr_image(image)
+                    del image
+                    count('pages.ocr')
+                else:
+                    count('pages.text_layer')
+                count('pages')
+                page.flush_cache()
+                result['page_number'], result['page_count'] = page_number, page_count
+                yield result
+
+    def ocr_pdf_pages(self, pdf_path: str) -> List[Dict[str, Any]]:
+        """
+        Run OCR on every page of a PDF file.
+
+        Args:
+            pdf_path (str): Path to the PDF file
+
+        Returns:
+            List[Dict[str, Any]]: One OCR result per page
+        """
+        return list(self.iter_file_pages(pdf_path))
+
+    def ocr_file_pages(self, file_path: str) -> List[Dict[str, Any]]:
+        """Run OCR on a PDF or image file and return one result per page."""
+        return list(self.iter_file_pages(file_path))
+
+    def load_page(self, file_path: str, page_number: int = 0) -> Dict[str, Any]:
+        """
+        Load a single page without running OCR on it.
+
+        Born-digital PDF pages come back with their text layer words; scanned
+        pages and images come back as an image for region-level OCR.
+
+        Args:
+            file_path (str): Path to the PDF or image file
+            page_number (int): Zero-based page index
+
+        Returns:
+            Dict[str, Any]: 'image' or 'words' (the other is None), 'width', 'height' and 'page_count'
+        """
+        if not file_path.lower().endswith('.pdf'):
+            image = self._read_image(file_path)
+            height, width = image.shape[:2]
+            return {'image': image, 'words': None, 'width': width, 'height': height, 'page_count': 1}
+
+        import pdfplumber
+
         with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                # Convert PDF page to image
-                image = page.to_image()
-                image_bytes = io.BytesIO()
-                image.save(image_bytes, format='PNG')
-                image_bytes = image_bytes.getvalue()
-                
-                # Convert to numpy array for OpenCV
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                # Process with EasyOCR
-                results = self.reader.readtext(img)
-                page_text = ' '.join([text for _, text, _ in results])
-                text_content.append(page_text)
-        
-        return '\n'.join(text_content)
+            page = pdf.pages[page_number]
+            page_count = len(pdf.pages)
+            text_layer = None
+            if self.use_text_layer:
+                with span('ocr.text_layer'):
+                    text_layer = self._text_layer_page(page)
+            if text_layer is not None:
+                return {
+                    'image': None, 'words': text_layer['words'],
+                    'width': text_layer['width'], 'height': text_layer['height'],
+                    'page_count': page_count,
+                }
+            with span('ocr.rasterize'), self.rasterizer(file_path) as rasterizer:
+                image = rasterizer.render(page_number)
+        height, width = image.shape[:2]
+        return {'image': image, 'words': None, 'width': width, 'height': height, 'page_count': page_count}
+
+    def ocr_region(self, image: np.ndarray, box: Tuple[int, int, int, int]) -> Dict[str, Any]:
+        """
+        Run OCR on a rectangular region of an image.
+
+        Args:
+            image (np.ndarray): Full page image
+            box (Tuple[int, int, int, int]): Region as (x0, y0, x1, y1) pixels
+
+        Returns:
+            Dict[str, Any]: OCR result with word boxes in page coordinates
+        """
+        x0, y0, x1, y1 = box
+        with span('ocr.region'):
+            result = self.backend.recognize(image[y0:y1, x0:x1])
+        for word in result['words']:
+            word['x0'] += x0
+            word['x1'] += x0
+            word['y0'] += y0
+            word['y1'] += y0
+        result['height'], result['width'] = image.shape[:2]
+        return result
+
+    def get_backend_stats(self) -> Dict[str, Any]:
+        """Get per-backend latency statistics (empty until the backend is loaded)."""
+        if self._backend is None:
+            return {}
+        return self._backend.get_stats()
+
+    def process_pdf(self, file_path: str) -> str:
+        """Extract text from PDF file using the configured OCR backend."""
+        return '\n'.join(page['text'] for page in self.ocr_pdf_pages(file_path))
 
     def process_image(self, file_path: str) -> str:
-        """Extract text from image file using EasyOCR."""
-        # Read image with OpenCV
+        """Extract text from image file using the configured OCR backend."""
+        import cv2
+
         img = cv2.imread(file_path)
         if img is None:
             raise Exception(f"Could not read image file: {file_path}")
-        
-        # Process with EasyOCR
-        results = self.reader.readtext(img)
-        return ' '.join([text for _, text, _ in results])
+        return self.ocr_image(img)['text']
 
     def extract_text(self, file_path: str) -> str:
         """Extract text from file (PDF or image) using appropriate method."""
@@ -63,7 +292,7 @@ class OCRProcessor:
             # Simple language detection based on character sets
             arabic_chars = sum(1 for c in text if '\u0600' <= c <= '\u06FF')
             english_chars = sum(1 for c in text if 'a' <= c.lower() <= 'z')
-            
+
             if arabic_chars > english_chars:
                 return "ar"
             return "en"
@@ -74,22 +303,7 @@ class OCRProcessor:
     def preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """Preprocess image to improve OCR accuracy."""
         try:
-            # Convert to grayscale
-            if len(image.shape) == 3:
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = image
-
-            # Apply adaptive thresholding
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY, 11, 2
-            )
-
-            # Denoise
-            denoised = cv2.fastNlMeansDenoising(thresh)
-
-            return denoised
+            return preprocess_image(image)
         except Exception as e:
             print(f"Error in image preprocessing: {str(e)}")
             return image
@@ -97,30 +311,15 @@ class OCRProcessor:
     def extract_text_from_image(self, image_path: str) -> str:
         """
         Extract text from an image file.
-        
+
         Args:
             image_path (str): Path to the image file
-            
+
         Returns:
             str: Extracted text
         """
         try:
-            # Read image
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Could not read image at path: {image_path}")
-
-            # Preprocess image
-            processed_image = self.preprocess_image(image)
-
-            # Extract text using Tesseract
-            text = pytesseract.image_to_string(
-                processed_image,
-                lang=self.languages,
-                config='--psm 1 --oem 3'  # Page segmentation mode: Automatic page segmentation with OSD
-            )
-
-            return text.strip()
+            return self.ocr_image(self._read_image(image_path))['text'].strip()
         except Exception as e:
             self.logger.error(f"Error extracting text from image {image_path}: {str(e)}")
             return ""
@@ -128,35 +327,15 @@ class OCRProcessor:
     def extract_text_from_pdf(self, pdf_path: str) -> List[str]:
         """
         Extract text from a PDF file by converting each page to an image.
-        
+
         Args:
             pdf_path (str): Path to the PDF file
-            
+
         Returns:
             List[str]: List of extracted text from each page
         """
         try:
-            # Convert PDF to images
-            images = pdf2image.convert_from_path(pdf_path)
-            extracted_texts = []
-
-            for i, image in enumerate(images):
-                # Convert PIL Image to OpenCV format
-                opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                
-                # Preprocess image
-                processed_image = self.preprocess_image(opencv_image)
-                
-                # Extract text
-                text = pytesseract.image_to_string(
-                    processed_image,
-                    lang=self.languages,
-                    config='--psm 1 --oem 3'
-                )
-                
-                extracted_texts.append(text.strip())
-
-            return extracted_texts
+            return [page['text'].strip() for page in self.ocr_pdf_pages(pdf_path)]
         except Exception as e:
             self.logger.error(f"Error extracting text from PDF {pdf_path}: {str(e)}")
             return []
@@ -164,87 +343,60 @@ class OCRProcessor:
     def extract_structured_data(self, image_path: str) -> Dict[str, str]:
         """
         Extract structured data (tables, key-value pairs) from an image.
-        
+
         Args:
             image_path (str): Path to the image file
-            
+
         Returns:
             Dict[str, str]: Dictionary containing extracted structured data
         """
         try:
-            # Read image
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Could not read image at path: {image_path}")
-
-            # Preprocess image
-            processed_image = self.preprocess_image(image)
-
-            # Extract structured data using Tesseract
-            data = pytesseract.image_to_data(
-                processed_image,
-                lang=self.languages,
-                config='--psm 1 --oem 3',
-                output_type=pytesseract.Output.DICT
-            )
-
-            # Process the structured data
-            structured_data = {}
-            n_boxes = len(data['text'])
-            
-            # Combine text elements with their confidence scores
-            for i in range(n_boxes):
-                if int(data['conf'][i]) > 60:  # Filter low-confidence results
-                    text = data['text'][i].strip()
-                    if text:
-                        # Try to identify key-value pairs
-                        if ':' in text:
-                            key, value = text.split(':', 1)
-                            structured_data[key.strip()] = value.strip()
-                        else:
-                            # Store other high-confidence text
-                            structured_data[f'text_{i}'] = text
-
-            return structured_data
+            words = self.ocr_image(self._read_image(image_path))['words']
+            return self.structured_data_from_words(words)
         except Exception as e:
             self.logger.error(f"Error extracting structured data from {image_path}: {str(e)}")
             return {}
 
+    def structured_data_from_words(self, words: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Build key-value pairs from high-confidence OCR words.
+
+        Args:
+            words (List[Dict[str, Any]]): Word boxes from an OCR result
+
+        Returns:
+            Dict[str, str]: Dictionary containing extracted structured data
+        """
+        structured_data = {}
+        for i, word in enumerate(words):
+            if word['conf'] > 60:  # Filter low-confidence results
+                text = word['text'].strip()
+                if text:
+                    # Try to identify key-value pairs
+                    if ':' in text:
+                        key, value = text.split(':', 1)
+                        structured_data[key.strip()] = value.strip()
+                    else:
+                        # Store other high-confidence text
+                        structured_data[f'text_{i}'] = text
+        return structured_data
+
     def detect_text_regions(self, image_path: str) -> List[Tuple[int, int, int, int]]:
         """
         Detect regions containing text in an image.
-        
+
         Args:
             image_path (str): Path to the image file
-            
+
         Returns:
             List[Tuple[int, int, int, int]]: List of bounding boxes (x, y, w, h)
         """
         try:
-            # Read image
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Could not read image at path: {image_path}")
-
-            # Preprocess image
-            processed_image = self.preprocess_image(image)
-
-            # Get bounding boxes for text regions
-            boxes = pytesseract.image_to_boxes(
-                processed_image,
-                lang=self.languages,
-                config='--psm 1 --oem 3'
-            )
-
-            # Convert boxes to list of tuples
-            text_regions = []
-            for box in boxes.splitlines():
-                b = box.split()
-                if len(b) >= 4:
-                    x, y, w, h = int(b[1]), int(b[2]), int(b[3]), int(b[4])
-                    text_regions.append((x, y, w, h))
-
-            return text_regions
+            words = self.ocr_image(self._read_image(image_path))['words']
+            return [
+                (w['x0'], w['y0'], w['x1'] - w['x0'], w['y1'] - w['y0'])
+                for w in words
+            ]
         except Exception as e:
             self.logger.error(f"Error detecting text regions in {image_path}: {str(e)}")
-            return [] 
\ No newline at end of file
+            return []
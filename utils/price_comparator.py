@@ -1,8 +1,11 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Optional
 import logging
 from datetime import datetime
+from .pricing_store import PricingIndex, read_pricing_workbook, row_key
+from .tracing import count, span, traced
+from .variance_report_writer import VarianceReportWriter
 
 class PriceComparator:
     def __init__(self):
@@ -20,23 +23,18 @@ class PriceComparator:
             pd.DataFrame: Initial pricing data
         """
         try:
-            df = pd.read_excel(file_path)
-            required_columns = ['item_code', 'description', 'unit_price']
-            
-            # Validate required columns
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
-            
-            return df
+            # Validates the required columns
+            return read_pricing_workbook(file_path)
         except Exception as e:
             self.logger.error(f"Error loading initial pricing file: {str(e)}")
             return pd.DataFrame()
 
+    @traced('compare')
     def compare_prices(self, 
                       invoice_data: Dict[str, Any], 
                       initial_pricing: pd.DataFrame,
-                      tolerance: float = 0.05) -> Dict[str, Any]:
+                      tolerance: float = 0.05,
+                      index: Optional[PricingIndex] = None) -> Dict[str, Any]:
         """
         Compare invoice prices with initial pricing data.
         
@@ -44,6 +42,7 @@ class PriceComparator:
             invoice_data (Dict[str, Any]): Processed invoice data
             initial_pricing (pd.DataFrame): Initial pricing data
             tolerance (float): Acceptable percentage difference (default: 5%)
+            index (PricingIndex, optional): Prebuilt description index for initial_pricing
             
         Returns:
             Dict[str, Any]: Comparison results
@@ -69,8 +68,10 @@ class PriceComparator:
             total_actual = 0.0
             
             for item in invoice_data['line_items']:
-                item_analysis = self._analyze_item(item, initial_pricing, tolerance)
+                with span('compare.match'):
+                    item_analysis = self._analyze_item(item, initial_pricing, tolerance, index)
                 comparison_results['items_analysis'].append(item_analysis)
+                count('items.matched' if item_analysis['matched'] else 'items.unmatched')
                 
                 if item_analysis['matched']:
                     total_expected += item_analysis['expected_total']
@@ -99,7 +100,8 @@ class PriceComparator:
     def _analyze_item(self, 
                      item: Dict[str, Any], 
                      initial_pricing: pd.DataFrame,
-                     tolerance: float) -> Dict[str, Any]:
+                     tolerance: float,
+                     index: Optional[PricingIndex] = None) -> Dict[str, Any]:
         """
         Analyze a single invoice item against initial pricing.
         
@@ -107,6 +109,7 @@ class PriceComparator:
             item (Dict[str, Any]): Invoice line item
             initial_pricing (pd.DataFrame): Initial pricing data
             tolerance (float): Acceptable percentage difference
+            index (PricingIndex, optional): Prebuilt description index for initial_pricing
             
         Returns:
             Dict[str, Any]: Analysis results for the item
@@ -117,8 +120,10 @@ class PriceComparator:
             'unit_price': item['unit_price'],
             'amount': item['amount'],
             'matched': False,
+            'pricing_key': None,
             'expected_unit_price': 0.0,
             'expected_total': 0.0,
+            'actual_total': item['amount'],
             'variance': 0.0,
             'variance_percentage': 0.0,
             'within_tolerance': True,
@@ -126,13 +131,17 @@ class PriceComparator:
         }
         
         # Try to find matching item in initial pricing
-        matches = initial_pricing[
-            initial_pricing['description'].str.contains(item['description'], case=False, na=False)
-        ]
+        if index is not None:
+            matches = initial_pricing.iloc[index.match(item['description'])]
+        else:
+            matches = initial_pricing[
+                initial_pricing['description'].str.contains(item['description'], case=False, na=False, regex=False)
+            ]
         
         if len(matches) == 1:
             # Exact match found
             analysis['matched'] = True
+            analysis['pricing_key'] = row_key(matches.iloc[0].get('item_code'), matches.iloc[0]['description'])
             analysis['expected_unit_price'] = matches.iloc[0]['unit_price']
             analysis['expected_total'] = analysis['expected_unit_price'] * analysis['quantity']
             
@@ -162,6 +171,8 @@ class PriceComparator:
         """
         Generate a detailed variance report in Excel format.
         
+        Rows are streamed to the file; see VarianceReportWriter.
+        
         Args:
             comparison_results (Dict[str, Any]): Price comparison results
             output_path (str): Path to save the Excel report
@@ -170,31 +181,8 @@ class PriceComparator:
             bool: True if report generation successful, False otherwise
         """
         try:
-            # Create DataFrames for different sections of the report
-            summary_data = pd.DataFrame([comparison_results['summary']])
-            
-            items_data = pd.DataFrame(comparison_results['items_analysis'])
-            
-            # Create Excel writer
-            with pd.ExcelWriter(output_path) as writer:
-                # Write summary sheet
-                summary_data.to_excel(writer, sheet_name='Summary', index=False)
-                
-                # Write detailed analysis sheet
-                items_data.to_excel(writer, sheet_name='Detailed Analysis', index=False)
-                
-                # Apply formatting
-                workbook = writer.book
-                worksheet = writer.sheets['Detailed Analysis']
-                
-                # Add conditional formatting for variance percentage
-                worksheet.conditional_format('H2:H1000', {
-                    'type': '3_color_scale',
-                    'min_color': '#63BE7B',  # Green
-                    'mid_color': '#FFEB84',  # Yellow
-                    'max_color': '#F8696B'   # Red
-                })
-            
+            with VarianceReportWriter(output_path) as writer:
+                writer.write_comparison(comparison_results)
             return True
             
         except Exception as e:
@@ -0,0 +1,363 @@
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .file_store import file_hash
+
+REQUIRED_COLUMNS = ['item_code', 'description', 'unit_price']
+
+# Typed layout of a pricing snapshot
+PRICING_DTYPES = {
+    'item_code': 'string',
+    'description': 'string',
+    'unit': 'string',
+    'unit_price': 'float64',
+}
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _normalize_header(value: Any) -> str:
+    return _WHITESPACE.sub('_', str(value or '').strip().lower())
+
+
+def read_pricing_workbook(file_path: str) -> pd.DataFrame:
+    """
+    Parse a pricing workbook into a typed frame.
+
+    .xlsx files are streamed row by row with openpyxl's read-only reader, so
+    large BOQ sheets are never materialized as cell objects; legacy .xls
+    files go through pandas.
+
+    Args:
+        file_path (str): Path to the pricing workbook
+
+    Returns:
+        pd.DataFrame: Columns item_code, description, unit, unit_price
+
+    Raises:
+        ValueError: If required columns are missing
+    """
+    if file_path.lower().endswith('.xls'):
+        df = pd.read_excel(file_path)
+        df.columns = [_normalize_header(c) for c in df.columns]
+    else:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = [_normalize_header(c) for c in next(rows, ())]
+            wanted = {name: i for i, name in enumerate(header) if name in PRICING_DTYPES}
+            records = [
+                tuple(row[i] if i < len(row) else None for i in wanted.values())
+                for row in rows
+                if row and any(cell is not None for cell in row)
+            ]
+        finally:
+            workbook.close()
+        df = pd.DataFrame.from_records(records, columns=list(wanted))
+
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+
+    if 'unit' not in df.columns:
+        df['unit'] = ''
+    df = df[list(PRICING_DTYPES)]
+    df['unit_price'] = pd.to_numeric(df['unit_price'], errors='coerce')
+    df = df.dropna(subset=['description', 'unit_price'])
+    df['item_code'] = df['item_code'].map(lambda v: '' if pd.isna(v) else str(v).strip())
+    df['description'] = df['description'].map(lambda v: str(v).strip())
+    df['unit'] = df['unit'].map(lambda v: '' if pd.isna(v) else str(v).strip())
+    return df.astype(PRICING_DTYPES).reset_index(drop=True)
+
+
+def row_key(item_code: Any, description: Any) -> str:
+    """
+    Stable key of a pricing row across workbook revisions.
+
+    Item codes identify rows when present; otherwise the normalized
+    description is used.
+    """
+    code = '' if item_code is None or pd.isna(item_code) else str(item_code).strip()
+    if code:
+        return f"code:{code}"
+    return f"desc:{_WHITESPACE.sub(' ', str(description).strip().lower())}"
+
+
+def _keyed(pricing: pd.DataFrame) -> pd.DataFrame:
+    codes = pricing['item_code'] if 'item_code' in pricing.columns else pd.Series('', index=pricing.index)
+    keyed = pricing.assign(key=[row_key(c, d) for c, d in zip(codes, pricing['description'])])
+    return keyed.drop_duplicates('key', keep='last').set_index('key')
+
+
+def diff_pricing(old: pd.DataFrame, new: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Row-level diff between two pricing versions.
+
+    Args:
+        old (pd.DataFrame): Previous pricing snapshot
+        new (pd.DataFrame): Revised pricing snapshot
+
+    Returns:
+        Dict[str, Any]: 'added', 'removed' and 'changed' rows (each with its
+        key and old/new description and unit price) and the 'unchanged' count
+    """
+    old_rows, new_rows = _keyed(old), _keyed(new)
+    columns = ['description', 'unit', 'unit_price']
+    joined = old_rows[columns].join(new_rows[columns], how='outer', lsuffix='_old', rsuffix='_new')
+
+    in_old = joined['description_old'].notna()
+    in_new = joined['description_new'].notna()
+    both = in_old & in_new
+    modified = both & (
+        (joined['unit_price_old'] != joined['unit_price_new'])
+        | (joined['description_old'] != joined['description_new'])
+        | (joined['unit_old'].fillna('') != joined['unit_new'].fillna(''))
+    )
+
+    def rows(mask):
+        return [
+            {
+                'key': key,
+                'old_description': row['description_old'] if pd.notna(row['description_old']) else None,
+                'new_description': row['description_new'] if pd.notna(row['description_new']) else None,
+                'old_unit_price': float(row['unit_price_old']) if pd.notna(row['unit_price_old']) else None,
+                'new_unit_price': float(row['unit_price_new']) if pd.notna(row['unit_price_new']) else None,
+            }
+            for key, row in joined[mask].iterrows()
+        ]
+
+    return {
+        'added': rows(in_new & ~in_old),
+        'removed': rows(in_old & ~in_new),
+        'changed': rows(modified),
+        'unchanged': int((both & ~modified).sum()),
+    }
+
+
+class PricingIndex:
+    """
+    Trigram index over pricing descriptions.
+
+    Answers the same question as a case-insensitive substring search of
+    each pricing description (which rows contain the invoice item text),
+    but only verifies rows sharing every trigram of the query instead of
+    scanning the whole sheet for each line item.
+    """
+
+    def __init__(self, descriptions: List[str]):
+        self.descriptions = [d.lower() for d in descriptions]
+        self.postings: Dict[str, set] = {}
+        for row, text in enumerate(self.descriptions):
+            for gram in self._trigrams(text):
+                self.postings.setdefault(gram, set()).add(row)
+
+    @staticmethod
+    def _trigrams(text: str) -> set:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def match(self, description: str) -> List[int]:
+        """
+        Rows whose description contains the given text.
+
+        Args:
+            description (str): Invoice item description
+
+        Returns:
+            List[int]: Matching row positions, in sheet order
+        """
+        query = (description or '').lower()
+        grams = self._trigrams(query)
+        if not grams:
+            candidates = range(len(self.descriptions))
+        else:
+            postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+            candidates = set.intersection(*postings) if postings[0] else set()
+        return sorted(row for row in candidates if query in self.descriptions[row])
+
+
+class PricingStore:
+    """
+    Pricing baselines with change detection and cached lookups.
+
+    Uploaded workbooks are fingerprinted; an unchanged workbook is not parsed
+    or written again. Each distinct workbook gets a Parquet snapshot for fast
+    reloads and a PricingIndex that is built once per version.
+
+    Snapshots are kept per version, so variance results keep their baseline.
+    When a revision becomes current it is diffed against the previous one
+    and only the invoice items whose match can have changed are compared
+    again.
+    """
+
+    def __init__(self, db, snapshot_dir: Optional[str] = None):
+        """
+        Initialize the pricing store.
+
+        Args:
+            db (Database): Project database holding the pricing tables
+            snapshot_dir (str, optional): Directory for Parquet snapshots
+                (default: the project's pricing directory)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db = db
+        self.snapshot_dir = snapshot_dir or os.path.join(db.data_dir, 'pricing')
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, Tuple[pd.DataFrame, PricingIndex]] = {}
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def _snapshot_path(self, fingerprint: str) -> str:
+        return os.path.join(self.snapshot_dir, f"{fingerprint}.parquet")
+
+    def ingest(self, file_path: str, fingerprint: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Make a pricing workbook the current baseline.
+
+        Args:
+            file_path (str): Path to the pricing workbook
+            fingerprint (str, optional): Precomputed fingerprint of the file
+
+        Returns:
+            Dict[str, Any]: Version record plus 'changed' (False when the
+            workbook was already the current baseline), and for revisions the
+            'diff' counts and number of 'reevaluated' invoice items
+        """
+        fingerprint = fingerprint or file_hash(file_path)
+        current = self.db.get_current_pricing_version()
+        if current and current['fingerprint'] == fingerprint:
+            return {**current, 'changed': False}
+
+        known = self.db.get_pricing_version(fingerprint)
+        snapshot_path = self._snapshot_path(fingerprint)
+        if known and os.path.exists(known['snapshot_path']):
+            pricing = pd.read_parquet(known['snapshot_path'])
+        else:
+            pricing = read_pricing_workbook(file_path)
+            pricing.to_parquet(snapshot_path, index=False)
+
+        if not self.db.save_initial_pricing(pricing):
+            raise RuntimeError("Failed to save initial pricing data")
+        version = self.db.save_pricing_version(
+            fingerprint, os.path.basename(file_path), len(pricing), snapshot_path
+        )
+        _, index = self._remember(fingerprint, pricing)
+        result = {**version, 'changed': True}
+
+        if current:
+            previous = self.load_version(current)
+            diff = diff_pricing(previous, pricing) if previous is not None else None
+            result['diff'] = {
+                name: len(rows) if isinstance(rows, list) else rows
+                for name, rows in (diff or {}).items()
+            }
+            result['reevaluated'] = self.reevaluate(diff, version, pricing, index)
+        return result
+
+    def load_version(self, version: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """Load the snapshot of a pricing version, if it is still on disk."""
+        if version.get('snapshot_path') and os.path.exists(version['snapshot_path']):
+            return pd.read_parquet(version['snapshot_path'])
+        return None
+
+    def reevaluate(self, diff: Optional[Dict[str, Any]], version: Dict[str, Any],
+                   pricing: pd.DataFrame, index: PricingIndex) -> int:
+        """
+        Compare the invoice items affected by a pricing revision again.
+
+        An item is affected when it was matched to a changed or removed row,
+        or when its description is contained in an added row or in the new
+        text of a changed row (which can create or break a match). Unmatched
+        items are also affected when their description is contained in the
+        old text of a removed or changed row: an item that matched several
+        rows (ambiguous) can match one once the others are gone. Affected
+        variance rows are superseded, not deleted, so earlier results keep
+        their baseline.
+
+        Args:
+            diff (Dict[str, Any], optional): Result of diff_pricing(); None re-evaluates everything
+            version (Dict[str, Any]): The new current pricing version
+            pricing (pd.DataFrame): Pricing data of the new version
+            index (PricingIndex): Index over the new pricing data
+
+        Returns:
+            int: Number of invoice items compared again
+        """
+        from .price_comparator import PriceComparator
+
+        items = self.db.get_current_variance_items()
+        if items.empty:
+            return 0
+
+        if diff is None:
+            affected = items
+        else:
+            stale_keys = {row['key'] for row in diff['removed'] + diff['changed']}
+            new_texts = PricingIndex([
+                row['new_description'] for row in diff['added'] + diff['changed']
+            ])
+            old_texts = PricingIndex([
+                row['old_description'] for row in diff['removed'] + diff['changed']
+            ])
+            mask = items['pricing_row_key'].isin(stale_keys)
+            if len(new_texts):
+                mask |= items['item_description'].map(lambda text: bool(new_texts.match(text)))
+            if len(old_texts):
+                unmatched = items['pricing_row_key'].isna()
+                mask |= unmatched & items['item_description'].map(lambda text: bool(old_texts.match(text)))
+            affected = items[mask]
+
+        if affected.empty:
+            return 0
+
+        comparator = PriceComparator()
+        results = []
+        for row in affected.itertuples(index=False):
+            item = {
+                'description': row.item_description,
+                'quantity': row.quantity if pd.notna(row.quantity) else 1,
+                'unit_price': row.actual_price,
+                'amount': row.amount,
+            }
+            results.append((row.id, row.invoice_id, comparator._analyze_item(item, pricing, 0.0, index)))
+
+        self.db.supersede_variance_items(results, version['id'])
+        self.logger.info(f"Re-evaluated {len(results)} of {len(items)} invoice items for pricing version {version['id']}")
+        return len(results)
+
+    def _remember(self, fingerprint: str, pricing: pd.DataFrame) -> Tuple[pd.DataFrame, PricingIndex]:
+        entry = (pricing, PricingIndex(pricing['description'].tolist()))
+        with self._lock:
+            # Only the current version is kept in memory
+            self._loaded = {fingerprint: entry}
+        return entry
+
+    def current(self) -> Tuple[Optional[pd.DataFrame], Optional[PricingIndex], Optional[Dict[str, Any]]]:
+        """
+        Current pricing baseline.
+
+        Returns:
+            Tuple: (pricing frame, index, version record), or Nones if no
+            pricing has been uploaded
+        """
+        version = self.db.get_current_pricing_version()
+        if not version:
+            return None, None, None
+
+        fingerprint = version['fingerprint']
+        with self._lock:
+            entry = self._loaded.get(fingerprint)
+        if entry is None:
+            pricing = self.load_version(version)
+            if pricing is None:
+                pricing = self.db.get_initial_pricing()
+            entry = self._remember(fingerprint, pricing)
+        return entry[0], entry[1], version
@@ -0,0 +1,284 @@
+import contextlib
+import cProfile
+import glob
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from .file_store import file_hash
+from .tracing import current_trace
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+
+MODES = ('sample', 'cprofile')
+
+# Stack frames kept per tracemalloc allocation; each frame makes allocations slower
+MEMORY_FRAMES = 1
+
+# Allocation sites listed in a profile's summary
+TOP_ALLOCATIONS = 20
+
+_memory_lock = threading.Lock()
+_memory_users = 0
+
+
+def profile_dir() -> str:
+    """Directory profiles are stored in, under the application data directory."""
+    data_root = os.getenv('INVOICE_ANALYZER_DATA_DIR') or os.path.join(ROOT_DIR, 'data')
+    return os.path.join(data_root, 'profiles')
+
+
+class StackSampler:
+    """
+    Sampling profiler for one thread.
+
+    A daemon thread reads the target thread's stack every interval seconds
+    and counts the stacks it sees. The profiled code is not slowed down
+    apart from the sampler taking the GIL briefly, so it can stay on for
+    every invoice. Stacks are written in the folded format read by
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def dump(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+
+
+def _start_memory_tracing(frames: int) -> bool:
+    """Start tracemalloc unless already running; returns whether a reference was taken."""
+    global _memory_users
+    with _memory_lock:
+        if _memory_users == 0 and tracemalloc.is_tracing():
+            # Started by someone else: use it, leave it running
+            tracemalloc.reset_peak()
+            return False
+        if _memory_users == 0:
+            tracemalloc.start(frames)
+        _memory_users += 1
+        tracemalloc.reset_peak()
+        return True
+
+
+def _stop_memory_tracing():
+    global _memory_users
+    with _memory_lock:
+        _memory_users -= 1
+        if _memory_users == 0:
+            tracemalloc.stop()
+
+
+class SlowInvoiceProfiler:
+    """
+    Opt-in profiling of invoices that take longer than a threshold.
+
+    Every invoice runs under a profiler (the low overhead stack sampler by
+    default, or cProfile) and, optionally, tracemalloc. Only files slower
+    than the threshold are kept: the profile, a memory snapshot and a copy
+    of the input are stored under profiles/<file hash>/, so the case can be
+    replayed and analysed offline:
+
+        python cli.py profiles                     List stored profiles
+        python cli.py profiles --replay <hash>     Process the stored input again under cProfile
+
+    Enabled for every InvoiceProcessor with the INVOICE_PROFILE_THRESHOLD
+    environment variable (seconds); INVOICE_PROFILE_MODE picks the profiler.
+    The sampler costs a few percent and cProfile about 3x, but tracemalloc
+    has to trace every invoice from its start and makes allocation-heavy
+    PDF parsing around 4x slower (more with INVOICE_PROFILE_MEMORY_FRAMES
+    above 1); INVOICE_PROFILE_MEMORY=0 turns it off.
+    """
+
+    def __init__(self, threshold: float, mode: str = 'sample', memory: bool = True,
+                 memory_frames: int = MEMORY_FRAMES, directory: Optional[str] = None,
+                 interval: float = 0.005, keep: int = 200):
+        """
+        Args:
+            threshold (float): Seconds after which an invoice's profile is kept
+            mode (str): 'sample' (stack sampler) or 'cprofile' (deterministic, slower)
+            memory (bool): Take a tracemalloc snapshot of slow invoices
+            memory_frames (int): Stack frames recorded per allocation
+            directory (str, optional): Where profiles are stored (default: data/profiles)
+            interval (float): Seconds between stack samples
+            keep (int): Profiles kept; the oldest are removed beyond it
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}; expected one of {MODES}")
+        self.threshold = threshold
+        self.mode = mode
+        self.memory = memory
+        self.memory_frames = memory_frames
+        self.directory = directory or profile_dir()
+        self.interval = interval
+        self.keep = keep
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls) -> Optional['SlowInvoiceProfiler']:
+        """Profiler configured by INVOICE_PROFILE_* environment variables, or None if not enabled."""
+        threshold = os.getenv('INVOICE_PROFILE_THRESHOLD')
+        if not threshold:
+            return None
+        return cls(
+            float(threshold),
+            mode=os.getenv('INVOICE_PROFILE_MODE', 'sample'),
+            memory=os.getenv('INVOICE_PROFILE_MEMORY', '1') != '0',
+            memory_frames=int(os.getenv('INVOICE_PROFILE_MEMORY_FRAMES', MEMORY_FRAMES))
+        )
+
+    @contextlib.contextmanager
+    def profile(self, file_path: str) -> Iterator[None]:
+        """Profile the enclosed processing of file_path and keep the result if it was slow."""
+        profiler = sampler = None
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+        else:
+            sampler = StackSampler(interval=self.interval)
+        memory_reference = self.memory and _start_memory_tracing(self.memory_frames)
+        if sampler is not None:
+            sampler.start()
+        else:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if sampler is not None:
+                sampler.stop()
+            else:
+                profiler.disable()
+            snapshot = peak = None
+            if self.memory and elapsed >= self.threshold and tracemalloc.is_tracing():
+                # Leave out the sampler's own stack strings
+                snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__)])
+                peak = tracemalloc.get_traced_memory()[1]
+            if memory_reference:
+                _stop_memory_tracing()
+            if elapsed >= self.threshold:
+                try:
+                    self._store(file_path, elapsed, profiler or sampler, snapshot, peak)
+                except Exception as e:
+                    self.logger.error(f"Error storing profile of {file_path}: {str(e)}")
+
+    def _store(self, file_path: str, elapsed: float, profile: Any,
+               snapshot: Optional[tracemalloc.Snapshot], peak: Optional[int]):
+        digest = file_hash(file_path)
+        directory = os.path.join(self.directory, digest)
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+        # One copy of the input per hash is enough to replay it
+        input_path = os.path.join(directory, 'input' + os.path.splitext(file_path)[1].lower())
+        if not os.path.exists(input_path):
+            shutil.copyfile(file_path, input_path)
+
+        meta: Dict[str, Any] = {
+            'file_hash': digest,
+            'file_name': os.path.basename(file_path),
+            'input': os.path.basename(input_path),
+            'size': os.path.getsize(file_path),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'elapsed_s': elapsed,
+            'threshold_s': self.threshold,
+            'mode': self.mode,
+        }
+        if isinstance(profile, StackSampler):
+            meta['profile'] = f"{stamp}.folded"
+            meta['samples'] = profile.samples
+            profile.dump(os.path.join(directory, meta['profile']))
+        else:
+            meta['profile'] = f"{stamp}.prof"
+            profile.dump_stats(os.path.join(directory, meta['profile']))
+
+        if snapshot is not None:
+            meta['memory_snapshot'] = f"{stamp}.tracemalloc"
+            meta['peak_memory_bytes'] = peak
+            snapshot.dump(os.path.join(directory, meta['memory_snapshot']))
+            meta['top_allocations'] = [
+                {'site': str(stat.traceback[0]), 'size_bytes': stat.size, 'blocks': stat.count}
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+            ]
+
+        # Stage timings of the invoice so far, when it is traced
+        trace = current_trace()
+        if trace is not None:
+            meta['trace_id'] = trace.trace_id
+            meta['stages'] = {stage: list(entry) for stage, entry in trace.stages.items()}
+            meta['counters'] = dict(trace.counters)
+            trace.attributes['profile'] = f"{digest}/{stamp}"
+
+        with open(os.path.join(directory, f"{stamp}.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        self.logger.warning(
+            f"Invoice {file_path} took {elapsed:.1f}s (threshold {self.threshold:.1f}s); "
+            f"profile stored in {directory}"
+        )
+        self._prune()
+
+    def _prune(self):
+        metas = sorted(glob.glob(os.path.join(self.directory, '*', '*.json')), key=os.path.getmtime)
+        for meta_path in metas[:max(0, len(metas) - self.keep)]:
+            stem = os.path.splitext(meta_path)[0]
+            for path in glob.glob(glob.escape(stem) + '.*'):
+                os.remove(path)
+            directory = os.path.dirname(meta_path)
+            if not glob.glob(os.path.join(directory, '*.json')):
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+def list_profiles(directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Stored profiles, slowest first.
+
+    Args:
+        directory (str, optional): Profile directory (default: data/profiles)
+
+    Returns:
+        List[Dict[str, Any]]: Profile summaries with the path of their directory
+    """
+    profiles = []
+    for meta_path in glob.glob(os.path.join(directory or profile_dir(), '*', '*.json')):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        meta['directory'] = os.path.dirname(meta_path)
+        profiles.append(meta)
+    return sorted(profiles, key=lambda meta: -meta['elapsed_s'])
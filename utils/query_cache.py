@@ -0,0 +1,108 @@
+import copy
+import functools
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import pandas as pd
+
+from .tracing import count, span
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+class QueryCache:
+    """
+    Process-wide LRU cache for dashboard queries.
+
+    Entries are keyed by the database path, project, method, arguments and
+    the data version stored in the database, so any write that bumps the
+    version (from this or another process) makes older entries unreachable;
+    they are then evicted by the LRU bound.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+query_cache = QueryCache()
+
+
+def _is_empty(value: Any) -> bool:
+    if isinstance(value, pd.DataFrame):
+        return value.empty
+    return not value
+
+
+def _copy(value: Any) -> Any:
+    # Callers may modify results in place; keep the cached copy intact
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    return copy.deepcopy(value)
+
+
+def cached_query(method: Callable) -> Callable:
+    """
+    Cache a Database read method until the data version changes.
+
+    The current date is part of the key because queries relative to
+    DATE('now') change at midnight without any write. Empty results are not
+    cached, since the read methods also return them on errors.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (
+            self.db_path,
+            self.project_id,
+            method.__name__,
+            args,
+            tuple(sorted(kwargs.items())),
+            self.get_data_version(),
+            date.today(),
+        )
+        hit, value = query_cache.get(key)
+        count('query_cache.hits' if hit else 'query_cache.misses')
+        if not hit:
+            with span(f"db.{method.__name__}"):
+                value = method(self, *args, **kwargs)
+            if _is_empty(value):
+                return value
+            query_cache.set(key, value)
+        return _copy(value)
+
+    return wrapper
@@ -0,0 +1,148 @@
+import ctypes
+import logging
+import math
+import threading
+import numpy as np
+
+from .tracing import count
+
+# Resolution used when rendering PDF pages for OCR
+RENDER_DPI = 200
+
+# Largest page rendered, in pixels; bigger pages (drawings, A0 sheets) get a lower
+# resolution. 24 million BGR pixels take about 70 MB.
+MAX_PAGE_PIXELS = 24_000_000
+
+# PDFium keeps the parsed resources of every page it rendered until the
+# document is closed; reopening it after this many pages bounds that cache
+REOPEN_PAGES = 8
+
+# PDFium is not thread safe; renders from different threads take turns
+_pdfium_lock = threading.Lock()
+
+
+class PageRasterizer:
+    """
+    Render PDF pages one at a time straight into NumPy arrays.
+
+    PDFium draws into a buffer allocated by NumPy, so a page exists once in
+    memory: there is no PIL image, mode conversion or color conversion copy
+    in between, and the document is opened once instead of once per page.
+    A page's array is the only thing kept after render() returns; it is
+    freed as soon as the caller drops it.
+
+    Pages larger than max_pixels at the requested DPI are rendered at the
+    resolution that fits the budget, which bounds memory per page
+    regardless of the page size.
+
+        with PageRasterizer(path) as rasterizer:
+            for index in range(len(rasterizer)):
+                image = rasterizer.render(index)
+    """
+
+    def __init__(self, source: str, dpi: float = RENDER_DPI, max_pixels: int = MAX_PAGE_PIXELS,
+                 antialias: bool = False, reopen_pages: int = REOPEN_PAGES):
+        """
+        Args:
+            source (str): Path to the PDF file
+            dpi (float): Resolution pages are rendered at, within the pixel budget
+            max_pixels (int): Largest number of pixels per page
+            antialias (bool): Smooth text, lines and images (off, like pdfplumber's renders)
+            reopen_pages (int): Pages rendered before the document is reopened to drop PDFium's caches
+        """
+        self.source = source
+        self.dpi = dpi
+        self.max_pixels = max_pixels
+        self.antialias = antialias
+        self.reopen_pages = reopen_pages
+        self.logger = logging.getLogger(__name__)
+        self._pdf = None
+        self._rendered = 0
+        with _pdfium_lock:
+            self.page_count = len(self._open())
+
+    def _open(self):
+        import pypdfium2 as pdfium
+
+        if self._pdf is None:
+            self._pdf = pdfium.PdfDocument(self.source)
+            self._rendered = 0
+        return self._pdf
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def __enter__(self) -> 'PageRasterizer':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pdf is not None:
+            with _pdfium_lock:
+                self._pdf.close()
+            self._pdf = None
+
+    def scale_for(self, width: float, height: float) -> float:
+        """Pixels per point for a page of the given size in points."""
+        scale = self.dpi / 72
+        if width * height * scale * scale > self.max_pixels:
+            scale = math.sqrt(self.max_pixels / (width * height))
+        return scale
+
+    def render(self, index: int) -> np.ndarray:
+        """
+        Render one page.
+
+        Args:
+            index (int): Zero-based page index
+
+        Returns:
+            np.ndarray: BGR image of the page
+        """
+        import pypdfium2.raw as pdfium_c
+
+        with _pdfium_lock:
+            if self._pdf is not None and self._rendered >= self.reopen_pages:
+                self._pdf.close()
+                self._pdf = None
+            page = self._open()[index]
+            self._rendered += 1
+            try:
+                width_pt, height_pt = page.get_size()
+                scale = self.scale_for(width_pt, height_pt)
+                if scale < self.dpi / 72:
+                    count('pages.downscaled')
+                    self.logger.info(
+                        f"Page {index + 1} rendered at {scale * 72:.0f} DPI to stay within {self.max_pixels} pixels"
+                    )
+                    # Round down so the page stays within the budget
+                    width, height = int(width_pt * scale), int(height_pt * scale)
+                else:
+                    # Same size as pdfplumber's to_image()
+                    width, height = math.ceil(width_pt * scale), math.ceil(height_pt * scale)
+                width, height = max(width, 1), max(height, 1)
+
+                # PDFium wants rows aligned to 4 bytes; pad the row, then crop the view
+                stride = (width * 3 + 3) & ~3
+                buffer = np.empty((height, stride), dtype=np.uint8)
+                bitmap = pdfium_c.FPDFBitmap_CreateEx(
+                    width, height, pdfium_c.FPDFBitmap_BGR, ctypes.c_void_p(buffer.ctypes.data), stride
+                )
+                if not bitmap:
+                    raise MemoryError(f"Could not create a {width}x{height} bitmap")
+                try:
+                    flags = pdfium_c.FPDF_ANNOT
+                    if not self.antialias:
+                        flags |= (pdfium_c.FPDF_RENDER_NO_SMOOTHTEXT | pdfium_c.FPDF_RENDER_NO_SMOOTHIMAGE
+                                  | pdfium_c.FPDF_RENDER_NO_SMOOTHPATH)
+                    pdfium_c.FPDFBitmap_FillRect(bitmap, 0, 0, width, height, 0xFFFFFFFF)
+                    pdfium_c.FPDF_RenderPageBitmap(bitmap, page.raw, 0, 0, width, height, 0, flags)
+                finally:
+                    # The buffer belongs to NumPy and outlives the bitmap
+                    pdfium_c.FPDFBitmap_Destroy(bitmap)
+            finally:
+                page.close()
+
+        return buffer[:, :width * 3].reshape(height, width, 3)
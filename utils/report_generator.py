@@ -1,20 +1,141 @@
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.units import inch
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-import plotly.io as pio
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import logging
+import multiprocessing
 import os
+import uuid
+import plotly.io as pio
 
 # Register Arabic font
 FONT_PATH = os.path.join(os.path.dirname(__file__), '../data/fonts/NotoNaskhArabic-Regular.ttf')
 pdfmetrics.registerFont(TTFont('Arabic', FONT_PATH))
 
+CHART_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'cache', 'charts')
+
+# Tables longer than this are split into LongTables of this many rows, so
+# ReportLab never lays out more than one chunk at a time
+TABLE_CHUNK_ROWS = 500
+
+# Chart images are rasterized at this multiple of their size in the PDF
+CHART_SCALE = 2
+
+logger = logging.getLogger(__name__)
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Arabic'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Arabic'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+
+def _write_chart(figure_json: str, path: str, width: int, height: int, scale: int) -> str:
+    """Rasterize a plotly figure to PNG; runs in a worker process."""
+    png = pio.to_image(pio.from_json(figure_json), format='png', width=width, height=height, scale=scale)
+    # Unique temporary name, then an atomic rename: concurrent writers never collide
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(png)
+    os.replace(temp_path, path)
+    return path
+
+
+class ChartImageCache:
+    """
+    PNG images of plotly figures, cached by content hash.
+
+    A figure rendered before (same data, layout and size) is not rasterized
+    again. Misses are rasterized in a process pool, since each rasterization
+    is CPU-bound. The least recently used images beyond max_files are deleted.
+    """
+
+    def __init__(self, cache_dir: str = CHART_CACHE_DIR, workers: Optional[int] = None,
+                 max_files: int = 1000):
+        """
+        Args:
+            cache_dir (str): Directory of the cached images
+            workers (int, optional): Rasterizing processes (default: up to 4)
+            max_files (int): Images kept in the cache
+        """
+        self.cache_dir = cache_dir
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_files = max_files
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, figure_json: str, width: int, height: int, scale: int) -> str:
+        key = hashlib.sha256(f"{width}x{height}@{scale}:{figure_json}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def render(self, figures: Sequence[Any], width: int, height: int, scale: int = CHART_SCALE) -> List[str]:
+        """
+        Get image paths for figures, rasterizing only the uncached ones.
+
+        Args:
+            figures (Sequence[Any]): Plotly figures
+            width (int): Image width in pixels before scaling
+            height (int): Image height in pixels before scaling
+            scale (int): Resolution multiple
+
+        Returns:
+            List[str]: PNG path of each figure, in order
+        """
+        jobs, paths = {}, []
+        for fig in figures:
+            figure_json = pio.to_json(fig, validate=False)
+            path = self._path(figure_json, width, height, scale)
+            paths.append(path)
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                jobs[path] = figure_json
+
+        if len(jobs) == 1:
+            (path, figure_json), = jobs.items()
+            _write_chart(figure_json, path, width, height, scale)
+        elif jobs:
+            with ProcessPoolExecutor(
+                max_workers=min(self.workers, len(jobs)),
+                mp_context=multiprocessing.get_context('spawn')
+            ) as pool:
+                for future in as_completed([
+                    pool.submit(_write_chart, figure_json, path, width, height, scale)
+                    for path, figure_json in jobs.items()
+                ]):
+                    future.result()
+            self._prune()
+        return paths
+
+    def _prune(self):
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.png')]
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
 class ReportGenerator:
-    def __init__(self):
+    def __init__(self, chart_cache: Optional[ChartImageCache] = None):
         self.styles = getSampleStyleSheet()
         self.arabic_style = ParagraphStyle(
             'Arabic',
@@ -23,6 +144,7 @@ class ReportGenerator:
             leading=16,
             alignment=1  # Center alignment
         )
+        self.chart_cache = chart_cache or ChartImageCache()
 
     def create_header(self, title):
         """Create a header paragraph with Arabic support."""
@@ -31,30 +153,41 @@ class ReportGenerator:
     def create_table(self, data, colWidths=None):
         """Create a table with the given data."""
         table = Table(data, colWidths=colWidths)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Arabic'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'Arabic'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        table.setStyle(TABLE_STYLE)
+        return table
+
+    def create_long_table(self, header: List[str], rows: Iterable[List[Any]], colWidths=None,
+                          chunk_rows: int = TABLE_CHUNK_ROWS) -> List[LongTable]:
+        """
+        Create a table of any length as LongTables that repeat the header on every page.
+
+        Rows are split into chunks of chunk_rows, each its own LongTable, so
+        ReportLab measures and splits one chunk at a time instead of the
+        whole table.
+        """
+        tables, chunk = [], []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                tables.append(self._long_table(header, chunk, colWidths))
+                chunk = []
+        if chunk or not tables:
+            tables.append(self._long_table(header, chunk, colWidths))
+        return tables
+
+    def _long_table(self, header: List[str], rows: List[List[Any]], colWidths=None) -> LongTable:
+        table = LongTable([header] + rows, colWidths=colWidths, repeatRows=1)
+        table.setStyle(TABLE_STYLE)
         return table
 
     def add_plot(self, fig, width=6*inch, height=4*inch):
         """Convert a plotly figure to a ReportLab image."""
-        # Save plotly figure as PNG temporarily
-        temp_path = 'temp_plot.png'
-        pio.write_image(fig, temp_path)
-        img = Image(temp_path, width=width, height=height)
-        os.remove(temp_path)
-        return img
+        return self.add_plots([fig], width, height)[0]
+
+    def add_plots(self, figures, width=6*inch, height=4*inch) -> List[Image]:
+        """Convert plotly figures to ReportLab images, rasterizing uncached ones in parallel."""
+        paths = self.chart_cache.render(figures, int(width), int(height))
+        return [Image(path, width=width, height=height) for path in paths]
 
     def generate_expense_report(self, output_path, project_data, start_date, end_date):
         """Generate an expense report PDF."""
@@ -103,9 +236,9 @@ class ReportGenerator:
 
         # Add plots if available
         if project_data.get('plots'):
-            for plot in project_data['plots']:
+            for image in self.add_plots(project_data['plots']):
                 content.append(Spacer(1, 24))
-                content.append(self.add_plot(plot))
+                content.append(image)
 
         # Build the PDF
         doc.build(content)
@@ -150,27 +283,28 @@ class ReportGenerator:
             content.append(Spacer(1, 24))
             content.append(self.create_header("تفاصيل الفروقات"))
             content.append(Spacer(1, 12))
-            details_table = [
-                ["البند", "الكمية المقدرة", "الكمية الفعلية", "فرق الكمية", "السعر المقدر", "السعر الفعلي", "فرق السعر", "إجمالي الفرق"]
-            ]
-            for item in variance_data['details']:
-                details_table.append([
-                    item['item'],
-                    str(item['estimated_qty']),
-                    str(item['actual_qty']),
-                    str(item['qty_variance']),
-                    f"{item['estimated_price']:,.2f}",
-                    f"{item['actual_price']:,.2f}",
-                    f"{item['price_variance']:,.2f}",
-                    f"{item['total_variance']:,.2f}"
-                ])
-            content.append(self.create_table(details_table))
+            content.extend(self.create_long_table(
+                ["البند", "الكمية المقدرة", "الكمية الفعلية", "فرق الكمية", "السعر المقدر", "السعر الفعلي", "فرق السعر", "إجمالي الفرق"],
+                (
+                    [
+                        item['item'],
+                        str(item['estimated_qty']),
+                        str(item['actual_qty']),
+                        str(item['qty_variance']),
+                        f"{item['estimated_price']:,.2f}",
+                        f"{item['actual_price']:,.2f}",
+                        f"{item['price_variance']:,.2f}",
+                        f"{item['total_variance']:,.2f}"
+                    ]
+                    for item in variance_data['details']
+                )
+            ))
 
         # Add plots if available
         if variance_data.get('plots'):
-            for plot in variance_data['plots']:
+            for image in self.add_plots(variance_data['plots']):
                 content.append(Spacer(1, 24))
-                content.append(self.add_plot(plot))
+                content.append(image)
 
         # Build the PDF
         doc.build(content)
@@ -209,18 +343,19 @@ class ReportGenerator:
             content.append(Spacer(1, 24))
             content.append(self.create_header("الفواتير المستلمة"))
             content.append(Spacer(1, 12))
-            invoice_table = [
-                ["رقم الفاتورة", "المورد", "التاريخ", "المبلغ", "الحالة"]
-            ]
-            for invoice in weekly_data['invoices']:
-                invoice_table.append([
-                    invoice['number'],
-                    invoice['vendor'],
-                    invoice['date'],
-                    f"{invoice['amount']:,.2f}",
-                    invoice['status']
-                ])
-            content.append(self.create_table(invoice_table))
+            content.extend(self.create_long_table(
+                ["رقم الفاتورة", "المورد", "التاريخ", "المبلغ", "الحالة"],
+                (
+                    [
+                        invoice['number'],
+                        invoice['vendor'],
+                        invoice['date'],
+                        f"{invoice['amount']:,.2f}",
+                        invoice['status']
+                    ]
+                    for invoice in weekly_data['invoices']
+                )
+            ))
 
         # Add alerts and notifications
         if weekly_data.get('alerts'):
@@ -241,9 +376,55 @@ class ReportGenerator:
 
         # Add plots if available
         if weekly_data.get('plots'):
-            for plot in weekly_data['plots']:
+            for image in self.add_plots(weekly_data['plots']):
                 content.append(Spacer(1, 24))
-                content.append(self.add_plot(plot))
+                content.append(image)
 
         # Build the PDF
-        doc.build(content) 
\ No newline at end of file
+        doc.build(content)
+
+
+def _render_report(method: str, output_path: str, data: Dict[str, Any],
+                   start_date: Any = None, end_date: Any = None) -> str:
+    """Render one report in a worker process."""
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    generator = ReportGenerator(ChartImageCache(workers=1))
+    if method == 'generate_weekly_report':
+        generator.generate_weekly_report(output_path, data)
+    else:
+        getattr(generator, method)(output_path, data, start_date, end_date)
+    return output_path
+
+
+def render_reports(jobs: Sequence[Tuple], workers: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """
+    Render many reports concurrently, one process per report.
+
+    Every report writes its own output file and chart images go through the
+    shared content-hash cache, so concurrent reports never collide.
+
+    Args:
+        jobs (Sequence[Tuple]): (method, output_path, data[, start_date, end_date]) tuples,
+            where method is a ReportGenerator generate_* method name
+        workers (int, optional): Rendering processes (default: CPU count)
+
+    Returns:
+        Dict[str, Optional[str]]: Error message per output path, None for success
+    """
+    results = {}
+    if not jobs:
+        return results
+    with ProcessPoolExecutor(
+        max_workers=min(workers or os.cpu_count() or 1, len(jobs)),
+        mp_context=multiprocessing.get_context('spawn')
+    ) as pool:
+        futures = {pool.submit(_render_report, *job): job[1] for job in jobs}
+        for future in as_completed(futures):
+            output_path = futures[future]
+            try:
+                future.result()
+                results[output_path] = None
+            except Exception as e:
+                logger.error(f"Error rendering report {output_path}: {str(e)}")
+                results[output_path] = str(e)
+    return results
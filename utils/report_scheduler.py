@@ -0,0 +1,167 @@
+import logging
+import os
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import schedule
+
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+
+def week_bounds(day: date) -> Tuple[date, date]:
+    """Monday and Sunday of the week containing a day."""
+    week_start = day - timedelta(days=day.weekday())
+    return week_start, week_start + timedelta(days=6)
+
+
+class ReportScheduler:
+    """
+    Keep weekly aggregates current and render weekly reports.
+
+    During the week the aggregates of every project database are refreshed
+    every few minutes; only weeks that received new rows are recomputed. At
+    the week boundary the reports of the completed week are built from the
+    aggregates, rendered for all projects in parallel worker processes and
+    recorded in weekly_reports. On start, reports missing for the last
+    completed week are rendered first.
+    """
+
+    def __init__(self,
+                 registry: Optional[Database] = None,
+                 workers: Optional[int] = None,
+                 refresh_minutes: int = 15,
+                 report_time: str = '00:05'):
+        """
+        Initialize the scheduler.
+
+        Args:
+            registry (Database, optional): Database holding the project registry
+            workers (int, optional): Report rendering processes (default: CPU count)
+            refresh_minutes (int): Minutes between aggregate refreshes
+            report_time (str): Time on Monday at which last week's reports are rendered
+        """
+        self.registry = registry or Database()
+        self.workers = workers or os.cpu_count() or 1
+        self.refresh_minutes = refresh_minutes
+        self.report_time = report_time
+
+    def _project_databases(self) -> List[Tuple[Dict[str, Any], Database]]:
+        return [
+            (project, self.registry.for_project(project['id']))
+            for project in self.registry.get_projects()
+        ]
+
+    def refresh_aggregates(self) -> int:
+        """
+        Refresh the weekly aggregates of every database file.
+
+        Returns:
+            int: Weeks recomputed
+        """
+        refreshed, seen = 0, set()
+        for _, db in self._project_databases():
+            # Projects sharing a file are refreshed together
+            if db.db_path not in seen:
+                seen.add(db.db_path)
+                refreshed += db.refresh_weekly_aggregates()
+        return refreshed
+
+    def _weekly_data(self, project: Dict[str, Any], db: Database,
+                     week_start: str, week_end: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        aggregate = db.get_weekly_aggregate(week_start)
+        weekly_data = {
+            'week_start': week_start,
+            'week_end': week_end,
+            'summary': {
+                'المشروع': project['name'],
+                'عدد الفواتير': aggregate['total_invoices'],
+                'إجمالي المبالغ': f"{aggregate['total_amount'] or 0:,.2f}",
+                'إجمالي الفروقات': f"{aggregate['variance_amount'] or 0:,.2f}",
+                'بنود بفروقات عالية': aggregate['high_variance_items'],
+                'عدد الموردين': aggregate['unique_vendors'],
+            },
+            'invoices': [
+                {
+                    'number': invoice['invoice_number'],
+                    'vendor': invoice['vendor_name'] or '',
+                    'date': invoice['invoice_date'] or '',
+                    'amount': invoice['total_amount'] or 0,
+                    'status': invoice['processing_status'] or '',
+                }
+                for invoice in db.get_week_invoices(week_start)
+            ],
+            'alerts': [
+                {
+                    'type': alert['alert_type'],
+                    'message': alert['message'],
+                    'severity': alert['severity'],
+                    'date': alert['created_at'][:10],
+                }
+                for alert in db.get_week_alerts(week_start)
+            ],
+        }
+        return aggregate, weekly_data
+
+    def generate_weekly_reports(self, week_start: Optional[date] = None,
+                                force: bool = False) -> List[Dict[str, Any]]:
+        """
+        Render the weekly reports of all projects for one week.
+
+        Args:
+            week_start (date, optional): Monday of the week (default: last completed week)
+            force (bool): Render again reports that already exist
+
+        Returns:
+            List[Dict[str, Any]]: Rendered reports (project_id, week_start_date, report_path)
+        """
+        start, end = week_bounds(week_start or date.today() - timedelta(days=7))
+        week_start_text, week_end_text = start.isoformat(), end.isoformat()
+        self.refresh_aggregates()
+
+        jobs = []
+        for project, db in self._project_databases():
+            if not force and any(
+                report['week_start_date'] == week_start_text for report in db.get_weekly_reports()
+            ):
+                continue
+            aggregate, weekly_data = self._weekly_data(project, db, week_start_text, week_end_text)
+            output_path = os.path.join(
+                db.data_dir, 'reports', f"weekly_report_{project['id']}_{week_start_text}.pdf"
+            )
+            jobs.append((db, aggregate, output_path, weekly_data))
+        if not jobs:
+            return []
+
+        from .report_generator import render_reports
+
+        errors = render_reports(
+            [('generate_weekly_report', output_path, weekly_data) for _, _, output_path, weekly_data in jobs],
+            self.workers
+        )
+        rendered = []
+        for db, aggregate, output_path, _ in jobs:
+            if errors.get(output_path) is not None:
+                continue
+            db.save_weekly_report(week_start_text, week_end_text, aggregate, output_path)
+            rendered.append({
+                'project_id': db.write_project_id,
+                'week_start_date': week_start_text,
+                'report_path': output_path,
+            })
+
+        logger.info(f"Rendered {len(rendered)} of {len(jobs)} weekly reports for {week_start_text}")
+        return rendered
+
+    def run(self):
+        """Run the scheduler until interrupted."""
+        self.generate_weekly_reports()
+
+        scheduler = schedule.Scheduler()
+        scheduler.every(self.refresh_minutes).minutes.do(self.refresh_aggregates)
+        scheduler.every().monday.at(self.report_time).do(self.generate_weekly_reports)
+        while True:
+            scheduler.run_pending()
+            time.sleep(min(30, scheduler.idle_seconds or 30))
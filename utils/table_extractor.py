@@ -0,0 +1,347 @@
+import json
+import re
+import sys
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ocr_backends import contains_arabic
+
+# Header phrases (normalized) mapped to line item column roles
+COLUMN_HEADERS = {
+    'description': [
+        'item', 'items', 'description', 'item description', 'details', 'particulars',
+        'البند', 'البيان', 'الوصف', 'الصنف', 'وصف البند',
+    ],
+    'quantity': ['qty', 'quantity', 'qnty', 'الكمية', 'كمية', 'العدد'],
+    'unit': ['unit', 'uom', 'units', 'الوحدة', 'وحدة'],
+    'unit_price': [
+        'price', 'rate', 'unit price', 'unit rate', 'price/unit',
+        'السعر', 'سعر الوحدة', 'الفئة', 'سعر',
+    ],
+    'amount': [
+        'amount', 'total', 'line total', 'value', 'net amount',
+        'المبلغ', 'الإجمالي', 'الاجمالي', 'القيمة', 'المجموع',
+    ],
+}
+
+# Rows starting with these words end the line item table
+TOTAL_KEYWORDS = {
+    'total', 'subtotal', 'sub-total', 'grand', 'vat', 'tax', 'net',
+    'الإجمالي', 'الاجمالي', 'المجموع', 'الضريبة', 'ضريبة', 'الصافي',
+}
+
+NUMERIC_ROLES = ('quantity', 'unit_price', 'amount')
+
+# Arabic-Indic and Eastern Arabic-Indic digits, Arabic separators
+_DIGIT_TRANSLATION = str.maketrans(
+    '٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٫٬',
+    '01234567890123456789.,'
+)
+_NUMBER_PATTERN = re.compile(r'-?\d[\d,]*(?:\.\d+)?')
+_PUNCTUATION_PATTERN = re.compile(r'[^\w\s/]')
+
+_HEADER_LOOKUP = {
+    phrase: role for role, phrases in COLUMN_HEADERS.items() for phrase in phrases
+}
+
+
+def parse_number(text: str) -> Optional[float]:
+    """Parse a number written with Western or Arabic-Indic digits."""
+    match = _NUMBER_PATTERN.search(text.translate(_DIGIT_TRANSLATION))
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _normalize_phrase(text: str) -> str:
+    return ' '.join(_PUNCTUATION_PATTERN.sub(' ', text.lower()).split())
+
+
+def normalize_word_boxes(words: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Normalize OCR or pdfplumber word boxes to x0, y0, x1, y1 keys.
+
+    pdfplumber's extract_words() reports vertical extents as top/bottom.
+
+    Args:
+        words (List[Dict[str, Any]]): Word boxes from an OCR backend or pdfplumber
+
+    Returns:
+        List[Dict[str, Any]]: Word boxes with text, x0, y0, x1, y1 keys
+    """
+    normalized = []
+    for word in words:
+        text = str(word.get('text', '')).strip()
+        if not text:
+            continue
+        normalized.append({
+            'text': text,
+            'x0': float(word['x0']),
+            'x1': float(word['x1']),
+            'y0': float(word['top'] if 'top' in word else word['y0']),
+            'y1': float(word['bottom'] if 'bottom' in word else word['y1']),
+        })
+    return normalized
+
+
+class TableExtractor:
+    """
+    Extract invoice line items from word boxes using page geometry.
+
+    Words are bucketed into rows by their vertical centre, the header row is
+    located by matching Arabic/English column names, and every following
+    word is assigned to the header column whose span contains it. All passes
+    are linear in the number of words.
+    """
+
+    def __init__(self, min_header_columns: int = 3, row_tolerance: float = 0.6):
+        """
+        Initialize the table extractor.
+
+        Args:
+            min_header_columns (int): Recognised columns needed to accept a header row
+            row_tolerance (float): Max centre distance, in word heights, within a row
+        """
+        self.min_header_columns = min_header_columns
+        self.row_tolerance = row_tolerance
+
+    def extract(self, words: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Extract line items from the word boxes of a single page.
+
+        Args:
+            words (List[Dict[str, Any]]): Word boxes from OCR or pdfplumber
+
+        Returns:
+            List[Dict[str, Any]]: Line items with description, quantity, unit_price, amount
+        """
+        rows = self.cluster_rows(normalize_word_boxes(words))
+
+        for index, row in enumerate(rows):
+            columns = self.match_header(row)
+            if columns:
+                return self.extract_items(rows[index + 1:], columns)
+        return []
+
+    def cluster_rows(self, words: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Group words into rows by bucketing their vertical centres.
+
+        Args:
+            words (List[Dict[str, Any]]): Normalized word boxes
+
+        Returns:
+            List[List[Dict[str, Any]]]: Rows from top to bottom
+        """
+        if not words:
+            return []
+
+        height = sum(w['y1'] - w['y0'] for w in words) / len(words) or 1.0
+        buckets: Dict[int, List[Dict[str, Any]]] = {}
+        for word in words:
+            center = (word['y0'] + word['y1']) / 2
+            buckets.setdefault(int(center // height), []).append(word)
+
+        rows: List[List[Dict[str, Any]]] = []
+        row_center = None
+        for key in range(min(buckets), max(buckets) + 1):
+            bucket = buckets.get(key)
+            if not bucket:
+                continue
+            center = sum((w['y0'] + w['y1']) / 2 for w in bucket) / len(bucket)
+            if rows and abs(center - row_center) <= self.row_tolerance * height:
+                rows[-1].extend(bucket)
+            else:
+                rows.append(list(bucket))
+            row_center = center
+        return rows
+
+    def _split_cells(self, row: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Split a row into cells at horizontal gaps wider than a word height."""
+        row = sorted(row, key=lambda w: w['x0'])
+        height = sum(w['y1'] - w['y0'] for w in row) / len(row)
+        cells = [[row[0]]]
+        for word in row[1:]:
+            if word['x0'] - cells[-1][-1]['x1'] > height:
+                cells.append([word])
+            else:
+                cells[-1].append(word)
+        return cells
+
+    def match_header(self, row: List[Dict[str, Any]]) -> List[Tuple[float, float, str]]:
+        """Return (x0, x1, role) spans if the row looks like a table header."""
+        columns = []
+        for cell in self._split_cells(row):
+            phrase = _normalize_phrase(_cell_text(cell))
+            role = _HEADER_LOOKUP.get(phrase)
+            if role is None:
+                # Fall back to single words, e.g. "Item No." or "Total (SAR)"
+                for word in cell:
+                    role = _HEADER_LOOKUP.get(_normalize_phrase(word['text']))
+                    if role:
+                        break
+            if role and role not in (c[2] for c in columns):
+                columns.append((min(w['x0'] for w in cell), max(w['x1'] for w in cell), role))
+
+        roles = {c[2] for c in columns}
+        if len(columns) < self.min_header_columns or not roles & set(NUMERIC_ROLES):
+            return []
+        return sorted(columns)
+
+    def extract_items(self,
+                       rows: List[List[Dict[str, Any]]],
+                       columns: List[Tuple[float, float, str]]) -> List[Dict[str, Any]]:
+        """
+        Read line items from the rows below a table header.
+
+        Args:
+            rows (List[List[Dict[str, Any]]]): Rows following the header, top to bottom
+            columns (List[Tuple[float, float, str]]): Header (x0, x1, role) spans, left to right
+
+        Returns:
+            List[Dict[str, Any]]: Line items
+        """
+        # Column boundaries are the midpoints between neighbouring header spans
+        boundaries = [
+            (columns[i][1] + columns[i + 1][0]) / 2 for i in range(len(columns) - 1)
+        ]
+        roles = [c[2] for c in columns]
+
+        items: List[Dict[str, Any]] = []
+        for row in rows:
+            cells: Dict[str, List[Dict[str, Any]]] = {}
+            for word in row:
+                center = (word['x0'] + word['x1']) / 2
+                cells.setdefault(roles[bisect_right(boundaries, center)], []).append(word)
+
+            values = {role: _cell_text(cell) for role, cell in cells.items()}
+            row_text = _normalize_phrase(_cell_text(row)).split()
+            if row_text and row_text[0] in TOTAL_KEYWORDS and not values.get('quantity'):
+                break
+
+            numbers = {role: parse_number(values[role]) for role in NUMERIC_ROLES if role in values}
+            description = values.get('description', '').strip()
+
+            if not any(v is not None for v in numbers.values()):
+                # Wrapped description line belonging to the previous item
+                if description and items:
+                    items[-1]['description'] += ' ' + description
+                continue
+
+            item = self._build_item(description, values.get('unit'), numbers)
+            if item:
+                items.append(item)
+        return items
+
+    def _build_item(self,
+                    description: str,
+                    unit: Optional[str],
+                    numbers: Dict[str, Optional[float]]) -> Optional[Dict[str, Any]]:
+        quantity = numbers.get('quantity')
+        unit_price = numbers.get('unit_price')
+        amount = numbers.get('amount')
+
+        # Derive the missing value from the other two
+        if unit_price is None and quantity and amount is not None:
+            unit_price = amount / quantity
+        elif amount is None and quantity is not None and unit_price is not None:
+            amount = quantity * unit_price
+        elif quantity is None and unit_price and amount is not None:
+            quantity = round(amount / unit_price, 4)
+
+        if not description or unit_price is None or amount is None:
+            return None
+
+        item = {
+            'description': description,
+            'quantity': quantity if quantity is not None else 1,
+            'unit_price': unit_price,
+            'amount': amount,
+        }
+        if unit:
+            item['unit'] = unit.strip()
+        return item
+
+
+def _cell_text(cell: List[Dict[str, Any]]) -> str:
+    """Join the words of a cell in reading order."""
+    cell = sorted(cell, key=lambda w: w['x0'])
+    text = [w['text'] for w in cell]
+    if contains_arabic(' '.join(text)):
+        text.reverse()
+    return ' '.join(text)
+
+
+def evaluate(samples: List[Dict[str, Any]], extractor: Optional[TableExtractor] = None) -> Dict[str, Any]:
+    """
+    Measure line item precision and recall on a labelled sample set.
+
+    An extracted item counts as correct when its normalized description and
+    amount match an unmatched expected item of the same sample.
+
+    Args:
+        samples (List[Dict[str, Any]]): Samples with 'words' and expected 'line_items'
+        extractor (TableExtractor, optional): Extractor to evaluate
+
+    Returns:
+        Dict[str, Any]: Overall precision, recall and F1 plus per-sample counts,
+        with the expected items that were missed and the extracted items that
+        matched nothing
+    """
+    extractor = extractor or TableExtractor()
+    true_positives = extracted_total = expected_total = 0
+    per_sample = []
+
+    for sample in samples:
+        extracted = extractor.extract(sample['words'])
+        expected = list(sample.get('line_items', []))
+        matched = 0
+        unexpected = []
+        for item in extracted:
+            for i, target in enumerate(expected):
+                if (_normalize_phrase(item['description']) == _normalize_phrase(target['description'])
+                        and abs(item['amount'] - target['amount']) <= 0.01):
+                    matched += 1
+                    del expected[i]
+                    break
+            else:
+                unexpected.append(item)
+
+        true_positives += matched
+        extracted_total += len(extracted)
+        expected_total += len(sample.get('line_items', []))
+        per_sample.append({
+            'name': sample.get('name', ''),
+            'extracted': len(extracted),
+            'expected': len(sample.get('line_items', [])),
+            'matched': matched,
+            'missed': expected,
+            'unexpected': unexpected,
+        })
+
+    precision = true_positives / extracted_total if extracted_total else 0.0
+    recall = true_positives / expected_total if expected_total else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'samples': per_sample,
+    }
+
+
+if __name__ == '__main__':
+    # Usage: python -m utils.table_extractor data/samples/line_items.json
+    with open(sys.argv[1], encoding='utf-8') as f:
+        report = evaluate(json.load(f))
+    for sample in report['samples']:
+        print(f"{sample['name']}: {sample['matched']}/{sample['expected']} matched, "
+              f"{sample['extracted']} extracted")
+        for item in sample['missed']:
+            print(f"  missed: {item['description']!r} {item['amount']:,.2f}")
+        for item in sample['unexpected']:
+            print(f"  unexpected: {item['description']!r} {item['amount']:,.2f}")
+    print(f"Precision: {report['precision']:.3f}  Recall: {report['recall']:.3f}  F1: {report['f1']:.3f}")
@@ -0,0 +1,276 @@
+import hashlib
+import logging
+import re
+import threading
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from .field_extractor import normalize_date
+from .table_extractor import TableExtractor, normalize_word_boxes, parse_number
+
+# Top fraction of the first page used to fingerprint the vendor layout
+HEADER_RATIO = 0.2
+
+# Grid used to quantize label positions for the layout hash
+LAYOUT_GRID = 40
+
+# Minimum Jaccard similarity for a fuzzy fingerprint match
+MIN_SIMILARITY = 0.7
+
+# Padding (fraction of page size) around learned field regions
+REGION_MARGIN = 0.01
+
+TEMPLATE_FIELDS = ('invoice_number', 'date', 'total_amount', 'tax')
+
+_TOKEN_PATTERN = re.compile(r'[^\W\d_]{2,}')
+
+
+def _label_tokens(text: str) -> List[str]:
+    """Alphabetic tokens only; numbers change from invoice to invoice."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def fingerprint_page(words: List[Dict[str, Any]], width: float, height: float) -> Dict[str, Any]:
+    """
+    Fingerprint the header of a page.
+
+    Args:
+        words (List[Dict[str, Any]]): Word boxes of the page (or of its header strip)
+        width (float): Page width in the word box units
+        height (float): Page height in the word box units
+
+    Returns:
+        Dict[str, Any]: Header text hash, layout hash and the sets they were built from
+    """
+    tokens = set()
+    cells = set()
+    for word in normalize_word_boxes(words):
+        if word['y0'] > height * HEADER_RATIO:
+            continue
+        for token in _label_tokens(word['text']):
+            tokens.add(token)
+            cells.add(f"{int(word['x0'] / width * LAYOUT_GRID)}:{int(word['y0'] / height * LAYOUT_GRID)}:{token}")
+
+    return {
+        'fingerprint': hashlib.sha1(' '.join(sorted(tokens)).encode('utf-8')).hexdigest(),
+        'layout_hash': hashlib.sha1(' '.join(sorted(cells)).encode('utf-8')).hexdigest(),
+        'tokens': sorted(tokens),
+        'cells': sorted(cells),
+    }
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _line_groups(words: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    return TableExtractor().cluster_rows(words)
+
+
+def _words_box(words: List[Dict[str, Any]], width: float, height: float) -> List[float]:
+    return [
+        min(w['x0'] for w in words) / width, min(w['y0'] for w in words) / height,
+        max(w['x1'] for w in words) / width, max(w['y1'] for w in words) / height,
+    ]
+
+
+def _locate_value(field: str, value: Any, lines: List[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    """Find the words holding a confirmed field value."""
+    # Totals sit below the line items, which may repeat the same amount
+    if field in ('total_amount', 'tax'):
+        lines = lines[::-1]
+    for line in lines:
+        for word in line:
+            if isinstance(value, date):
+                if normalize_date(word['text']) == value:
+                    return [word]
+            elif isinstance(value, (int, float)):
+                number = parse_number(word['text'])
+                if number is not None and abs(number - value) < 0.01:
+                    return [word]
+
+        if isinstance(value, str) and value.strip():
+            tokens = value.split()
+            texts = [w['text'] for w in line]
+            for start in range(len(texts) - len(tokens) + 1):
+                if texts[start:start + len(tokens)] == tokens:
+                    return line[start:start + len(tokens)]
+            # OCR may join the label and value into one word, e.g. "No:INV-1"
+            for word in line:
+                if len(tokens) == 1 and word['text'].endswith(tokens[0]):
+                    return [word]
+    return None
+
+
+class TemplateStore:
+    """
+    Extraction templates for recurring vendor layouts.
+
+    Templates are learned from confirmed invoices: the position of every
+    header field and the table column spans are recorded relative to the
+    page size and keyed by a fingerprint of the page header. Templates are
+    persisted through the Database and indexed in memory once at startup.
+    """
+
+    def __init__(self, db=None):
+        """
+        Initialize the store and load persisted templates.
+
+        Args:
+            db (Database, optional): Database used to persist templates
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db = db
+        self._lock = threading.Lock()
+        self._templates: Dict[str, List[Dict[str, Any]]] = {}
+        self._token_index: Dict[str, set] = {}
+
+        if db is not None:
+            for record in db.get_vendor_templates():
+                self._index(record['template'])
+
+    def _index(self, template: Dict[str, Any]):
+        with self._lock:
+            bucket = self._templates.setdefault(template['fingerprint'], [])
+            bucket[:] = [t for t in bucket if t['layout_hash'] != template['layout_hash']]
+            bucket.append(template)
+            for token in template['tokens']:
+                self._token_index.setdefault(token, set()).add(template['fingerprint'])
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self._templates.values())
+
+    def find(self, fingerprint: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Find the template for a page fingerprint.
+
+        Exact header hashes are checked first; otherwise templates sharing
+        header tokens are compared by header and layout similarity.
+
+        Args:
+            fingerprint (Dict[str, Any]): Result of fingerprint_page()
+
+        Returns:
+            Optional[Dict[str, Any]]: Matching template, if any
+        """
+        cells = set(fingerprint['cells'])
+        with self._lock:
+            exact = self._templates.get(fingerprint['fingerprint'], [])
+            candidates = {
+                key for token in fingerprint['tokens'] for key in self._token_index.get(token, ())
+            }
+            pool = exact + [
+                t for key in candidates - {fingerprint['fingerprint']} for t in self._templates[key]
+            ]
+
+        best, best_score = None, 0.0
+        tokens = set(fingerprint['tokens'])
+        for template in pool:
+            if template['layout_hash'] == fingerprint['layout_hash']:
+                return template
+            score = min(_jaccard(tokens, set(template['tokens'])), _jaccard(cells, set(template['cells'])))
+            if score >= MIN_SIMILARITY and score > best_score:
+                best, best_score = template, score
+        return best
+
+    def learn(self, invoice_data: Dict[str, Any], page: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Learn a template from a confirmed invoice.
+
+        Args:
+            invoice_data (Dict[str, Any]): Confirmed invoice fields
+            page (Dict[str, Any]): First page result with words, width and height
+
+        Returns:
+            Optional[Dict[str, Any]]: The stored template, or None if no field could be located
+        """
+        width, height = page['width'], page['height']
+        words = normalize_word_boxes(page['words'])
+        lines = _line_groups(words)
+
+        fields = {}
+        for field in TEMPLATE_FIELDS:
+            value = invoice_data.get(field)
+            if value in (None, ''):
+                continue
+            located = _locate_value(field, value, lines)
+            if located:
+                fields[field] = {'box': _words_box(located, width, height), 'tokens': len(located)}
+
+        if 'invoice_number' not in fields or 'total_amount' not in fields:
+            self.logger.warning("Could not locate invoice number and total on the page; template not learned")
+            return None
+
+        template = {
+            **fingerprint_page(page['words'], width, height),
+            'vendor': invoice_data.get('vendor') or invoice_data.get('vendor_name'),
+            'fields': fields,
+            'table': self._learn_table(lines, width, height),
+        }
+
+        if self.db is not None:
+            self.db.save_vendor_template(template)
+        self._index(template)
+        return template
+
+    def _learn_table(self, lines: List[List[Dict[str, Any]]], width: float, height: float) -> Optional[Dict[str, Any]]:
+        extractor = TableExtractor()
+        for line in lines:
+            columns = extractor.match_header(line)
+            if columns:
+                return {
+                    'header_y1': max(w['y1'] for w in line) / height,
+                    'columns': [[x0 / width, x1 / width, role] for x0, x1, role in columns],
+                }
+        return None
+
+
+def region_box(box: List[float], width: float, height: float, grow: float = 0.5) -> Tuple[int, int, int, int]:
+    """
+    Scale a learned region to page units.
+
+    The region is padded to absorb small scan shifts and widened by a
+    fraction of its width on both sides, since values such as amounts and
+    invoice numbers vary in length between invoices.
+
+    Args:
+        box (List[float]): Region as fractions of the page (x0, y0, x1, y1)
+        width (float): Page width
+        height (float): Page height
+        grow (float): Fraction of the region width added on each side
+
+    Returns:
+        Tuple[int, int, int, int]: Region in page units (x0, y0, x1, y1)
+    """
+    x0, y0, x1, y1 = box
+    dx = max(REGION_MARGIN, (x1 - x0) * grow)
+    return (
+        int(max(x0 - dx, 0) * width),
+        int(max(y0 - REGION_MARGIN, 0) * height),
+        int(min(x1 + dx, 1) * width),
+        int(min(y1 + REGION_MARGIN, 1) * height),
+    )
+
+
+def pick_value_words(words: List[Dict[str, Any]], box: List[float], tokens: int,
+                     width: float, height: float) -> List[Dict[str, Any]]:
+    """
+    Pick the words closest to a learned field position, in reading order.
+
+    Args:
+        words (List[Dict[str, Any]]): Normalized words inside the field region
+        box (List[float]): Learned region as fractions of the page
+        tokens (int): Number of words the learned value had
+        width (float): Page width
+        height (float): Page height
+
+    Returns:
+        List[Dict[str, Any]]: The value words
+    """
+    cx = (box[0] + box[2]) / 2 * width
+    cy = (box[1] + box[3]) / 2 * height
+    nearest = sorted(
+        words,
+        key=lambda w: abs((w['x0'] + w['x1']) / 2 - cx) + abs((w['y0'] + w['y1']) / 2 - cy)
+    )[:max(tokens, 1)]
+    return sorted(nearest, key=lambda w: w['x0'])
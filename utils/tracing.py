@@ -0,0 +1,157 @@
+import contextlib
+import contextvars
+import functools
+import logging
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar[Optional['Trace']] = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    """
+    Stage timings and counters of one unit of work, usually one invoice.
+
+    Code along the pipeline opens span()s and bumps count()ers; they are
+    recorded on the trace active in the current context and cost next to
+    nothing when there is none. Spans with the same name are summed, so a
+    stage run once per page or item shows as one stage with its call count.
+    Nested spans are timed independently: 'ocr.page' includes the
+    'ocr.rasterize' time inside it.
+
+    A trace can be activated again later or in another thread, and one
+    coming back from a worker process (to_dict()) can be merged in.
+    """
+
+    def __init__(self, name: str, **attributes):
+        """
+        Args:
+            name (str): Kind of work traced, e.g. 'invoice'
+            **attributes: Values stored with the trace (e.g. ref=file hash, source='upload')
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.stages: Dict[str, list] = {}
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.duration = 0.0
+
+    def add(self, stage: str, seconds: float, calls: int = 1):
+        """Add calls and time to a stage."""
+        entry = self.stages.setdefault(stage, [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+    def count(self, name: str, amount: int = 1):
+        """Add to a counter (pages, cache hits, ...)."""
+        self.counters[name] += amount
+
+    @contextlib.contextmanager
+    def activate(self) -> Iterator['Trace']:
+        """Record spans and counters of the enclosed code on this trace."""
+        token = _current.set(self)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.duration += time.perf_counter() - start
+            _current.reset(token)
+
+    def merge(self, data: Optional[Dict[str, Any]]):
+        """
+        Add the stages and counters of a trace serialized with to_dict().
+
+        The merged trace's own duration is added too and recorded as a stage
+        under its name, e.g. 'extract' for the worker process part.
+        """
+        if not data:
+            return
+        self.add(data['name'], data['duration'])
+        self.duration += data['duration']
+        for stage, (calls, seconds) in data.get('stages', {}).items():
+            self.add(stage, seconds, calls)
+        for name, amount in data.get('counters', {}).items():
+            self.count(name, amount)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Picklable summary of the trace."""
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'attributes': dict(self.attributes),
+            'duration': self.duration,
+            'stages': {stage: list(entry) for stage, entry in self.stages.items()},
+            'counters': dict(self.counters),
+        }
+
+    def summary(self) -> str:
+        """One line of the slowest stages, for logs."""
+        slowest = sorted(self.stages.items(), key=lambda item: -item[1][1])[:5]
+        stages = ', '.join(f"{stage} {seconds * 1000:.0f}ms/{calls}" for stage, (calls, seconds) in slowest)
+        return f"{self.name} {self.duration * 1000:.0f}ms: {stages}"
+
+
+@contextlib.contextmanager
+def trace(name: str, **attributes) -> Iterator[Trace]:
+    """Start a trace and make it current for the enclosed code."""
+    new_trace = Trace(name, **attributes)
+    with new_trace.activate():
+        yield new_trace
+    logger.debug(new_trace.summary())
+
+
+@contextlib.contextmanager
+def activate(existing: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """Make an existing trace current again; does nothing for None."""
+    if existing is None:
+        yield None
+        return
+    with existing.activate():
+        yield existing
+
+
+def current_trace() -> Optional[Trace]:
+    """The trace active in this context, if any."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed code as a stage of the current trace."""
+    active = _current.get()
+    if active is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.add(stage, time.perf_counter() - start)
+
+
+def count(name: str, amount: int = 1):
+    """Add to a counter of the current trace."""
+    active = _current.get()
+    if active is not None:
+        active.count(name, amount)
+
+
+def traced(stage: str) -> Callable:
+    """Decorator timing every call of a function as a stage of the current trace."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            active = _current.get()
+            if active is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                active.add(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
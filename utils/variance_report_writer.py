@@ -0,0 +1,213 @@
+import numbers
+from typing import Any, Dict, Iterable, Optional
+
+import xlsxwriter
+
+# Rows per worksheet, header included (Excel's limit)
+MAX_SHEET_ROWS = 1048576
+
+DETAIL_SHEET = 'Detailed Analysis'
+
+# (header, item key, column width, number format)
+DETAIL_COLUMNS = [
+    ('Invoice Number', 'invoice_number', 16, None),
+    ('Vendor', 'vendor_name', 24, None),
+    ('Description', 'description', 40, None),
+    ('Quantity', 'quantity', 10, '#,##0.##'),
+    ('Unit Price', 'unit_price', 12, '#,##0.00'),
+    ('Amount', 'amount', 14, '#,##0.00'),
+    ('Matched', 'matched', 9, None),
+    ('Pricing Key', 'pricing_key', 20, None),
+    ('Expected Unit Price', 'expected_unit_price', 14, '#,##0.00'),
+    ('Expected Total', 'expected_total', 14, '#,##0.00'),
+    ('Variance', 'variance', 14, '#,##0.00'),
+    ('Variance %', 'variance_percentage', 11, '0.00'),
+    ('Within Tolerance', 'within_tolerance', 10, None),
+    ('Notes', 'notes', 50, None),
+]
+
+_VARIANCE_COLUMN = [key for _, key, _, _ in DETAIL_COLUMNS].index('variance_percentage')
+
+
+class VarianceReportWriter:
+    """
+    Stream a variance report to an xlsx file.
+
+    The workbook is written with xlsxwriter in constant_memory mode: each
+    row is flushed to disk once the next one starts, so memory stays flat
+    however many invoices the report covers. Detail sheets roll over to a
+    new sheet at Excel's row limit. The summary totals are accumulated while
+    rows are written and put in the first sheet on close, and conditional
+    formatting is sized to the rows actually written.
+
+    Usage:
+        with VarianceReportWriter('report.xlsx') as writer:
+            writer.write_comparison(comparison_results)
+    """
+
+    def __init__(self, output_path: str, tolerance: float = 0.05):
+        """
+        Args:
+            output_path (str): Path of the xlsx file
+            tolerance (float): Variance tolerance for rows that do not carry within_tolerance
+        """
+        self.tolerance = tolerance
+        self.workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True, 'nan_inf_to_errors': True})
+        self.header_format = self.workbook.add_format({'bold': True, 'bg_color': '#D9D9D9', 'border': 1})
+        self.number_formats = {
+            fmt: self.workbook.add_format({'num_format': fmt})
+            for fmt in {fmt for _, _, _, fmt in DETAIL_COLUMNS if fmt}
+        }
+        # Created first so it is the first sheet; written on close
+        self.summary_sheet = self.workbook.add_worksheet('Summary')
+        self.detail_sheets = []
+        self.sheet = None
+        self.row = 0
+        self.invoices = 0
+        self._last_invoice = object()
+        self.totals = {
+            'total_items': 0,
+            'matched_items': 0,
+            'items_with_variance': 0,
+            'high_variance_items': 0,
+            'total_expected': 0.0,
+            'total_actual': 0.0,
+        }
+
+    def __enter__(self) -> 'VarianceReportWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _new_detail_sheet(self):
+        self._finish_detail_sheet()
+        name = DETAIL_SHEET if not self.detail_sheets else f"{DETAIL_SHEET} ({len(self.detail_sheets) + 1})"
+        self.sheet = self.workbook.add_worksheet(name)
+        self.detail_sheets.append(self.sheet)
+        for col, (header, _, width, fmt) in enumerate(DETAIL_COLUMNS):
+            self.sheet.set_column(col, col, width, self.number_formats.get(fmt))
+            self.sheet.write_string(0, col, header, self.header_format)
+        self.sheet.freeze_panes(1, 0)
+        self.row = 1
+
+    def _finish_detail_sheet(self):
+        if self.sheet is None:
+            return
+        last_row = max(self.row - 1, 1)
+        self.sheet.autofilter(0, 0, last_row, len(DETAIL_COLUMNS) - 1)
+        self.sheet.conditional_format(1, _VARIANCE_COLUMN, last_row, _VARIANCE_COLUMN, {
+            'type': '3_color_scale',
+            'min_color': '#63BE7B',  # Green
+            'mid_color': '#FFEB84',  # Yellow
+            'max_color': '#F8696B'   # Red
+        })
+
+    def write_item(self, item: Dict[str, Any], invoice_number: Any = None, vendor_name: Any = None):
+        """
+        Write one analyzed item (as produced by PriceComparator._analyze_item).
+
+        Args:
+            item (Dict[str, Any]): Item analysis
+            invoice_number (Any, optional): Invoice the item belongs to
+            vendor_name (Any, optional): Vendor of the invoice
+        """
+        if self.sheet is None or self.row >= MAX_SHEET_ROWS:
+            self._new_detail_sheet()
+
+        row = {**item, 'invoice_number': invoice_number, 'vendor_name': vendor_name}
+        percentage = item.get('variance_percentage') or 0.0
+        within = item.get('within_tolerance')
+        if within is None:
+            within = abs(percentage) <= self.tolerance * 100
+            row['within_tolerance'] = within
+        notes = item.get('notes')
+        if isinstance(notes, (list, tuple)):
+            row['notes'] = '; '.join(notes)
+
+        for col, (_, key, _, _) in enumerate(DETAIL_COLUMNS):
+            value = row.get(key)
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                self.sheet.write_boolean(self.row, col, value)
+            elif isinstance(value, numbers.Number):
+                self.sheet.write_number(self.row, col, value)
+            else:
+                self.sheet.write_string(self.row, col, str(value))
+        self.row += 1
+
+        # Rows arrive grouped by invoice; counting changes keeps memory flat
+        if invoice_number != self._last_invoice:
+            self.invoices += 1
+            self._last_invoice = invoice_number
+        self.totals['total_items'] += 1
+        if item.get('matched'):
+            self.totals['matched_items'] += 1
+            self.totals['total_expected'] += item.get('expected_total') or 0.0
+            self.totals['total_actual'] += item.get('actual_total', item.get('amount')) or 0.0
+            if percentage:
+                self.totals['items_with_variance'] += 1
+            if not within:
+                self.totals['high_variance_items'] += 1
+
+    def write_items(self, items: Iterable[Dict[str, Any]], invoice_number: Any = None,
+                    vendor_name: Any = None):
+        """Write analyzed items of one invoice as they are produced."""
+        for item in items:
+            self.write_item(item, invoice_number, vendor_name)
+
+    def write_comparison(self, comparison_results: Dict[str, Any], vendor_name: Any = None):
+        """Write the items of a PriceComparator.compare_prices result."""
+        self.write_items(
+            comparison_results.get('items_analysis', []),
+            comparison_results.get('invoice_number'),
+            vendor_name
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals of the rows written so far."""
+        total_variance = self.totals['total_actual'] - self.totals['total_expected']
+        return {
+            'invoices': self.invoices,
+            **self.totals,
+            'total_variance': total_variance,
+            'total_variance_percentage': (
+                total_variance / self.totals['total_expected'] * 100 if self.totals['total_expected'] > 0 else 0.0
+            ),
+        }
+
+    def close(self):
+        """Write the summary sheet and finish the file."""
+        if self.sheet is None:
+            self._new_detail_sheet()
+        self._finish_detail_sheet()
+
+        self.summary_sheet.set_column(0, 0, 28)
+        self.summary_sheet.set_column(1, 1, 18)
+        self.summary_sheet.write_string(0, 0, 'Metric', self.header_format)
+        self.summary_sheet.write_string(0, 1, 'Value', self.header_format)
+        for row, (key, value) in enumerate(self.summary().items(), start=1):
+            self.summary_sheet.write_string(row, 0, key.replace('_', ' ').title())
+            self.summary_sheet.write_number(row, 1, value)
+        self.workbook.close()
+
+
+def write_variance_report(rows: Iterable[Dict[str, Any]], output_path: str,
+                          tolerance: float = 0.05) -> Optional[Dict[str, Any]]:
+    """
+    Write a multi-invoice variance report from item rows.
+
+    Args:
+        rows (Iterable[Dict[str, Any]]): Item analyses with invoice_number and vendor_name,
+            e.g. Database.iter_variance_rows()
+        output_path (str): Path of the xlsx file
+        tolerance (float): Variance tolerance for rows that do not carry within_tolerance
+
+    Returns:
+        Optional[Dict[str, Any]]: Report summary
+    """
+    with VarianceReportWriter(output_path, tolerance) as writer:
+        for row in rows:
+            writer.write_item(row, row.get('invoice_number'), row.get('vendor_name'))
+        return writer.summary()
@@ -1,13 +1,20 @@
-import plotly.express as px
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import pandas as pd
 from typing import List, Dict, Any
 
+from .chart_data import TOP_N, WEBGL_THRESHOLD, downsample, scatter, top_n
+
 class Visualizer:
     @staticmethod
     def create_expense_breakdown_pie(data: List[Dict[str, Any]]) -> go.Figure:
         """Create a pie chart showing expense breakdown by category."""
-        df = pd.DataFrame(data)
+        df = pd.DataFrame(data).groupby('category', as_index=False)['amount'].sum()
+        categories, amounts, _ = top_n(df['category'].tolist(), df['amount'].tolist(), key=df['amount'])
+        df = pd.DataFrame({'category': categories, 'amount': amounts})
+        # plotly.express takes longer to import than the rest of plotly; load it with the first chart
+        import plotly.express as px
+
         fig = px.pie(
             df,
             values='amount',
@@ -29,6 +36,11 @@ class Visualizer:
         actual: List[float]
     ) -> go.Figure:
         """Create a bar chart comparing budget vs actual expenses."""
+        if len(categories) > TOP_N:
+            # Keep the categories with the largest spending; ranking both
+            # series by it folds the same categories
+            _, budget, _ = top_n(categories, budget, key=actual)
+            categories, actual, _ = top_n(categories, actual, key=actual)
         fig = go.Figure(data=[
             go.Bar(name='الميزانية', x=categories, y=budget),
             go.Bar(name='الفعلي', x=categories, y=actual)
@@ -50,13 +62,16 @@ class Visualizer:
         cumulative: bool = False
     ) -> go.Figure:
         """Create a line chart showing expense trends over time."""
+        series = pd.Series(amounts, index=pd.to_datetime(pd.Series(dates))).sort_index()
         if cumulative:
-            amounts = pd.Series(amounts).cumsum().tolist()
+            series = series.cumsum()
         
-        fig = go.Figure(data=go.Scatter(
-            x=dates,
-            y=amounts,
-            mode='lines+markers'
+        # Long series keep their shape with far fewer points
+        dates, amounts = downsample(series.index.tolist(), series.tolist())
+        fig = go.Figure(data=scatter(
+            dates,
+            amounts,
+            mode='lines+markers' if len(dates) <= 200 else 'lines'
         ))
         
         title = 'تطور المصروفات التراكمي' if cumulative else 'تطور المصروفات'
@@ -120,17 +135,25 @@ class Visualizer:
     def create_vendor_analysis_scatter(
         vendors_data: List[Dict[str, Any]]
     ) -> go.Figure:
-        """Create a scatter plot analyzing vendors by invoice count and total amount."""
+        """
+        Create a scatter plot analyzing vendors by invoice count and total amount.
+
+        Takes rows of Database.get_vendor_snapshot(); a 'category' column, when
+        present, colors the points.
+        """
         df = pd.DataFrame(vendors_data)
         
+        import plotly.express as px
+
         fig = px.scatter(
             df,
             x='invoice_count',
             y='total_amount',
             size='average_amount',
-            color='category',
+            color='category' if 'category' in df else None,
             hover_name='vendor_name',
-            title='تحليل الموردين'
+            title='تحليل الموردين',
+            render_mode='webgl' if len(df) > WEBGL_THRESHOLD else 'svg'
         )
         
         fig.update_layout(
@@ -150,6 +173,7 @@ class Visualizer:
         # Create subplots
         fig = make_subplots(
             rows=2, cols=2,
+            specs=[[{'type': 'xy'}, {'type': 'domain'}], [{'type': 'xy'}, {'type': 'xy'}]],
             subplot_titles=(
                 'المصروفات اليومية',
                 'توزيع الفئات',
@@ -189,10 +213,15 @@ class Visualizer:
         )
         
         # Top vendors bar chart
+        vendors, vendor_amounts, _ = top_n(
+            weekly_data['top_vendors']['names'],
+            weekly_data['top_vendors']['amounts'],
+            n=10
+        )
         fig.add_trace(
             go.Bar(
-                x=weekly_data['top_vendors']['names'],
-                y=weekly_data['top_vendors']['amounts'],
+                x=vendors,
+                y=vendor_amounts,
                 name='أعلى الموردين'
             ),
             row=2, col=2